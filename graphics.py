@@ -62,6 +62,19 @@ http://mcsp.wartburg.edu/zelle/python for a quick reference"""
 
 __version__ = "5.0"
 
+# TerraLunar changes to 5.0
+#     * GraphWin.frame() / begin_frame() / end_frame() batch moves and
+#       option changes, one Tk update per frame
+#     * Raster: a window-sized Image kept as a pixel buffer, for points
+#       that stay put, sent to Tk a few rows at a time
+#     * Bulk drawing: GraphWin.plot_many, Raster.plot_many, Polyline with
+#       extend(), Transform.screen_many for whole coordinate arrays
+#     * Mouse wheel and right-button drag: GraphWin.checkWheel and
+#       checkDrag, polled like checkMouse; Raster.clear
+#     * Raster can cover part of the window (left, top, width, height)
+#     * The Tk root is made when first needed (first GraphWin, Entry or
+#       Image), not on import, so importing costs no display
+
 # Version 5 8/26/2016
 #     * update at bottom to fix MacOS issue causing askopenfile() to hang
 #     * update takes an optional parameter specifying update rate
@@ -161,6 +174,7 @@ __version__ = "5.0"
 #     Added Entry boxes.
 
 import time, os, sys
+from contextlib import contextmanager
 
 try:  # import as appropriate for 2.x vs. 3.x
    import tkinter as tk
@@ -182,8 +196,15 @@ BAD_OPTION = "Illegal option value"
 ##########################################################################
 # global variables and funtions
 
-_root = tk.Tk()
-_root.withdraw()
+_root = None    # made by _tkroot() when first needed
+
+def _tkroot():
+    global _root
+    if _root is None:
+        _root = tk.Tk()
+        _root.withdraw()
+        _root.update()   # MacOS fix 1
+    return _root
 
 _update_lasttime = time.time()
 
@@ -198,7 +219,8 @@ def update(rate=None):
         else:
             _update_lasttime = now
 
-    _root.update()
+    if _root is not None:
+        _root.update()
 
 ############################################################################
 # Graphics classes start here
@@ -210,7 +232,7 @@ class GraphWin(tk.Canvas):
     def __init__(self, title="Graphics Window",
                  width=200, height=200, autoflush=True):
         assert type(title) == type(""), "Title must be a string"
-        master = tk.Toplevel(_root)
+        master = tk.Toplevel(_tkroot())
         master.protocol("WM_DELETE_WINDOW", self.close)
         tk.Canvas.__init__(self, master, width=width, height=height,
                            highlightthickness=0, bd=0)
@@ -223,6 +245,17 @@ class GraphWin(tk.Canvas):
         self.mouseY = None
         self.bind("<Button-1>", self._onClick)
         self.bind_all("<Key>", self._onKey)
+        self.wheel = 0          # wheel clicks, up positive, and where
+        self.wheelX = None
+        self.wheelY = None
+        self.bind("<MouseWheel>", self._onWheel)                 # Windows, MacOS
+        self.bind("<Button-4>", lambda e: self._onWheel(e, 1))   # X11
+        self.bind("<Button-5>", lambda e: self._onWheel(e, -1))
+        self.dragX = None       # right-button drag, pixels since last checkDrag
+        self.dragY = None
+        self.dragged = [0, 0]
+        self.bind("<ButtonPress-3>", self._onDragStart)
+        self.bind("<B3-Motion>", self._onDrag)
         self.height = int(height)
         self.width = int(width)
         self.autoflush = autoflush
@@ -231,6 +264,8 @@ class GraphWin(tk.Canvas):
         self.closed = False
         master.lift()
         self.lastKey = ""
+        self._pending = None   # queued moves and options, inside a frame
+        self._framedepth = 0
         if autoflush: _root.update()
 
     def __repr__(self):
@@ -251,6 +286,24 @@ class GraphWin(tk.Canvas):
     def _onKey(self, evnt):
         self.lastKey = evnt.keysym
 
+    def _onWheel(self, e, clicks=None):
+        if clicks is None:
+            clicks = 1 if e.delta > 0 else -1
+        self.wheel += clicks
+        self.wheelX = e.x
+        self.wheelY = e.y
+
+    def _onDragStart(self, e):
+        self.dragX = e.x
+        self.dragY = e.y
+
+    def _onDrag(self, e):
+        if self.dragX is not None:
+            self.dragged[0] += e.x - self.dragX
+            self.dragged[1] += e.y - self.dragY
+        self.dragX = e.x
+        self.dragY = e.y
+
 
     def setBackground(self, color):
         """Set background color of the window"""
@@ -285,6 +338,68 @@ class GraphWin(tk.Canvas):
         if self.autoflush:
             _root.update()
 
+    def begin_frame(self):
+        """Start queueing moves and option changes (colors, text, ...)
+        instead of sending each to Tk. Frames may nest."""
+        self.__checkOpen()
+        if self._framedepth == 0:
+            self._pending = {}
+            self._frameflush = self.autoflush
+            self.autoflush = False
+        self._framedepth += 1
+
+    def end_frame(self):
+        """Send everything queued since begin_frame to Tk, one canvas
+        call per object per kind of change, then update the window once
+        (if autoflush is on)."""
+        self._framedepth -= 1
+        if self._framedepth > 0:
+            return
+        pending = self._pending
+        self._pending = None
+        self.autoflush = self._frameflush
+        if self.closed:
+            return
+        for obj, change in pending.items():
+            dx, dy, options, coords = change
+            if obj.canvas is not self:
+                continue
+            if coords:
+                obj._recoords()   # includes any moves
+            elif dx or dy:
+                self.move(obj.id, dx, dy)
+            if options:
+                self.itemconfig(obj.id, options)
+        self.__autoflush()
+
+    @contextmanager
+    def frame(self):
+        """with win.frame(): ... batches the drawing changes inside it,
+        as begin_frame() and end_frame()"""
+        self.begin_frame()
+        try:
+            yield self
+        finally:
+            self.end_frame()
+
+    def _queue(self, obj, dx=0, dy=0, option=None, setting=None, coords=False):
+        # collapse changes to obj: moves add up, the last option value wins,
+        # and new coords (Polyline) are sent once
+        change = self._pending.get(obj)
+        if change is None:
+            change = self._pending[obj] = [0, 0, {}, False]
+        change[0] += dx
+        change[1] += dy
+        if option is not None:
+            change[2][option] = setting
+        if coords:
+            change[3] = True
+
+    def _unqueue(self, obj):
+        # obj was drawn or undrawn; its queued changes no longer apply
+        if self._pending:
+            self._pending.pop(obj, None)
+
     
     def plot(self, x, y, color="black"):
         """Set pixel (x,y) to the given color"""
@@ -300,6 +415,26 @@ class GraphWin(tk.Canvas):
         self.create_line(x,y,x+1,y, fill=color)
         self.__autoflush()
       
+    def plot_many(self, xs, ys, colors="black", raw=False):
+        """Set many pixels at once: xs, ys are sequences (or numpy
+        arrays) of window coordinates, raw pixels if raw is true, and
+        colors is one color or a sequence of them. Goes to Tk as a single
+        script and one update instead of a call and update per point."""
+        self.__checkOpen()
+        if not raw:
+            if not self.trans:
+                raw = True
+            else:
+                xs, ys = self.trans.screen_many(xs, ys)
+        if isinstance(colors, str):
+            colors = [colors] * len(xs)
+        w = self._w
+        script = "\n".join("{} create line {} {} {} {} -fill {{{}}}".format(w, x, y, x+1, y, c)
+                            for x, y, c in zip(xs, ys, colors))
+        if script:
+            self.tk.eval(script)
+        self.__autoflush()
+
     def flush(self):
         """Update drawing to the window"""
         self.__checkOpen()
@@ -355,6 +490,32 @@ class GraphWin(tk.Canvas):
         self.lastKey = ""
         return key
             
+    def checkWheel(self):
+        """Return (clicks, Point) for mouse wheel turns since last call,
+        clicks positive for up/away, Point where the mouse was; or None.
+        Doesn't update the window: call after checkMouse() or update()"""
+        if self.isClosed():
+            raise GraphicsError("checkWheel in closed window")
+        if not self.wheel:
+            return None
+        clicks = self.wheel
+        self.wheel = 0
+        return clicks, Point(*self.toWorld(self.wheelX, self.wheelY))
+
+    def checkDrag(self):
+        """Return (dx, dy), how far the mouse was dragged with the right
+        button held since last call, in window coordinates; or None.
+        Doesn't update the window: call after checkMouse() or update()"""
+        if self.isClosed():
+            raise GraphicsError("checkDrag in closed window")
+        dx, dy = self.dragged
+        if not dx and not dy:
+            return None
+        self.dragged = [0, 0]
+        x0, y0 = self.toWorld(0, 0)
+        x1, y1 = self.toWorld(dx, dy)
+        return x1 - x0, y1 - y0
+
     def getHeight(self):
         """Return the height of the window"""
         return self.height
@@ -420,6 +581,19 @@ class Transform:
         ys = (self.ybase-y) / self.yscale
         return int(xs+0.5),int(ys+0.5)
         
+    def screen_many(self, xs, ys):
+        # Returns screen x and y lists for sequences xs, ys; numpy arrays
+        # come back as integer arrays, done without a Python loop
+        xbase = self.xbase
+        ybase = self.ybase
+        xscale = self.xscale
+        yscale = self.yscale
+        if hasattr(xs, "astype"):
+            return (((xs - xbase) / xscale + 0.5).astype(int),
+                    ((ybase - ys) / yscale + 0.5).astype(int))
+        return ([int((x - xbase) / xscale + 0.5) for x in xs],
+                [int((ybase - y) / yscale + 0.5) for y in ys])
+
     def world(self,xs,ys):
         # Returns xs,ys in world coordinates
         x = xs*self.xscale + self.xbase
@@ -480,6 +654,7 @@ class GraphicsObject:
 
         if self.canvas and not self.canvas.isClosed(): raise GraphicsError(OBJ_ALREADY_DRAWN)
         if graphwin.isClosed(): raise GraphicsError("Can't draw to closed window")
+        graphwin._unqueue(self)
         self.canvas = graphwin
         self.id = self._draw(graphwin, self.config)
         graphwin.addItem(self)
@@ -495,6 +670,7 @@ class GraphicsObject:
         
         if not self.canvas: return
         if not self.canvas.isClosed():
+            self.canvas._unqueue(self)
             self.canvas.delete(self.id)
             self.canvas.delItem(self)
             if self.canvas.autoflush:
@@ -518,6 +694,9 @@ class GraphicsObject:
             else:
                 x = dx
                 y = dy
+            if canvas._pending is not None:
+                canvas._queue(self, x, y)
+                return
             self.canvas.move(self.id, x, y)
             if canvas.autoflush:
                 _root.update()
@@ -531,6 +710,9 @@ class GraphicsObject:
         options = self.config
         options[option] = setting
         if self.canvas and not self.canvas.isClosed():
+            if self.canvas._pending is not None:
+                self.canvas._queue(self, option=option, setting=setting)
+                return
             self.canvas.itemconfig(self.id, options)
             if self.canvas.autoflush:
                 _root.update()
@@ -688,6 +870,72 @@ class Line(_BBox):
         self._reconfig("arrow", option)
         
 
+class Polyline(GraphicsObject):
+
+    """An open path through any number of points, drawn as one canvas
+    item. extend() adds points and just resets that item's coords."""
+
+    def __init__(self, *points):
+        # if points passed as a list, extract it
+        if len(points) == 1 and type(points[0]) == type([]):
+            points = points[0]
+        self.points = [(p.x, p.y) for p in points]
+        GraphicsObject.__init__(self, ["fill", "width"])
+        self.setFill(DEFAULT_CONFIG['outline'])
+        self.setOutline = self.setFill
+
+    def __repr__(self):
+        return "Polyline({} points)".format(len(self.points))
+
+    def clone(self):
+        other = Polyline([Point(x, y) for x, y in self.points])
+        other.config = self.config.copy()
+        return other
+
+    def getPoints(self):
+        return [Point(x, y) for x, y in self.points]
+
+    def extend(self, points):
+        """Add points (Point objects or (x, y) pairs) to the end"""
+        for p in points:
+            if isinstance(p, Point):
+                self.points.append((p.x, p.y))
+            else:
+                self.points.append((p[0], p[1]))
+        canvas = self.canvas
+        if canvas and not canvas.isClosed():
+            if canvas._pending is not None:
+                canvas._queue(self, coords=True)
+                return
+            self._recoords()
+            if canvas.autoflush:
+                _root.update()
+
+    def _flat(self, canvas):
+        if canvas.trans:
+            xs, ys = canvas.trans.screen_many([p[0] for p in self.points],
+                                              [p[1] for p in self.points])
+        else:
+            xs = [p[0] for p in self.points]
+            ys = [p[1] for p in self.points]
+        flat = []
+        for x, y in zip(xs, ys):
+            flat.append(x)
+            flat.append(y)
+        while len(flat) < 4:   # Tk lines need two points
+            flat.extend(flat[-2:] if flat else [0, 0])
+        return flat
+
+    def _recoords(self):
+        self.canvas.coords(self.id, *self._flat(self.canvas))
+
+    def _move(self, dx, dy):
+        self.points = [(x + dx, y + dy) for x, y in self.points]
+
+    def _draw(self, canvas, options):
+        return canvas.create_line(*self._flat(canvas), **options)
+
+
 class Polygon(GraphicsObject):
     
     def __init__(self, *points):
@@ -787,7 +1035,7 @@ class Entry(GraphicsObject):
         self.anchor = p.clone()
         #print self.anchor
         self.width = width
-        self.text = tk.StringVar(_root)
+        self.text = tk.StringVar(_tkroot())
         self.text.set("")
         self.fill = "gray"
         self.color = "black"
@@ -882,10 +1130,10 @@ class Image(GraphicsObject):
         self.imageId = Image.idCount
         Image.idCount = Image.idCount + 1
         if len(pixmap) == 1: # file name provided
-            self.img = tk.PhotoImage(file=pixmap[0], master=_root)
+            self.img = tk.PhotoImage(file=pixmap[0], master=_tkroot())
         else: # width and height provided
             width, height = pixmap
-            self.img = tk.PhotoImage(master=_root, width=width, height=height)
+            self.img = tk.PhotoImage(master=_tkroot(), width=width, height=height)
 
     def __repr__(self):
         return "Image({}, {}, {})".format(self.anchor, self.getWidth(), self.getHeight())
@@ -955,6 +1203,120 @@ class Image(GraphicsObject):
         ext = name.split(".")[-1]
         self.img.write( filename, format=ext)
 
+
+
+class Raster(Image):
+
+    """A window-sized Image that works as a pixel buffer, for drawing
+    many points that stay put (trails, star fields) as one canvas item
+    instead of one item each. plot and plotPixel only change the buffer;
+    flush() sends the changed rows to Tk in a few bulk puts. Draw it
+    first so it lies under everything else. Memory is fixed by the
+    window size, however many points are drawn.
+
+    Given left, top, width and height it covers only that part of the
+    window; plotPixel then counts from its own top left corner."""
+
+    def __init__(self, win, background="black", left=0, top=0, width=None, height=None):
+        self.width = win.getWidth() if width is None else width
+        self.height = win.getHeight() if height is None else height
+        Image.__init__(self, Point(0,0), self.width, self.height)
+        self.win = win
+        self.left = left
+        self.top = top
+        self.background = background
+        self.rows = [None] * self.height   # lists of colors, made when first used
+        self.dirty = {}                    # row -> [first, last] column changed
+        self.img.put(background, to=(0, 0, self.width, self.height))
+
+    def __repr__(self):
+        return "Raster({}, {})".format(self.width, self.height)
+
+    def _draw(self, canvas, options):
+        self.imageCache[self.imageId] = self.img
+        return canvas.create_image(self.left, self.top, image=self.img, anchor="nw")
+
+    def plot(self, x, y, color="black"):
+        """Set the pixel at window coordinates (x,y) to color"""
+        xs, ys = self.win.toScreen(x, y)
+        self.plotPixel(xs - self.left, ys - self.top, color)
+
+    def plotPixel(self, x, y, color="black"):
+        """Set raw pixel (x,y) to color; off-window points are ignored"""
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return
+        row = self.rows[y]
+        if row is None:
+            row = self.rows[y] = [self.background] * self.width
+        row[x] = color
+        span = self.dirty.get(y)
+        if span is None:
+            self.dirty[y] = [x, x]
+        elif x < span[0]:
+            span[0] = x
+        elif x > span[1]:
+            span[1] = x
+
+    def plot_many(self, xs, ys, colors="black", raw=False):
+        """plot (or plotPixel, if raw) for sequences of points"""
+        if not raw:
+            xs, ys = self.win.trans.screen_many(xs, ys) if self.win.trans else (xs, ys)
+            if self.left or self.top:
+                xs = [x - self.left for x in xs]
+                ys = [y - self.top for y in ys]
+        if isinstance(colors, str):
+            for x, y in zip(xs, ys):
+                self.plotPixel(int(x), int(y), colors)
+        else:
+            for x, y, c in zip(xs, ys, colors):
+                self.plotPixel(int(x), int(y), c)
+
+    def getPixel(self, x, y):
+        row = self.rows[y]
+        color = self.background if row is None else row[x]
+        return [c // 256 for c in self.win.winfo_rgb(color)]
+
+    def setPixel(self, x, y, color):
+        self.plotPixel(x, y, color)
+        self.flush()
+
+    def flush(self):
+        """Send changed pixels to Tk: runs of neighboring changed rows go
+        as one rectangle when that wastes little, else row by row"""
+        if not self.dirty:
+            return
+        dirty = self.dirty
+        self.dirty = {}
+        rows = sorted(dirty)
+        first = rows[0]
+        lo, hi = dirty[first]
+        last = first
+        used = hi - lo + 1   # pixels actually changed, roughly
+        for y in rows[1:] + [None]:
+            if y is not None and y == last + 1:
+                a, b = dirty[y]
+                newlo = min(lo, a)
+                newhi = max(hi, b)
+                if (newhi - newlo + 1) * (y - first + 1) <= used + (b - a + 1) + 256:
+                    lo, hi, last = newlo, newhi, y
+                    used += b - a + 1
+                    continue
+            self._put(first, last, lo, hi)
+            if y is not None:
+                first = last = y
+                lo, hi = dirty[y]
+                used = hi - lo + 1
+
+    def clear(self):
+        """Set every pixel back to the background"""
+        self.rows = [None] * self.height
+        self.dirty = {}
+        self.img.put(self.background, to=(0, 0, self.width, self.height))
+
+    def _put(self, first, last, lo, hi):
+        data = " ".join("{" + " ".join(self.rows[y][lo:hi+1]) + "}"
+                        for y in range(first, last+1))
+        self.img.put(data, (lo, first))
         
 def color_rgb(r,g,b):
     """r,g,b are intensities of red, green, and blue in range(256)
@@ -1008,8 +1370,7 @@ def test():
 #MacOS fix 2
 #tk.Toplevel(_root).destroy()
 
-# MacOS fix 1
-update()
+# MacOS fix 1 is in _tkroot()
 
 if __name__ == "__main__":
     test()
@@ -0,0 +1,161 @@
+# nullgraphics.py
+"""Do-nothing stand-in for graphics.py.
+
+The GraphWin and GraphicsObject calls the view makes are accepted and
+ignored, so a script drawn through it costs only the calls themselves:
+handy for timing the physics and its observers with the display code
+still in the loop.  Each is a plain method doing nothing, so a call is as
+cheap as a call gets.  Coordinates are real: setCoords, toScreen and
+toWorld work as in graphics.py, for code that places things by them.
+"""
+
+from contextlib import contextmanager
+
+
+class GraphicsError(Exception):
+    """Generic error class for graphics module exceptions."""
+    pass
+
+
+def update(rate=None):
+    pass
+
+
+def color_rgb(r, g, b):
+    return "#%02x%02x%02x" % (r, g, b)
+
+
+class Transform:
+
+    """Internal class for 2-D coordinate transformations"""
+
+    def __init__(self, w, h, xlow, ylow, xhigh, yhigh):
+        xspan = (xhigh-xlow)
+        yspan = (yhigh-ylow)
+        self.xbase = xlow
+        self.ybase = yhigh
+        self.xscale = xspan/float(w-1)
+        self.yscale = yspan/float(h-1)
+
+    def screen(self, x, y):
+        xs = (x-self.xbase) / self.xscale
+        ys = (self.ybase-y) / self.yscale
+        return int(xs+0.5), int(ys+0.5)
+
+    def world(self, xs, ys):
+        x = xs*self.xscale + self.xbase
+        y = self.ybase - ys*self.yscale
+        return x, y
+
+
+class GraphWin:
+
+    """A GraphWin that shows nothing"""
+
+    def __init__(self, title="Graphics Window", width=200, height=200, autoflush=True):
+        self.width = int(width)
+        self.height = int(height)
+        self.trans = None
+
+    def setCoords(self, x1, y1, x2, y2):
+        self.trans = Transform(self.width, self.height, x1, y1, x2, y2)
+
+    def toScreen(self, x, y):
+        if self.trans:
+            return self.trans.screen(x, y)
+        return x, y
+
+    def toWorld(self, x, y):
+        if self.trans:
+            return self.trans.world(x, y)
+        return x, y
+
+    @contextmanager
+    def frame(self):
+        yield self
+
+    def isClosed(self):
+        return False
+
+    def isOpen(self):
+        return True
+
+    def getWidth(self):
+        return self.width
+
+    def getHeight(self):
+        return self.height
+
+    def setBackground(self, color): pass
+    def close(self): pass
+    def flush(self): pass
+    def plot(self, x, y, color="black"): pass
+    def plotPixel(self, x, y, color="black"): pass
+    def plot_many(self, xs, ys, colors="black", raw=False): pass
+    def getMouse(self): return None
+    def checkMouse(self): return None
+    def getKey(self): return ""
+    def checkKey(self): return ""
+    def checkWheel(self): return None
+    def checkDrag(self): return None
+
+
+class GraphicsObject:
+
+    """Drawable that draws nothing"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def draw(self, graphwin):
+        return self
+
+    def undraw(self): pass
+    def move(self, dx, dy): pass
+    def setFill(self, color): pass
+    def setOutline(self, color): pass
+    def setWidth(self, width): pass
+
+
+class Point(GraphicsObject):
+
+    def __init__(self, x, y):
+        self.x = float(x)
+        self.y = float(y)
+
+    def getX(self): return self.x
+    def getY(self): return self.y
+
+
+class Text(GraphicsObject):
+
+    def __init__(self, p, text):
+        self.anchor = p
+        self.text = text
+
+    def getAnchor(self):
+        return self.anchor
+
+    def setText(self, text):
+        self.text = text
+
+    def getText(self):
+        return self.text
+
+    def setTextColor(self, color): pass
+    def setFace(self, face): pass
+    def setSize(self, size): pass
+    def setStyle(self, style): pass
+
+
+class Raster(GraphicsObject):
+
+    def plot(self, x, y, color="black"): pass
+    def plotPixel(self, x, y, color="black"): pass
+    def plot_many(self, xs, ys, colors="black", raw=False): pass
+    def setPixel(self, x, y, color): pass
+    def clear(self): pass
+    def flush(self): pass
+
+
+Circle = Oval = Rectangle = Line = Polyline = Polygon = Entry = Image = GraphicsObject
@@ -0,0 +1,716 @@
+# offscreen.py
+"""Offscreen stand-in for graphics.py, for machines with no display.
+
+Same GraphWin and GraphicsObject API as graphics.py, as far as TerraLunar
+uses it (Point, Circle, Oval, Rectangle, Line, Polyline, Text, Raster,
+plot, plotPixel, plot_many, setCoords, move, frame), but drawing goes into
+an in-memory RGB framebuffer instead of a Tk window.  Needs nothing but
+the standard library.
+
+Pixels from plot and plotPixel stay put, as on a Tk canvas; Rasters and
+the objects are drawn over them in drawing order each time a frame is made:
+
+    win.save('frame.png')     # or .ppm
+    win.writeframe(f)         # raw RGB bytes, width*height*3 per frame
+
+FrameWriter numbers frame files or appends frames to one raw stream, e.g.
+for ffmpeg -f rawvideo -pix_fmt rgb24 -s WxH -i frames.rgb out.mp4
+"""
+
+import math
+import struct
+import sys
+import zlib
+from contextlib import contextmanager
+
+
+class GraphicsError(Exception):
+    """Generic error class for graphics module exceptions."""
+    pass
+
+
+# X11 values, as Tk uses
+COLORS = {"black": (0, 0, 0), "white": (255, 255, 255), "red": (255, 0, 0),
+          "green": (0, 255, 0), "blue": (0, 0, 255), "cyan": (0, 255, 255),
+          "magenta": (255, 0, 255), "yellow": (255, 255, 0), "grey": (190, 190, 190),
+          "gray": (190, 190, 190), "pink": (255, 192, 203), "tan": (210, 180, 140),
+          "orange": (255, 165, 0), "purple": (160, 32, 240), "brown": (165, 42, 42),
+          "darkgrey": (169, 169, 169), "darkgray": (169, 169, 169),
+          "lightgrey": (211, 211, 211), "lightgray": (211, 211, 211)}
+
+
+def rgb(color):
+    # color name or #rrggbb -> 3 bytes; '' (no fill) -> None
+    if not color:
+        return None
+    if color.startswith("#") and len(color) == 7:
+        return bytes.fromhex(color[1:])
+    try:
+        return bytes(COLORS[color.lower().replace(" ", "")])
+    except KeyError:
+        raise GraphicsError("unknown color " + repr(color))
+
+
+def color_rgb(r, g, b):
+    """r,g,b are intensities of red, green, and blue in range(256)
+    Returns color specifier string for the resulting color"""
+    return "#%02x%02x%02x" % (r, g, b)
+
+
+def update(rate=None):
+    pass
+
+
+# 5x7 font, one hex byte per row, high bit on the left
+FONT = {
+    " ": "00000000000000", "0": "0e11131519110e",
+    "1": "040c040404040e", "2": "0e11010204081f",
+    "3": "1f02040201110e", "4": "02060a121f0202",
+    "5": "1f101e0101110e", "6": "0608101e11110e",
+    "7": "1f010204080808", "8": "0e11110e11110e", "9": "0e11110f01020c",
+    "A": "0e11111f111111", "B": "1e11111e11111e", "C": "0e11101010110e",
+    "D": "1c12111111121c", "E": "1f10101e10101f",
+    "F": "1f10101e101010", "G": "0e11101711110f",
+    "H": "1111111f111111", "I": "0e04040404040e", "J": "0702020202120c",
+    "K": "11121418141211", "L": "1010101010101f", "M": "111b1515111111",
+    "N": "11111915131111", "O": "0e11111111110e", "P": "1e11111e101010",
+    "Q": "0e11111115120d", "R": "1e11111e141211", "S": "0f10100e01011e",
+    "T": "1f040404040404", "U": "1111111111110e", "V": "11111111110a04",
+    "W": "1111111515150a", "X": "11110a040a1111", "Y": "1111110a040404",
+    "Z": "1f01020408101f", ".": "00000000000c0c", ",": "000000000c0408",
+    ":": "000c0c000c0c00", ";": "000c0c000c0408", "!": "04040404040004",
+    "?": "0e110102040004", "-": "0000001f000000", "+": "0004041f040400",
+    "=": "00001f001f0000", "/": "00010204081000", "(": "02040808080402",
+    ")": "08040202020408", "#": "0a0a1f0a1f0a0a", "@": "0e11010d15150e",
+    "%": "18190204081303", "'": "0c040800000000", '"': "0a0a0a00000000",
+    "_": "0000000000001f", "<": "02040810080402", ">": "08040201020408",
+    "*": "0004150e150400", "[": "0e08080808080e", "]": "0e02020202020e",
+}
+FONT = {c: bytes.fromhex(rows) for c, rows in FONT.items()}
+
+
+class Transform:
+
+    """Internal class for 2-D coordinate transformations"""
+
+    def __init__(self, w, h, xlow, ylow, xhigh, yhigh):
+        xspan = (xhigh-xlow)
+        yspan = (yhigh-ylow)
+        self.xbase = xlow
+        self.ybase = yhigh
+        self.xscale = xspan/float(w-1)
+        self.yscale = yspan/float(h-1)
+
+    def screen(self, x, y):
+        xs = (x-self.xbase) / self.xscale
+        ys = (self.ybase-y) / self.yscale
+        return int(xs+0.5), int(ys+0.5)
+
+    def screen_many(self, xs, ys):
+        if hasattr(xs, "astype"):
+            return (((xs - self.xbase) / self.xscale + 0.5).astype(int),
+                    ((self.ybase - ys) / self.yscale + 0.5).astype(int))
+        return ([int((x - self.xbase) / self.xscale + 0.5) for x in xs],
+                [int((self.ybase - y) / self.yscale + 0.5) for y in ys])
+
+    def world(self, xs, ys):
+        x = xs*self.xscale + self.xbase
+        y = self.ybase - ys*self.yscale
+        return x, y
+
+
+class GraphWin:
+
+    """A GraphWin drawn into memory rather than onto the screen."""
+
+    def __init__(self, title="Graphics Window", width=200, height=200, autoflush=True):
+        self.title = title
+        self.width = int(width)
+        self.height = int(height)
+        self.autoflush = autoflush
+        self.items = []
+        self.trans = None
+        self.closed = False
+        self.background = rgb("white")
+        self.base = bytearray(self.background * (self.width * self.height))
+
+    def __repr__(self):
+        return "GraphWin('{}', {}, {})".format(self.title, self.width, self.height)
+
+    def setBackground(self, color):
+        """Set background color; clears anything plotted so far"""
+        self.background = rgb(color)
+        self.base[:] = self.background * (self.width * self.height)
+
+    def setCoords(self, x1, y1, x2, y2):
+        self.trans = Transform(self.width, self.height, x1, y1, x2, y2)
+
+    def close(self):
+        self.closed = True
+
+    def isClosed(self):
+        return self.closed
+
+    def isOpen(self):
+        return not self.closed
+
+    def plot(self, x, y, color="black"):
+        xs, ys = self.toScreen(x, y)
+        self.plotPixel(xs, ys, color)
+
+    def plotPixel(self, x, y, color="black"):
+        x = int(x)
+        y = int(y)
+        if 0 <= x < self.width and 0 <= y < self.height:
+            i = 3 * (y*self.width + x)
+            self.base[i:i+3] = rgb(color)
+
+    def plot_many(self, xs, ys, colors="black", raw=False):
+        if not raw and self.trans:
+            xs, ys = self.trans.screen_many(xs, ys)
+        if isinstance(colors, str):
+            colors = [colors] * len(xs)
+        for x, y, c in zip(xs, ys, colors):
+            self.plotPixel(x, y, c)
+
+    def flush(self):
+        pass
+
+    def begin_frame(self):
+        pass
+
+    def end_frame(self):
+        pass
+
+    @contextmanager
+    def frame(self):
+        yield self
+
+    def getMouse(self):
+        return Point(0, 0)   # nobody to click; carry on
+
+    def checkMouse(self):
+        return None
+
+    def getKey(self):
+        return ""
+
+    def checkKey(self):
+        return ""
+
+    def checkWheel(self):
+        return None
+
+    def checkDrag(self):
+        return None
+
+    def getHeight(self):
+        return self.height
+
+    def getWidth(self):
+        return self.width
+
+    def toScreen(self, x, y):
+        if self.trans:
+            return self.trans.screen(x, y)
+        return x, y
+
+    def toWorld(self, x, y):
+        if self.trans:
+            return self.trans.world(x, y)
+        return x, y
+
+    def addItem(self, item):
+        self.items.append(item)
+
+    def delItem(self, item):
+        self.items.remove(item)
+
+    # making frames
+
+    def render(self):
+        """Returns the current picture as width*height*3 RGB bytes"""
+        buf = bytearray(self.base)
+        for item in self.items:
+            item._render(self, buf)
+        return buf
+
+    def span(self, buf, y, xa, xb, color):
+        # set pixels xa..xb of row y, clipped to the window
+        if color is None or y < 0 or y >= self.height:
+            return
+        xa = max(0, int(xa))
+        xb = min(self.width - 1, int(xb))
+        if xb < xa:
+            return
+        i = 3 * (y*self.width + xa)
+        buf[i:i + 3*(xb - xa + 1)] = color * (xb - xa + 1)
+
+    def writeframe(self, f):
+        f.write(self.render())
+
+    def save(self, filename):
+        """Write the current picture as .png, or .ppm for anything else"""
+        buf = self.render()
+        with open(filename, "wb") as f:
+            if filename.lower().endswith(".png"):
+                f.write(png(buf, self.width, self.height))
+            else:
+                f.write(b"P6 %d %d 255\n" % (self.width, self.height))
+                f.write(buf)
+
+
+def png(buf, width, height):
+    # RGB bytes -> PNG file contents
+    stride = 3 * width
+    raw = b"".join(b"\x00" + bytes(buf[y*stride:(y+1)*stride]) for y in range(height))
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 1))
+            + chunk(b"IEND", b""))
+
+
+# Default values for various item configuration options, as graphics.py
+DEFAULT_CONFIG = {"fill": "",
+                  "outline": "black",
+                  "width": "1",
+                  "arrow": "none",
+                  "text": "",
+                  "justify": "center",
+                  "font": ("helvetica", 12, "normal")}
+
+
+class GraphicsObject:
+
+    """Generic base class for all of the drawable objects"""
+
+    def __init__(self, options):
+        self.canvas = None
+        self.id = None
+        config = {}
+        for option in options:
+            config[option] = DEFAULT_CONFIG[option]
+        self.config = config
+
+    def setFill(self, color):
+        self._reconfig("fill", color)
+
+    def setOutline(self, color):
+        self._reconfig("outline", color)
+
+    def setWidth(self, width):
+        self._reconfig("width", width)
+
+    def draw(self, graphwin):
+        if self.canvas and not self.canvas.isClosed(): raise GraphicsError("Object currently drawn")
+        if graphwin.isClosed(): raise GraphicsError("Can't draw to closed window")
+        self.canvas = graphwin
+        graphwin.addItem(self)
+        return self
+
+    def undraw(self):
+        if not self.canvas: return
+        self.canvas.delItem(self)
+        self.canvas = None
+
+    def move(self, dx, dy):
+        self._move(dx, dy)
+
+    def _reconfig(self, option, setting):
+        if option not in self.config:
+            raise GraphicsError("Object doesn't support operation")
+        self.config[option] = setting
+
+    def _move(self, dx, dy):
+        pass
+
+    def _render(self, win, buf):
+        pass
+
+
+class Point(GraphicsObject):
+    def __init__(self, x, y):
+        GraphicsObject.__init__(self, ["outline", "fill"])
+        self.setFill = self.setOutline
+        self.x = float(x)
+        self.y = float(y)
+
+    def __repr__(self):
+        return "Point({}, {})".format(self.x, self.y)
+
+    def _move(self, dx, dy):
+        self.x = self.x + dx
+        self.y = self.y + dy
+
+    def _render(self, win, buf):
+        x, y = win.toScreen(self.x, self.y)
+        win.span(buf, y, x, x, rgb(self.config["outline"]))
+
+    def clone(self):
+        other = Point(self.x, self.y)
+        other.config = self.config.copy()
+        return other
+
+    def getX(self): return self.x
+    def getY(self): return self.y
+
+
+class _BBox(GraphicsObject):
+
+    def __init__(self, p1, p2, options=["outline", "width", "fill"]):
+        GraphicsObject.__init__(self, options)
+        self.p1 = p1.clone()
+        self.p2 = p2.clone()
+
+    def _move(self, dx, dy):
+        self.p1.x = self.p1.x + dx
+        self.p1.y = self.p1.y + dy
+        self.p2.x = self.p2.x + dx
+        self.p2.y = self.p2.y + dy
+
+    def getP1(self): return self.p1.clone()
+
+    def getP2(self): return self.p2.clone()
+
+    def getCenter(self):
+        p1 = self.p1
+        p2 = self.p2
+        return Point((p1.x+p2.x)/2.0, (p1.y+p2.y)/2.0)
+
+    def _box(self, win):
+        x1, y1 = win.toScreen(self.p1.x, self.p1.y)
+        x2, y2 = win.toScreen(self.p2.x, self.p2.y)
+        return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+class Rectangle(_BBox):
+
+    def __init__(self, p1, p2):
+        _BBox.__init__(self, p1, p2)
+
+    def __repr__(self):
+        return "Rectangle({}, {})".format(str(self.p1), str(self.p2))
+
+    def clone(self):
+        other = Rectangle(self.p1, self.p2)
+        other.config = self.config.copy()
+        return other
+
+    def _render(self, win, buf):
+        x1, y1, x2, y2 = self._box(win)
+        fill = rgb(self.config["fill"])
+        outline = rgb(self.config["outline"])
+        w = int(self.config["width"])
+        for y in range(max(0, y1), min(win.height - 1, y2) + 1):
+            if outline is None or w <= 0 or y1 + w <= y <= y2 - w:
+                win.span(buf, y, x1 + w, x2 - w, fill)
+                if outline is not None and w > 0:
+                    win.span(buf, y, x1, x1 + w - 1, outline)
+                    win.span(buf, y, x2 - w + 1, x2, outline)
+            else:
+                win.span(buf, y, x1, x2, outline)
+
+
+class Oval(_BBox):
+
+    def __init__(self, p1, p2):
+        _BBox.__init__(self, p1, p2)
+
+    def __repr__(self):
+        return "Oval({}, {})".format(str(self.p1), str(self.p2))
+
+    def clone(self):
+        other = Oval(self.p1, self.p2)
+        other.config = self.config.copy()
+        return other
+
+    def _render(self, win, buf):
+        x1, y1, x2, y2 = self._box(win)
+        fill = rgb(self.config["fill"])
+        outline = rgb(self.config["outline"])
+        w = int(self.config["width"]) if outline is not None else 0
+        cx = 0.5 * (x1 + x2)
+        cy = 0.5 * (y1 + y2)
+        rx = max(0.5, 0.5 * (x2 - x1))
+        ry = max(0.5, 0.5 * (y2 - y1))
+        for y in range(max(0, int(cy - ry)), min(win.height - 1, int(cy + ry)) + 1):
+            d = (y - cy) / ry
+            if abs(d) > 1.0:
+                continue
+            half = rx * math.sqrt(1.0 - d*d)
+            xa = int(round(cx - half))
+            xb = int(round(cx + half))
+            if w <= 0:
+                win.span(buf, y, xa, xb, fill)
+                continue
+            inrx = rx - w
+            inry = ry - w
+            d = (y - cy) / inry if inry > 0 else 2.0
+            if inrx <= 0 or abs(d) >= 1.0:
+                win.span(buf, y, xa, xb, outline)   # outline all the way across
+                continue
+            inhalf = inrx * math.sqrt(1.0 - d*d)
+            ia = int(round(cx - inhalf))
+            ib = int(round(cx + inhalf))
+            win.span(buf, y, ia, ib, fill)
+            win.span(buf, y, xa, ia - 1, outline)
+            win.span(buf, y, ib + 1, xb, outline)
+
+
+class Circle(Oval):
+
+    def __init__(self, center, radius):
+        p1 = Point(center.x-radius, center.y-radius)
+        p2 = Point(center.x+radius, center.y+radius)
+        Oval.__init__(self, p1, p2)
+        self.radius = radius
+
+    def __repr__(self):
+        return "Circle({}, {})".format(str(self.getCenter()), str(self.radius))
+
+    def clone(self):
+        other = Circle(self.getCenter(), self.radius)
+        other.config = self.config.copy()
+        return other
+
+    def getRadius(self):
+        return self.radius
+
+
+def _segment(win, buf, x0, y0, x1, y1, color):
+    # Bresenham line, one pixel wide
+    dx = abs(x1 - x0)
+    dy = -abs(y1 - y0)
+    sx = 1 if x0 < x1 else -1
+    sy = 1 if y0 < y1 else -1
+    err = dx + dy
+    while True:
+        win.span(buf, y0, x0, x0, color)
+        if x0 == x1 and y0 == y1:
+            return
+        e2 = 2 * err
+        if e2 >= dy:
+            err += dy
+            x0 += sx
+        if e2 <= dx:
+            err += dx
+            y0 += sy
+
+
+class Line(_BBox):
+
+    def __init__(self, p1, p2):
+        _BBox.__init__(self, p1, p2, ["arrow", "fill", "width"])
+        self.setFill(DEFAULT_CONFIG['outline'])
+        self.setOutline = self.setFill
+
+    def __repr__(self):
+        return "Line({}, {})".format(str(self.p1), str(self.p2))
+
+    def clone(self):
+        other = Line(self.p1, self.p2)
+        other.config = self.config.copy()
+        return other
+
+    def setArrow(self, option):
+        self._reconfig("arrow", option)
+
+    def _render(self, win, buf):
+        x1, y1 = win.toScreen(self.p1.x, self.p1.y)
+        x2, y2 = win.toScreen(self.p2.x, self.p2.y)
+        _segment(win, buf, x1, y1, x2, y2, rgb(self.config["fill"]))
+
+
+class Polyline(GraphicsObject):
+
+    def __init__(self, *points):
+        if len(points) == 1 and type(points[0]) == type([]):
+            points = points[0]
+        self.points = [(p.x, p.y) for p in points]
+        GraphicsObject.__init__(self, ["fill", "width"])
+        self.setFill(DEFAULT_CONFIG['outline'])
+        self.setOutline = self.setFill
+
+    def __repr__(self):
+        return "Polyline({} points)".format(len(self.points))
+
+    def getPoints(self):
+        return [Point(x, y) for x, y in self.points]
+
+    def extend(self, points):
+        for p in points:
+            if isinstance(p, Point):
+                self.points.append((p.x, p.y))
+            else:
+                self.points.append((p[0], p[1]))
+
+    def _move(self, dx, dy):
+        self.points = [(x + dx, y + dy) for x, y in self.points]
+
+    def _render(self, win, buf):
+        color = rgb(self.config["fill"])
+        last = None
+        for x, y in self.points:
+            here = win.toScreen(x, y)
+            if last is not None:
+                _segment(win, buf, last[0], last[1], here[0], here[1], color)
+            last = here
+
+
+class Text(GraphicsObject):
+
+    def __init__(self, p, text):
+        GraphicsObject.__init__(self, ["justify", "fill", "text", "font"])
+        self.setText(text)
+        self.anchor = p.clone()
+        self.setFill(DEFAULT_CONFIG['outline'])
+        self.setOutline = self.setFill
+
+    def __repr__(self):
+        return "Text({}, '{}')".format(self.anchor, self.getText())
+
+    def _move(self, dx, dy):
+        self.anchor.move(dx, dy)
+
+    def clone(self):
+        other = Text(self.anchor, self.config['text'])
+        other.config = self.config.copy()
+        return other
+
+    def setText(self, text):
+        self._reconfig("text", text)
+
+    def getText(self):
+        return self.config["text"]
+
+    def getAnchor(self):
+        return self.anchor.clone()
+
+    def setFace(self, face):
+        f, s, b = self.config['font']
+        self._reconfig("font", (face, s, b))
+
+    def setSize(self, size):
+        f, s, b = self.config['font']
+        self._reconfig("font", (f, size, b))
+
+    def setStyle(self, style):
+        f, s, b = self.config['font']
+        self._reconfig("font", (f, s, style))
+
+    def setTextColor(self, color):
+        self.setFill(color)
+
+    def _render(self, win, buf):
+        # the 5x7 font scaled to about the point size, centered on the anchor
+        color = rgb(self.config["fill"])
+        text = str(self.config["text"]).upper()
+        scale = max(1, int(self.config["font"][1]) // 10)
+        cx, cy = win.toScreen(self.anchor.x, self.anchor.y)
+        x0 = cx - (6*len(text) - 1) * scale // 2
+        y0 = cy - 7 * scale // 2
+        for n, ch in enumerate(text):
+            glyph = FONT.get(ch, FONT["?"])
+            left = x0 + 6*n*scale
+            for row, bits in enumerate(glyph):
+                if not bits:
+                    continue
+                for col in range(5):
+                    if bits & (0x10 >> col):
+                        xa = left + col*scale
+                        for k in range(scale):
+                            win.span(buf, y0 + row*scale + k, xa, xa + scale - 1, color)
+
+
+class Raster(GraphicsObject):
+
+    """graphics.Raster here: its own pixels, laid over the picture in
+    drawing order, the whole window or left, top, width, height of it"""
+
+    def __init__(self, win, background="black", left=0, top=0, width=None, height=None):
+        GraphicsObject.__init__(self, [])
+        self.win = win
+        self.width = win.getWidth() if width is None else width
+        self.height = win.getHeight() if height is None else height
+        self.left = left
+        self.top = top
+        self.background = background
+        self.pixels = bytearray(rgb(background) * (self.width * self.height))
+
+    def __repr__(self):
+        return "Raster({}, {})".format(self.width, self.height)
+
+    def plot(self, x, y, color="black"):
+        xs, ys = self.win.toScreen(x, y)
+        self.plotPixel(xs - self.left, ys - self.top, color)
+
+    def plotPixel(self, x, y, color="black"):
+        x = int(x)
+        y = int(y)
+        if 0 <= x < self.width and 0 <= y < self.height:
+            i = 3 * (y*self.width + x)
+            self.pixels[i:i+3] = rgb(color)
+
+    def plot_many(self, xs, ys, colors="black", raw=False):
+        if not raw and self.win.trans:
+            xs, ys = self.win.trans.screen_many(xs, ys)
+            xs = [x - self.left for x in xs]
+            ys = [y - self.top for y in ys]
+        if isinstance(colors, str):
+            colors = [colors] * len(xs)
+        for x, y, c in zip(xs, ys, colors):
+            self.plotPixel(x, y, c)
+
+    def setPixel(self, x, y, color):
+        self.plotPixel(x, y, color)
+
+    def clear(self):
+        self.pixels[:] = rgb(self.background) * (self.width * self.height)
+
+    def flush(self):
+        pass
+
+    def _render(self, win, buf):
+        # copy row by row, clipped to the window
+        lo = max(0, -self.left)
+        hi = min(self.width, win.width - self.left)
+        if hi <= lo:
+            return
+        for y in range(max(0, -self.top), min(self.height, win.height - self.top)):
+            src = 3 * (y*self.width + lo)
+            dst = 3 * ((y + self.top)*win.width + self.left + lo)
+            buf[dst:dst + 3*(hi - lo)] = self.pixels[src:src + 3*(hi - lo)]
+
+
+class FrameWriter:
+
+    """Saves frames from an offscreen GraphWin: out with a % in it is a
+    file name pattern (frame%06d.png, .ppm), '-' streams raw RGB frames to
+    stdout (the real one, sys.__stdout__, even if sys.stdout has been
+    pointed elsewhere), anything else is a file to write raw RGB frames to,
+    emptied first."""
+
+    def __init__(self, out):
+        self.out = out
+        self.count = 0
+        self.stream = None
+        if "%" not in out:
+            self.stream = sys.__stdout__.buffer if out == "-" else open(out, "wb")
+
+    def write(self, win):
+        if self.stream is not None:
+            win.writeframe(self.stream)
+        else:
+            win.save(self.out % self.count)
+        self.count += 1
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.flush()
+            if self.stream is not sys.__stdout__.buffer:
+                self.stream.close()
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+#
+# tlbench.py -- time the engine over setuplib, and catch slowdowns.
+#
+# Runs each chosen setup for a fixed step budget (or to its end, if that
+# comes first) under each integrator and backend, one run per fresh worker
+# process, and writes a JSON report: steps/sec, ns/step, peak RSS and a
+# checksum of the final state for each run.
+#
+#     python3 tlbench.py --out bench.json
+#     python3 tlbench.py 2 16 31 --integrators euler verlet --baseline bench.json
+#
+# Backends: none is the bare engine; null, offscreen and tk add a View
+# observer in lockstep, drawing with that graphics module (tk needs a
+# display), to see what the display code costs.
+#
+# Each run is repeated (--repeat, 5) and the median time kept: on a busy
+# machine it moves about less from report to report than the best of a few.
+#
+# With --baseline, each run is matched with the same setup, integrator and
+# backend in an earlier report.  A run is flagged slow if its ns/step grew
+# by more than --tolerance (20%), and changed if its checksum differs, i.e. the
+# numbers are no longer bit for bit the same.  Any flag makes the exit
+# status 1, for scripts.
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from multiprocessing import Pool
+
+import tlsim
+import tlinteg
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+backends = ('none', 'null', 'offscreen', 'tk')
+defaultsetups = (1, 2, 16, 25, 31)
+
+
+def checksum(sim):
+    # the final state, exactly: changes if any bit of the numbers does
+    state = (sim.steps, sim.orbits, sim.outcome, sim.simtime,
+             sim.shipx, sim.shipy, sim.shipvx, sim.shipvy)
+    text = repr([v.hex() if isinstance(v, float) else v for v in state])
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def peakrss():   # kilobytes, this process so far
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak   # bytes on MacOS
+
+
+def runone(job):   # runs in a worker process of its own
+    setupnum, integrator, backend, steps, repeat = job
+    times = []
+    for i in range(repeat):
+        inz = tlsim.grabsetup(setupnum)
+        inz.integrator = integrator
+        sim = tlsim.Simulation(inz, setupnum)
+        if backend != 'none':
+            import tlview
+            sim.attach(tlview.View(sim, 1930, 1040, gr=tlview.backend(backend)))
+        start = time.perf_counter()
+        sim.run_until('end', maxsteps=steps)
+        times.append(time.perf_counter() - start)
+    seconds = statistics.median(times)   # sim is the same every time
+    return {'setup': setupnum,
+            'integrator': integrator,
+            'backend': backend,
+            'steps': sim.steps,
+            'outcome': sim.outcome or 'budget',
+            'seconds': round(seconds, 4),
+            'repeat': repeat,
+            'sps': int(sim.steps / seconds) if seconds else None,
+            'ns_per_step': round(1e9 * seconds / sim.steps, 1) if sim.steps else None,
+            'peak_rss_kb': peakrss(),
+            'checksum': checksum(sim)}
+
+
+def key(row):
+    return (row['setup'], row['integrator'], row['backend'])
+
+
+def compare(results, steps, baseline, tolerance):
+    # rows of results flagged against baseline: (row, old, what); results
+    # only count as changed if both had the same step budget
+    old = {key(row): row for row in baseline['results']}
+    samebudget = baseline.get('steps') == steps
+    flags = []
+    for row in results:
+        was = old.get(key(row))
+        if was is None:
+            continue
+        if samebudget and row['checksum'] != was['checksum']:
+            flags.append((row, was, 'changed'))
+        if row['ns_per_step'] and was['ns_per_step'] and \
+                row['ns_per_step'] > was['ns_per_step'] * (1.0 + tolerance):
+            flags.append((row, was, 'slow'))
+    return flags
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark TerraLunar setups headless.')
+    parser.add_argument('setups', type=int, nargs='*', default=list(defaultsetups),
+                        help='setuplib numbers (default %s)' % ' '.join(map(str, defaultsetups)))
+    parser.add_argument('--steps', type=int, default=300000,
+                        help='step budget per run (default 300k)')
+    parser.add_argument('--integrators', nargs='+', default=['euler'],
+                        choices=tlinteg.names, help='default euler')
+    parser.add_argument('--backends', nargs='+', default=['none'], choices=backends,
+                        help='none (bare engine, default), null, offscreen, tk')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs of each, median time kept (default 5)')
+    parser.add_argument('--out', help='write the JSON report here (default: stdout)')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.20,
+                        help='ns/step growth allowed over the baseline (default 0.20)')
+    args = parser.parse_args(argv)
+
+    for n in args.setups:
+        if not 0 < n < len(tlsim.setuplib):
+            parser.error(f'setup must be 1..{len(tlsim.setuplib)-1}')
+    jobs = [(n, integrator, backend, args.steps, args.repeat)
+            for n in args.setups for integrator in args.integrators for backend in args.backends]
+
+    results = []
+    with Pool(1, maxtasksperchild=1) as pool:   # fresh process each, for peak RSS
+        for row in pool.imap(runone, jobs):
+            results.append(row)
+            print(f"{row['setup']:2d} {row['integrator']:9} {row['backend']:9} "
+                  f"{row['steps']:>9,} steps  {row['sps']:>9,} sps  {row['ns_per_step']:>8} ns/step  "
+                  f"{row['peak_rss_kb']} kB  {row['checksum']}", file=sys.stderr)
+
+    report = {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+              'python': platform.python_version(),
+              'machine': platform.machine(),
+              'system': platform.platform(),
+              'processor': platform.processor(),
+              'cpus': os.cpu_count(),
+              'steps': args.steps,
+              'results': results}
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        flags = compare(results, args.steps, baseline, args.tolerance)
+        report['baseline'] = args.baseline
+        report['flags'] = [dict(key=list(key(row)), what=what,
+                                ns_per_step=row['ns_per_step'], was=was['ns_per_step'])
+                           for row, was, what in flags]
+        for row, was, what in flags:
+            print(f"{what.upper()}: setup {row['setup']} {row['integrator']} {row['backend']}  "
+                  f"{was['ns_per_step']} -> {row['ns_per_step']} ns/step  "
+                  f"{was['checksum']} -> {row['checksum']}", file=sys.stderr)
+        if flags:
+            status = 1
+        else:
+            print(f"No slowdowns over {args.tolerance:.0%} against {args.baseline}", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=1)
+            f.write('\n')
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#
+# tlcheckpoint.py -- save a whole run to disk and pick it up again later.
+#
+# A json snapshot from grabsnap() is enough to replay a setup, but not to
+# carry on a run exactly: it leaves out simtime, steps, orbits, the exact
+# Moon phase and the integrator's own state.  A checkpoint keeps all of it
+# (Simulation.getstate()), so a resumed run gives the very same numbers as
+# one that never stopped.
+#
+# Files are a short header and a pickle of plain values, written to a
+# temporary file and renamed over the old one, so a crash while saving
+# leaves the previous checkpoint intact.  Pickles can run code when
+# loaded: only resume checkpoints you wrote yourself.
+
+import os
+import pickle
+import time
+
+import tlsim
+
+magic = b'TerraLunar checkpoint 1\n'
+
+
+def save(sim, path):
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(magic)
+        pickle.dump(sim.getstate(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def load(path):   # returns a Simulation, ready to step on
+    with open(path, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f'{path} is not a TerraLunar checkpoint')
+        state = pickle.load(f)
+    return tlsim.Simulation.fromstate(state)
+
+
+class Checkpointer:
+    # Observer which saves a checkpoint every so many seconds or steps,
+    # whichever comes first, looking at the clock every checktrigger steps.
+    # on_check comes in the middle of a step, so the save waits for step()
+    # to return: a checkpoint is always between two whole steps.
+
+    def __init__(self, path, seconds=600, steps=None):
+        self.path = path
+        self.seconds = seconds
+        self.steps = steps
+        self.saves = 0
+        self.lasttime = time.time()
+        self.laststeps = None
+
+    def on_check(self, sim):
+        if self.laststeps is None:
+            self.laststeps = sim.steps
+        due = self.seconds is not None and time.time() - self.lasttime >= self.seconds
+        due = due or (self.steps is not None and sim.steps - self.laststeps >= self.steps)
+        if due:
+            sim.after(self.save)
+
+    def save(self, sim):
+        save(sim, self.path)
+        self.saves += 1
+        self.lasttime = time.time()
+        self.laststeps = sim.steps
+
+
+def verify(setupnum, steps=60000, every=20000, integrator=None, path='tl-verify.ckpt'):
+    # Run setupnum for steps straight through, and again with a
+    # Checkpointer saving every `every` steps, stopped after its first save
+    # and resumed from the file.  Returns the names of the state fields that
+    # differ at the end, or None if the run ended before a checkpoint.
+    def fresh():
+        inz = tlsim.grabsetup(setupnum)
+        if integrator:
+            inz.integrator = integrator
+        return tlsim.Simulation(inz, setupnum)
+
+    straight = fresh()
+    straight.run_until('end', maxsteps=steps)
+
+    first = fresh()
+    checkpoints = first.attach(Checkpointer(path, seconds=None, steps=every))
+    first.run_until(lambda sim: checkpoints.saves > 0, maxsteps=steps, chunk=1000)
+    if checkpoints.saves == 0:   # ended first
+        return None
+    resumed = load(path)
+    os.remove(path)
+    resumed.run_until('end', maxsteps=steps - resumed.steps)
+    return [name for name in tlsim.Simulation.statefields
+            if getattr(resumed, name) != getattr(straight, name)]
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import tlinteg
+    parser = argparse.ArgumentParser(description='Check that a run resumed from a'
+                                     ' checkpoint carries on exactly as one never stopped.')
+    parser.add_argument('setups', type=int, nargs='*', default=[2, 16, 31])
+    parser.add_argument('--integrators', nargs='+', default=['euler'], choices=tlinteg.names)
+    parser.add_argument('--steps', type=int, default=60000)
+    parser.add_argument('--every', type=int, default=20000)
+    args = parser.parse_args()
+    failed = 0
+    for n in args.setups:
+        for integrator in args.integrators:
+            diff = verify(n, args.steps, args.every, integrator)
+            if diff is None:
+                print(f"{n:2d} {integrator:9} ended before a checkpoint")
+            else:
+                print(f"{n:2d} {integrator:9} {'same' if not diff else 'DIFFERENT: ' + ' '.join(diff)}")
+            failed += bool(diff)
+    sys.exit(1 if failed else 0)
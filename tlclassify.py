@@ -0,0 +1,132 @@
+#
+# tlclassify.py -- call a run's outcome early, once nothing can change it.
+#
+# Runs like "9.4M steps to escape" spend most of their steps coasting far
+# from the Moon on a path whose end is already settled.  With classify on,
+# the engine asks a Classifier about the ship every checktrigger steps.
+# It answers None, or (outcome, reason) when the outcome is certain:
+#
+#   escape      The ship is beyond the Moon's orbit and moving outward fast
+#               enough that Earth and Moon together cannot turn it around.
+#               Past the Moon, their pull on the ship is at most
+#               G(Mearth + Mmoon)/(r - a)^2 (a the Moon's farthest distance),
+#               so ship speed outward rdot with rdot^2 > 2G(Me + Mm)/(r - a)
+#               never falls to zero.  This one is a strict bound.
+#
+#   earthcrash  Outside the Moon's sphere of influence, falling inward, on a
+#               Kepler conic about the Earth whose perigee is inside the
+#               Earth, and the Moon's pull over the time left is too weak to
+#               move the ship out of the way.
+#
+#   mooncrash   The same about the Moon, inside its sphere of influence,
+#               with the Earth's tide and the Moon's turning frame as the
+#               disturbance.
+#
+# The crash tests follow the conic to halfway between the surface and its
+# closest point, T seconds ahead.  The disturbance can move the ship there
+# by at most a*T*T/2, for a the largest disturbing acceleration on the way;
+# four times that must still leave it under the surface.  The factor covers
+# what a first order bound leaves out.
+
+import math
+
+
+def conic(mu, rx, ry, vx, vy):
+    # For a ship at (rx, ry) moving inward on a Kepler conic about a body of
+    # gravity mu at the origin, returns (closest, timeto) where timeto(d) is
+    # the seconds until distance d, for closest <= d <= now.  None for a
+    # circle or parabola, which never matter here.
+    r = math.hypot(rx, ry)
+    angmom = rx*vy - ry*vx
+    energy = 0.5*(vx*vx + vy*vy) - mu/r
+    ecc = math.sqrt(max(0.0, 1.0 + 2.0*energy*angmom*angmom/(mu*mu)))
+    if ecc < 1e-12 or abs(ecc - 1.0) < 1e-9:
+        return None
+    closest = angmom*angmom / mu / (1.0 + ecc)
+    if energy < 0.0:   # ellipse; inbound half has eccentric anomaly -pi..0
+        a = -mu / (2.0*energy)
+
+        def mean(d):
+            big = -math.acos(max(-1.0, min(1.0, (1.0 - d/a) / ecc)))
+            return big - ecc*math.sin(big)
+    else:              # hyperbola
+        a = mu / (2.0*energy)
+
+        def mean(d):
+            big = -math.acosh(max(1.0, (d/a + 1.0) / ecc))
+            return ecc*math.sinh(big) - big
+    motion = math.sqrt(mu / (a*a*a))
+    now = mean(r)
+    return closest, lambda d: (mean(d) - now) / motion
+
+
+class Classifier:
+
+    def __init__(self, moon, moonrate, earthrad, moonrad, earthgrav, moongrav):
+        # moon is the sim's tlmoon.Moon; gravities are -G M as in tlsim
+        self.moon = moon
+        self.moonrate = moonrate
+        self.earthx = moon.centerx
+        self.earthy = moon.centery
+        self.earthrad = earthrad
+        self.moonrad = moonrad
+        self.mue = -earthgrav
+        self.mum = -moongrav
+        a = moon.distance
+        self.nearest = a * (1.0 - moon.ecc)    # Moon's least and greatest
+        self.farthest = a * (1.0 + moon.ecc)   # distances from the Earth
+        self.soi = a * (self.mum / self.mue) ** 0.4   # Laplace sphere of influence
+        # the Moon's path is a Kepler orbit of period moonperiod, so it is
+        # pulled by moonrate^2 a^3 / d^2, not quite the Earth's mue / d^2
+        self.framemu = abs(self.mue - moonrate*moonrate*a*a*a)
+
+    def __call__(self, x, y, vx, vy, moonx, moony, moonangle):
+        ex = x - self.earthx
+        ey = y - self.earthy
+        d2e = math.hypot(ex, ey)
+        rdot = (ex*vx + ey*vy) / d2e
+
+        # escape, from energy along the radius only
+        if rdot > 0.0:
+            gap = d2e - self.farthest
+            if gap > self.moonrad:
+                need = math.sqrt(2.0 * (self.mue + self.mum) / gap)
+                if rdot > need:
+                    return 'escape', (f"escape certain: {d2e/self.moon.distance:.2f} moonunits out, "
+                                      f"outward at {rdot:.0f} m/s, {need:.0f} m/s is enough")
+
+        # Earth impact, staying outside the Moon's sphere of influence
+        soi = self.soi
+        if rdot < 0.0 and d2e + soi < self.nearest:
+            fall = conic(self.mue, ex, ey, vx, vy)
+            if fall is not None and fall[0] < self.earthrad:
+                closest, timeto = fall
+                middle = 0.5 * (closest + self.earthrad)
+                time = timeto(middle)
+                pull = self.mum / (self.nearest - d2e)**2
+                shift = 0.5 * pull * time * time
+                if middle + 4.0*shift < self.earthrad:
+                    return 'earthcrash', (f"Earth impact certain: perigee {closest/1000:.0f} km from "
+                                          f"center in {time/3600:.1f} h, Moon can shift it "
+                                          f"{shift/1000:.1f} km")
+            return None
+
+        # Moon impact, inside its sphere of influence
+        mx = x - moonx
+        my = y - moony
+        d2m = math.hypot(mx, my)
+        if d2m < soi:
+            mvx, mvy = self.moon.velocity(moonangle, self.moonrate)
+            fall = conic(self.mum, mx, my, vx - mvx, vy - mvy)
+            if fall is not None and fall[0] < self.moonrad and mx*(vx - mvx) + my*(vy - mvy) < 0.0:
+                closest, timeto = fall
+                middle = 0.5 * (closest + self.moonrad)
+                time = timeto(middle)
+                near = self.nearest - d2m
+                pull = 2.0*self.mue*d2m/(near*near*near) + self.framemu/self.nearest**2
+                shift = 0.5 * pull * time * time
+                if middle + 4.0*shift < self.moonrad:
+                    return 'mooncrash', (f"Moon impact certain: perilune {closest/1000:.0f} km from "
+                                         f"center in {time/3600:.1f} h, Earth can shift it "
+                                         f"{shift/1000:.1f} km")
+        return None
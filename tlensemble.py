@@ -0,0 +1,240 @@
+#
+# tlensemble.py -- advance many TerraLunar ships at once with NumPy.
+#
+# All ships share one Moon, so they share the moon angle, dt and
+# checktrigger of one Initset; only the ship's starting position and
+# velocity differ.  Each step does the same arithmetic as
+# tlsim.Simulation.step(), but on whole arrays, so a sweep of 10k
+# velocities costs about as much as a few single-ship runs.  Results
+# match the scalar engine to rounding: distances here are sqrt(x*x + y*y)
+# rather than math.hypot, which differ in the last bit now and then, and
+# that only shows in chaotic trajectories.
+#
+#     import numpy as np, tlsim, tlensemble
+#     ens = tlensemble.Ensemble(tlsim.grabsetup(32), vy=np.linspace(921, 926, 10000))
+#     ens.run(2000000)
+#     print(ens.counts())
+#
+# Ships that crash or escape are dropped from the working arrays, and
+# their final state is kept in ens.x, ens.y, ens.vx, ens.vy, etc.
+#
+# Needs numpy, which the rest of TerraLunar does not.
+
+import math
+import sys
+
+import numpy as np
+
+import tlsim
+from tlsim import (moondistance, earthrad, earthx, earthy, moonrad,
+                   earthgrav, moongrav, moonperiod)
+
+# outcome codes kept in ens.outcome
+RUNNING = 0
+EARTHCRASH = 1
+MOONCRASH = 2
+ESCAPE = 3
+outcomenames = ('running', 'earthcrash', 'mooncrash', 'escape')
+
+
+class Ensemble:
+
+    def __init__(self, inz, xmd=None, ymd=None, vx=None, vy=None,
+                 escaperange=None):
+        # xmd, ymd, vx, vy are arrays (or scalars) of ship initial
+        # conditions; any left out are taken from inz.
+        if isinstance(inz, dict):
+            inz = tlsim.parseparams(inz)
+        self.inz = inz
+        if escaperange is None:
+            escaperange = tlsim.offscreen(inz)
+        self.escaperange = escaperange
+
+        xmd, ymd, vx, vy = np.broadcast_arrays(
+            np.asarray(inz.shipxmd if xmd is None else xmd, dtype=float),
+            np.asarray(inz.shipymd if ymd is None else ymd, dtype=float),
+            np.asarray(inz.shipvx if vx is None else vx, dtype=float),
+            np.asarray(inz.shipvy if vy is None else vy, dtype=float))
+        self.xmd = xmd.ravel().copy()
+        self.ymd = ymd.ravel().copy()
+        self.n = n = self.xmd.size
+
+        self.dtime = inz.dtime
+        self.moonstep = math.radians(360.*self.dtime/moonperiod)
+        self.moonangle = math.radians(inz.moondegrees)
+        self.moonx = earthx + moondistance*math.cos(self.moonangle)
+        self.moony = earthy + moondistance*math.sin(self.moonangle)
+        self.simtime = 0
+        self.steps = 0
+
+        # final (or current, while running) state of every ship
+        self.x = earthx + moondistance*self.xmd
+        self.y = earthy + moondistance*self.ymd
+        self.vx = vx.ravel().astype(float)
+        self.vy = vy.ravel().astype(float)
+        self.orbits = np.zeros(n, dtype=np.int64)
+        self.shipsteps = np.zeros(n, dtype=np.int64)
+        self.shiptime = np.zeros(n)
+        self.shipmoonangle = np.full(n, self.moonangle)
+        self.outcome = np.zeros(n, dtype=np.int8)
+
+        # working arrays hold only the ships still flying
+        self.idx = np.arange(n)
+        self._x = self.x.copy()
+        self._y = self.y.copy()
+        self._vx = self.vx.copy()
+        self._vy = self.vy.copy()
+        self._orbits = self.orbits.copy()
+
+    @classmethod
+    def sweep(cls, inz, field, values, **kw):
+        # vary one ship field ('xmd', 'ymd', 'vx' or 'vy') over values
+        kw[field] = values
+        return cls(inz, **kw)
+
+    def active(self):
+        return self.idx.size
+
+    def _retire(self, mask, code):
+        # copy the final state of ships in mask out of the working arrays
+        gone = self.idx[mask]
+        self.x[gone] = self._x[mask]
+        self.y[gone] = self._y[mask]
+        self.vx[gone] = self._vx[mask]
+        self.vy[gone] = self._vy[mask]
+        self.orbits[gone] = self._orbits[mask]
+        self.shipsteps[gone] = self.steps
+        self.shiptime[gone] = self.simtime
+        self.shipmoonangle[gone] = self.moonangle
+        self.outcome[gone] = code
+        keep = ~mask
+        self.idx = self.idx[keep]
+        self._x = self._x[keep]
+        self._y = self._y[keep]
+        self._vx = self._vx[keep]
+        self._vy = self._vy[keep]
+        self._orbits = self._orbits[keep]
+
+    def run(self, maxsteps):
+        # Advance all ships up to maxsteps more steps, or until all ended.
+        # Returns the number of steps taken.
+        sqrt = np.sqrt
+        cos = math.cos
+        sin = math.sin
+        dtime = self.dtime
+        moonstep = self.moonstep
+        checktrigger = self.inz.checktrigger
+        escaperange = self.escaperange
+        escapenum = -2.0 * (earthgrav + moongrav)
+        moonangle = self.moonangle
+        moonx = self.moonx
+        moony = self.moony
+        taken = 0
+
+        while taken < maxsteps and self.idx.size > 0:
+            x = self._x
+            y = self._y
+            ex = x - earthx
+            ey = y - earthy
+            mx = x - moonx
+            my = y - moony
+            d2e = sqrt(ex*ex + ey*ey)   # much faster than numpy.hypot
+            d2m = sqrt(mx*mx + my*my)
+            if d2e.min() < earthrad or d2m.min() < moonrad:
+                self.moonangle = moonangle
+                ecrash = d2e < earthrad
+                mcrash = (d2m < moonrad) & ~ecrash
+                if ecrash.any():
+                    self._retire(ecrash, EARTHCRASH)
+                    keep = ~ecrash
+                    ex, ey, mx, my = ex[keep], ey[keep], mx[keep], my[keep]
+                    d2e, d2m, mcrash = d2e[keep], d2m[keep], mcrash[keep]
+                if mcrash.any():
+                    self._retire(mcrash, MOONCRASH)
+                    keep = ~mcrash
+                    ex, ey, mx, my = ex[keep], ey[keep], mx[keep], my[keep]
+                    d2e, d2m = d2e[keep], d2m[keep]
+                if self.idx.size == 0:
+                    break
+                x = self._x
+                y = self._y
+
+            vx = self._vx
+            vy = self._vy
+            s2eaccel = dtime * earthgrav / (d2e * d2e * d2e)
+            s2maccel = dtime * moongrav / (d2m * d2m * d2m)
+            vx += s2eaccel * ex + s2maccel * mx
+            vy += s2eaccel * ey + s2maccel * my
+            below = y < earthy   # to detect crossing of x-axis each orbit of Earth
+            x += dtime * vx
+            y += dtime * vy
+            below &= y >= earthy
+            self._orbits += below
+
+            moonangle += moonstep
+            moonx = earthx + moondistance*cos(moonangle)
+            moony = earthy + moondistance*sin(moonangle)
+
+            if self.steps % checktrigger == 0:
+                velocity = sqrt(vx*vx + vy*vy)
+                escapevelocity = sqrt(escapenum / d2e)
+                escaped = (velocity > escapevelocity) & (d2e > escaperange)
+                if escaped.any():
+                    self.moonangle = moonangle
+                    self._retire(escaped, ESCAPE)
+
+            self.simtime += dtime
+            self.steps += 1
+            taken += 1
+
+        self.moonangle = moonangle
+        self.moonx = moonx
+        self.moony = moony
+        self._sync()
+        return taken
+
+    def _sync(self):
+        # copy ships still flying into the public arrays
+        idx = self.idx
+        self.x[idx] = self._x
+        self.y[idx] = self._y
+        self.vx[idx] = self._vx
+        self.vy[idx] = self._vy
+        self.orbits[idx] = self._orbits
+        self.shipsteps[idx] = self.steps
+        self.shiptime[idx] = self.simtime
+        self.shipmoonangle[idx] = self.moonangle
+
+    def counts(self):   # how many ships ended each way
+        tally = np.bincount(self.outcome, minlength=len(outcomenames))
+        return dict(zip(outcomenames, tally.tolist()))
+
+    def grabsnap(self, i):   # same snapshot as Simulation.grabsnap() for ship i
+        inz = self.inz
+        return {'moondeg': math.degrees(self.shipmoonangle[i]),
+                'xmd': float(self.x[i])/moondistance,
+                'ymd': float(self.y[i])/moondistance,
+                'vx': float(self.vx[i]),
+                'vy': float(self.vy[i]),
+                'dt': self.dtime,
+                'wscale': inz.winscale,
+                'rscale': inz.radscale,
+                'chktrig': inz.checktrigger,
+                'Description': 'Snapshot from: ' + inz.description}
+
+
+if __name__ == "__main__":
+    # e.g.  python3 tlensemble.py 32 vy 921 926 10000 2000000
+    if len(sys.argv) != 7:
+        print('usage: tlensemble.py setupnum field first last count maxsteps')
+        sys.exit(1)
+    setupnum, field = int(sys.argv[1]), sys.argv[2]
+    values = np.linspace(float(sys.argv[3]), float(sys.argv[4]), int(sys.argv[5]))
+    ens = Ensemble.sweep(tlsim.grabsetup(setupnum), field, values)
+    ens.run(int(sys.argv[6]))
+    print(f"{setupnum}: {ens.inz.description}   {ens.steps} steps")
+    print(ens.counts())
+    for code in (EARTHCRASH, MOONCRASH, ESCAPE):
+        hit = values[ens.outcome == code]
+        if hit.size:
+            print(f"{outcomenames[code]:10} {field} {hit.min()} .. {hit.max()}")
@@ -0,0 +1,193 @@
+#
+# tlevents.py -- find events inside a step, not just at its ends.
+#
+# The engine's usual checks only look at the ship where each step ends, so
+# a big step can jump right through the Moon, and escape is only tested
+# every checktrigger steps.  With events='precise' the engine hands each
+# step to an EventScanner, which spots sign changes (distance to a body
+# minus its radius, radial velocity, y about the Earth, escape speed) and
+# pins down when they happened by bisection on a cubic Hermite curve
+# through the step's end states.
+#
+# Event kinds:  'orbit' (crossing the +x axis going up), 'perigee' and
+# 'perilune' (closest approach to Earth or Moon), and the final ones
+# 'earthcrash', 'mooncrash' and 'escape'.
+
+import math
+
+terminal = ('earthcrash', 'mooncrash', 'escape')
+
+
+class Event:
+
+    def __init__(self, kind, time, x, y, vx, vy, dist=None):
+        self.kind = kind
+        self.time = time
+        self.x = x
+        self.y = y
+        self.vx = vx
+        self.vy = vy
+        self.dist = dist   # to the Earth or Moon, for crashes and passages
+
+    def __repr__(self):
+        return "Event({}, t={:.3f}, dist={})".format(self.kind, self.time, self.dist)
+
+    def asdict(self):
+        d = {'event': self.kind, 't': self.time, 'x': self.x, 'y': self.y,
+             'vx': self.vx, 'vy': self.vy}
+        if self.dist is not None:
+            d['dist'] = self.dist
+        return d
+
+
+def hermite(s, h, x0, y0, vx0, vy0, x1, y1, vx1, vy1):
+    # state at fraction s of a step of length h, on the cubic that matches
+    # both ends' positions and velocities
+    s2 = s*s
+    s3 = s2*s
+    h00 = 2*s3 - 3*s2 + 1
+    h10 = (s3 - 2*s2 + s) * h
+    h01 = 3*s2 - 2*s3
+    h11 = (s3 - s2) * h
+    d00 = (6*s2 - 6*s) / h
+    d10 = 3*s2 - 4*s + 1
+    d01 = -d00
+    d11 = 3*s2 - 2*s
+    return (h00*x0 + h10*vx0 + h01*x1 + h11*vx1,
+            h00*y0 + h10*vy0 + h01*y1 + h11*vy1,
+            d00*x0 + d10*vx0 + d01*x1 + d11*vx1,
+            d00*y0 + d10*vy0 + d01*y1 + d11*vy1)
+
+
+def bisect(test, lo=0.0, hi=1.0, iterations=50):
+    # first s in (lo, hi] where test(s) is true, given false at lo, true at hi
+    for i in range(iterations):
+        mid = 0.5 * (lo + hi)
+        if test(mid):
+            hi = mid
+        else:
+            lo = mid
+    return hi
+
+
+def golden(f, lo=0.0, hi=1.0, iterations=60):
+    # s in [lo, hi] where f(s) is least, for f with one dip
+    r = 0.5 * (math.sqrt(5.0) - 1.0)
+    a = hi - r*(hi - lo)
+    b = lo + r*(hi - lo)
+    fa = f(a)
+    fb = f(b)
+    for i in range(iterations):
+        if fa < fb:
+            hi = b
+            b = a
+            fb = fa
+            a = hi - r*(hi - lo)
+            fa = f(a)
+        else:
+            lo = a
+            a = b
+            fa = fb
+            b = lo + r*(hi - lo)
+            fb = f(b)
+    return 0.5 * (lo + hi)
+
+
+class EventScanner:
+
+    def __init__(self, earthx, earthy, earthrad, moonrad, moonat, moonvel,
+                 escaperange, escapenum):
+        # moonat(t) and moonvel(t) give the Moon's position and velocity;
+        # escapenum is -2 G (Mearth + Mmoon), so v*v*d > escapenum to escape
+        self.earthx = earthx
+        self.earthy = earthy
+        self.earthrad = earthrad
+        self.moonrad = moonrad
+        self.moonat = moonat
+        self.moonvel = moonvel
+        self.escaperange = escaperange
+        self.escapenum = escapenum
+        self._rdote = None   # radial velocities at the end of the last step
+        self._rdotm = None
+
+    def _radial(self, t, x, y, vx, vy):
+        mx, my = self.moonat(t)
+        mvx, mvy = self.moonvel(t)
+        rdote = (x - self.earthx)*vx + (y - self.earthy)*vy
+        rdotm = (x - mx)*(vx - mvx) + (y - my)*(vy - mvy)
+        return rdote, rdotm
+
+    def scan(self, t0, x0, y0, vx0, vy0, t1, x1, y1, vx1, vy1):
+        # Returns the events during the step from t0 to t1, in time order,
+        # stopping at the first terminal one.
+        ex = self.earthx
+        ey = self.earthy
+        earthrad = self.earthrad
+        moonrad = self.moonrad
+        moonat = self.moonat
+        h = t1 - t0
+        if self._rdote is None:
+            self._rdote, self._rdotm = self._radial(t0, x0, y0, vx0, vy0)
+        rdote1, rdotm1 = self._radial(t1, x1, y1, vx1, vy1)
+
+        def state(s):
+            return hermite(s, h, x0, y0, vx0, vy0, x1, y1, vx1, vy1)
+
+        def d2e(s):
+            x, y, vx, vy = state(s)
+            return math.hypot(x - ex, y - ey)
+
+        def d2m(s):
+            x, y, vx, vy = state(s)
+            mx, my = moonat(t0 + s*h)
+            return math.hypot(x - mx, y - my)
+
+        def event(kind, s, dist=None):
+            x, y, vx, vy = state(s)
+            return (s, Event(kind, t0 + s*h, x, y, vx, vy, dist))
+
+        found = []
+
+        # closest approaches, and crashes that happen during one
+        for kind, crash, dist, rad, rdot0, rdot1 in (
+                ('perigee', 'earthcrash', d2e, earthrad, self._rdote, rdote1),
+                ('perilune', 'mooncrash', d2m, moonrad, self._rdotm, rdotm1)):
+            if dist(1.0) < rad:
+                s = bisect(lambda s: dist(s) < rad)
+                found.append(event(crash, s, rad))
+            elif rdot0 < 0.0 <= rdot1:
+                s = golden(dist)
+                closest = dist(s)
+                if closest < rad:   # went in and out again within the step
+                    s = bisect(lambda s: dist(s) < rad, 0.0, s)
+                    found.append(event(crash, s, rad))
+                else:
+                    found.append(event(kind, s, closest))
+
+        if y0 < ey <= y1:  # x-axis crossing
+            s = bisect(lambda s: state(s)[1] >= ey)
+            found.append(event('orbit', s))
+
+        escaperange = self.escaperange
+        escapenum = self.escapenum
+
+        def escaping(s):
+            x, y, vx, vy = state(s)
+            d = math.hypot(x - ex, y - ey)
+            return d > escaperange and (vx*vx + vy*vy)*d > escapenum
+
+        d1 = math.hypot(x1 - ex, y1 - ey)
+        if d1 > escaperange and (vx1*vx1 + vy1*vy1)*d1 > escapenum:
+            found.append(event('escape', 0.0 if escaping(0.0) else bisect(escaping)))
+
+        self._rdote = rdote1
+        self._rdotm = rdotm1
+        if not found:
+            return found
+        found.sort(key=lambda e: e[0])
+        events = []
+        for s, ev in found:
+            events.append(ev)
+            if ev.kind in terminal:
+                break
+        return events
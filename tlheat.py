@@ -0,0 +1,94 @@
+#
+# tlheat.py -- where the ship spends its time, as a 2-D histogram.
+#
+# A Heatmap is an observer that counts every step into a fixed grid of
+# bins over a box in world coordinates, so a chaotic run shows as a
+# density picture rather than a scribble of crumbs.  Memory is the grid,
+# 4 bytes a bin, however long the run.
+#
+# Colors go with the log of the count, on a fixed scale (top steps is
+# white), so a bin's color only changes when its own count does and a
+# redraw only repaints bins the ship has been through since the last one.
+
+import math
+from array import array
+
+
+def ramp(stops, n=256):
+    # n '#rrggbb' colors running through the (r, g, b) stops
+    colors = []
+    for k in range(n):
+        t = k * (len(stops) - 1) / (n - 1)
+        i = min(int(t), len(stops) - 2)
+        f = t - i
+        a = stops[i]
+        b = stops[i + 1]
+        colors.append('#%02x%02x%02x' % tuple(int(a[c] + f*(b[c] - a[c]) + 0.5) for c in range(3)))
+    return colors
+
+
+palette = ramp([(0, 0, 0), (0, 0, 160), (160, 0, 160), (255, 0, 0), (255, 200, 0), (255, 255, 255)])
+
+
+class Heatmap:
+
+    def __init__(self, xlo, ylo, xhi, yhi, width, height, top=1e7):
+        self.xlo = xlo
+        self.ylo = ylo
+        self.xhi = xhi
+        self.yhi = yhi
+        self.width = width
+        self.height = height
+        self.sx = width / (xhi - xlo)    # bins a meter
+        self.sy = height / (yhi - ylo)
+        self.counts = array('I', bytes(4 * width * height))
+        self.shown = bytearray(width * height)   # palette index last handed out
+        self.scale = 255.0 / math.log(1.0 + top)
+        self.touched = array('i')   # bins entered since last changed()
+        self.lastbin = -1
+        self.steps = 0              # steps counted, inside the box
+
+    def on_step(self, sim):
+        ix = int((sim.shipx - self.xlo) * self.sx)
+        iy = int((sim.shipy - self.ylo) * self.sy)
+        if 0 <= ix < self.width and 0 <= iy < self.height:
+            i = iy*self.width + ix
+            self.counts[i] += 1
+            self.steps += 1
+            if i != self.lastbin:
+                self.lastbin = i
+                self.touched.append(i)
+
+    def level(self, count):
+        return min(255, int(self.scale * math.log(1.0 + count)))
+
+    def changed(self):
+        # [(ix, iy, color)] for bins whose color changed since last time
+        touched = self.touched
+        self.touched = array('i')
+        bins = set(touched)
+        if self.lastbin >= 0:
+            bins.add(self.lastbin)   # the ship may still be in it
+        width = self.width
+        out = []
+        for i in bins:
+            level = self.level(self.counts[i])
+            if level != self.shown[i]:
+                self.shown[i] = level
+                out.append((i % width, i // width, palette[level]))
+        return out
+
+    def everything(self):
+        # [(ix, iy, color)] for every bin the ship has been in
+        width = self.width
+        out = []
+        for i, count in enumerate(self.counts):
+            if count:
+                level = self.level(count)
+                self.shown[i] = level
+                out.append((i % width, i // width, palette[level]))
+        return out
+
+    def box(self, ix, iy):   # world corners of a bin
+        return (self.xlo + ix / self.sx, self.ylo + iy / self.sy,
+                self.xlo + (ix + 1) / self.sx, self.ylo + (iy + 1) / self.sy)
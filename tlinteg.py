@@ -0,0 +1,238 @@
+#
+# tlinteg.py -- integrators for the TerraLunar engine.
+#
+# The engine's own loop in tlsim.py is the first-order semi-implicit
+# Euler update (velocity then position), kept inline for speed.  The
+# integrators here are used instead when a setup asks for them.
+#
+# Each integrator is built with an acceleration function accel(x, y, t)
+# returning (ax, ay), and has one method:
+#     advance(x, y, vx, vy, t) -> (x, y, vx, vy, dt)
+# which takes one step from time t and returns the new state and the
+# length of the step just taken.  Attribute dtime is the step it will try
+# next; accepted and rejected count steps.
+#
+# The symplectic integrators (verlet, yoshida4) keep a fixed dtime and do
+# not let energy drift away over long bound orbits, so they can use a much
+# bigger dt than Euler for the same faithfulness.  Their cost is one and
+# three acceleration evaluations per step.
+
+import math
+
+
+class DormandPrince:
+    # Embedded Runge-Kutta 5(4) with error control, so the step shrinks
+    # near the Moon and Earth and grows out in deep space.  tol is the
+    # allowed error per step, relative to the ship's distance and speed.
+
+    name = 'dopri'
+    adaptive = True
+
+    # Butcher tableau of Dormand & Prince (1980)
+    c = (0.0, 1/5, 3/10, 4/5, 8/9, 1.0, 1.0)
+    a = ((),
+         (1/5,),
+         (3/40, 9/40),
+         (44/45, -56/15, 32/9),
+         (19372/6561, -25360/2187, 64448/6561, -212/729),
+         (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+         (35/384, 0.0, 500/1113, 125/192, -2187/6784, 11/84))
+    # 5th minus 4th order weights, for the error estimate
+    e = (71/57600, 0.0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40)
+
+    def __init__(self, accel, dtime, tol=1e-9, dtmin=1e-3, dtmax=3600.0):
+        self.accel = accel
+        self.dtime = float(dtime)
+        self.tol = tol
+        self.dtmin = dtmin
+        self.dtmax = dtmax
+        self.accepted = 0
+        self.rejected = 0
+        self._fsal = None   # (x, y, t, ax, ay) left over from the last step
+
+    def advance(self, x, y, vx, vy, t):
+        accel = self.accel
+        a = self.a
+        c = self.c
+        tol = self.tol
+        fsal = self._fsal
+        if fsal is not None and fsal[0] == x and fsal[1] == y and fsal[2] == t:
+            ax, ay = fsal[3], fsal[4]
+        else:
+            ax, ay = accel(x, y, t)
+        r0 = math.hypot(x, y)
+        v0 = math.hypot(vx, vy)
+
+        while True:
+            h = self.dtime
+            # stage derivatives: k = (dx, dy, dvx, dvy) = (vx, vy, ax, ay)
+            kx = [vx]
+            ky = [vy]
+            kvx = [ax]
+            kvy = [ay]
+            for i in range(1, 7):
+                ai = a[i]
+                sx = sy = svx = svy = 0.0
+                for j in range(i):
+                    w = ai[j]
+                    sx += w * kx[j]
+                    sy += w * ky[j]
+                    svx += w * kvx[j]
+                    svy += w * kvy[j]
+                xi = x + h*sx
+                yi = y + h*sy
+                vxi = vx + h*svx
+                vyi = vy + h*svy
+                axi, ayi = accel(xi, yi, t + c[i]*h)
+                kx.append(vxi)
+                ky.append(vyi)
+                kvx.append(axi)
+                kvy.append(ayi)
+            # the 7th stage is at the 5th order solution (first same as last)
+            ex = ey = evx = evy = 0.0
+            for j, w in enumerate(self.e):
+                if w:
+                    ex += w * kx[j]
+                    ey += w * ky[j]
+                    evx += w * kvx[j]
+                    evy += w * kvy[j]
+            rscale = tol * max(r0, math.hypot(xi, yi))
+            vscale = tol * max(v0, math.hypot(vxi, vyi), 1.0)
+            err = max(abs(h*ex), abs(h*ey)) / rscale
+            err = max(err, max(abs(h*evx), abs(h*evy)) / vscale)
+
+            # standard step size controller, kept within 0.2x..5x per step
+            if err == 0.0:
+                factor = 5.0
+            else:
+                factor = min(5.0, max(0.2, 0.9 * err ** -0.2))
+            if err <= 1.0 or h <= self.dtmin:
+                self.accepted += 1
+                self.dtime = min(self.dtmax, max(self.dtmin, h * factor))
+                self._fsal = (xi, yi, t + h, axi, ayi)
+                return xi, yi, vxi, vyi, h
+            self.rejected += 1
+            self.dtime = max(self.dtmin, h * min(1.0, factor))
+
+
+class Euler:
+    # The engine's semi-implicit Euler (velocity then position) as an
+    # integrator object, for when the inline loop cannot be used, e.g.
+    # with precise events.  The Moon is placed by time here, so results
+    # match the inline loop only to rounding.
+
+    name = 'euler'
+    adaptive = False
+
+    def __init__(self, accel, dtime):
+        self.accel = accel
+        self.dtime = dtime
+        self.accepted = 0
+        self.rejected = 0
+
+    def advance(self, x, y, vx, vy, t):
+        h = self.dtime
+        ax, ay = self.accel(x, y, t)
+        vx += h * ax
+        vy += h * ay
+        x += h * vx
+        y += h * vy
+        self.accepted += 1
+        return x, y, vx, vy, h
+
+
+class Verlet:
+    # Velocity Verlet (leapfrog, kick-drift-kick), 2nd order symplectic.
+
+    name = 'verlet'
+    adaptive = False
+
+    def __init__(self, accel, dtime):
+        self.accel = accel
+        self.dtime = dtime
+        self.accepted = 0
+        self.rejected = 0
+        self._fsal = None   # (x, y, t, ax, ay) left over from the last step
+
+    def advance(self, x, y, vx, vy, t):
+        h = self.dtime
+        half = 0.5 * h
+        fsal = self._fsal
+        if fsal is not None and fsal[0] == x and fsal[1] == y and fsal[2] == t:
+            ax, ay = fsal[3], fsal[4]
+        else:
+            ax, ay = self.accel(x, y, t)
+        vx += half * ax
+        vy += half * ay
+        x += h * vx
+        y += h * vy
+        ax, ay = self.accel(x, y, t + h)
+        vx += half * ax
+        vy += half * ay
+        self._fsal = (x, y, t + h, ax, ay)
+        self.accepted += 1
+        return x, y, vx, vy, h
+
+
+class Yoshida4:
+    # Yoshida (1990) 4th order symplectic: three leapfrog steps of
+    # sizes w1, w0, w1 with w0 negative.
+
+    name = 'yoshida4'
+    adaptive = False
+
+    cbrt2 = 2.0 ** (1.0/3.0)
+    w1 = 1.0 / (2.0 - cbrt2)
+    w0 = -cbrt2 / (2.0 - cbrt2)
+    drifts = (w1/2, (w0 + w1)/2, (w0 + w1)/2, w1/2)
+    kicks = (w1, w0, w1)
+
+    def __init__(self, accel, dtime):
+        self.accel = accel
+        self.dtime = dtime
+        self.accepted = 0
+        self.rejected = 0
+
+    def advance(self, x, y, vx, vy, t):
+        h = self.dtime
+        accel = self.accel
+        c1, c2, c3, c4 = self.drifts
+        d1, d2, d3 = self.kicks
+        x += c1*h * vx
+        y += c1*h * vy
+        ax, ay = accel(x, y, t + c1*h)
+        vx += d1*h * ax
+        vy += d1*h * ay
+        x += c2*h * vx
+        y += c2*h * vy
+        ax, ay = accel(x, y, t + (c1 + c2)*h)
+        vx += d2*h * ax
+        vy += d2*h * ay
+        x += c3*h * vx
+        y += c3*h * vy
+        ax, ay = accel(x, y, t + (c1 + c2 + c3)*h)
+        vx += d3*h * ax
+        vy += d3*h * ay
+        x += c4*h * vx
+        y += c4*h * vy
+        self.accepted += 1
+        return x, y, vx, vy, h
+
+
+integrators = {'verlet': Verlet,
+               'yoshida4': Yoshida4,
+               'dopri': DormandPrince}
+names = ('euler',) + tuple(integrators)
+
+
+def make(name, accel, dtime, tol=1e-9, inline=True):
+    # Return an integrator for name, or None for the engine's inline Euler.
+    if name == 'euler':
+        return None if inline else Euler(accel, dtime)
+    try:
+        cls = integrators[name]
+    except KeyError:
+        raise ValueError(f"unknown integrator {name!r}; choose from {', '.join(names)}")
+    if cls.adaptive:
+        return cls(accel, dtime, tol)
+    return cls(accel, dtime)
@@ -0,0 +1,123 @@
+#
+# tlkepler.py -- skip ahead along a Kepler ellipse when the Moon is far away.
+#
+# Deep in the Earth's pull, e.g. in low Earth orbit, the Moon hardly
+# matters and the ship simply goes round a Kepler ellipse, yet the engine
+# still takes one step per dtime.  With kepler > 0 in the setup, the engine
+# asks a FastForward now and then (after each x-axis crossing and every
+# checktrigger steps) whether it may jump.  It may if the whole ellipse
+# stays outside the Moon's sphere of influence and the Moon's pull anywhere
+# on it is under kepler times the Earth's pull at apogee.  The jump is a
+# whole number of steps, solved in closed form, and ends just short of the
+# next x-axis crossing or check, which the engine then steps through as
+# usual, so orbit counts, logs and checks carry on as before.
+#
+# Along the jump the Moon's pull is left out, so results differ from pure
+# stepping by about that much.
+#
+# The engine's Euler loop leaves the velocity half a step behind the
+# position (it is really a leapfrog), so with staggered=True the velocity is
+# brought level with a half kick of Earth gravity before the jump and put
+# back after.  Without that, the small energy error of each hand-over would
+# always fall at the same point of the orbit and pile up.
+
+import math
+
+twopi = 2.0 * math.pi
+
+
+def anomaly(ecc, true):   # mean anomaly for a true anomaly, on an ellipse
+    big = math.atan2(math.sqrt(1.0 - ecc*ecc) * math.sin(true), ecc + math.cos(true))
+    return big - ecc*math.sin(big)
+
+
+def eccentric(ecc, mean):   # solve Kepler's equation M = E - e sin E
+    big = mean if ecc < 0.8 else math.pi
+    for i in range(50):
+        delta = (big - ecc*math.sin(big) - mean) / (1.0 - ecc*math.cos(big))
+        big -= delta
+        if abs(delta) < 1e-15:
+            break
+    return big
+
+
+class FastForward:
+
+    def __init__(self, ratio, moon, earthrad, moonrad, earthgrav, moongrav, staggered=False):
+        # moon is the sim's tlmoon.Moon; gravities are -G M as in tlsim
+        self.ratio = ratio
+        self.staggered = staggered
+        self.earthx = moon.centerx
+        self.earthy = moon.centery
+        self.earthrad = earthrad
+        self.mue = -earthgrav
+        self.mum = -moongrav
+        self.nearest = moon.distance * (1.0 - moon.ecc) - moonrad
+        self.soi = moon.distance * (self.mum / self.mue) ** 0.4
+        self.hops = 0
+        self.skipped = 0   # steps jumped over
+
+    def __call__(self, x, y, vx, vy, dtime, most):
+        # Returns (k, x, y, vx, vy): the state k steps of dtime later, k at
+        # most most; or None if the Moon matters or the jump is too short.
+        if most < 2:
+            return None
+        mu = self.mue
+        rx = x - self.earthx
+        ry = y - self.earthy
+        r = math.hypot(rx, ry)
+        if self.staggered:
+            kick = -0.5 * dtime * mu / (r*r*r)
+            vx += kick * rx
+            vy += kick * ry
+        v2 = vx*vx + vy*vy
+        energy = 0.5*v2 - mu/r
+        if energy >= 0.0:
+            return None
+        a = -mu / (2.0*energy)
+        rv = rx*vx + ry*vy
+        ex = ((v2 - mu/r)*rx - rv*vx) / mu   # eccentricity vector, to perigee
+        ey = ((v2 - mu/r)*ry - rv*vy) / mu
+        ecc = math.hypot(ex, ey)
+        apogee = a * (1.0 + ecc)
+        if (ecc >= 1.0 or a*(1.0 - ecc) < self.earthrad
+                or apogee + self.soi > self.nearest
+                or self.mum / (self.nearest - apogee)**2 > self.ratio * mu / (apogee*apogee)):
+            return None
+
+        # angles about the perigee, counted the way the ship goes round
+        sense = 1.0 if rx*vy - ry*vx > 0.0 else -1.0
+        peri = math.atan2(ey, ex)
+        true = sense * (math.atan2(ry, rx) - peri)
+        # upward x-axis crossing: at angle 0 going counterclockwise, pi going clockwise
+        cross = sense * ((0.0 if sense > 0.0 else math.pi) - peri)
+        motion = math.sqrt(mu / (a*a*a))
+        mean = anomaly(ecc, true)
+        tocross = ((anomaly(ecc, cross) - mean) % twopi) / motion
+        k = min(most, int(tocross / dtime) - 1)
+        if k < 2:
+            return None
+
+        big = eccentric(ecc, mean + motion * k * dtime)
+        cosbig = math.cos(big)
+        sinbig = math.sin(big)
+        b = a * math.sqrt(1.0 - ecc*ecc)
+        px = a * (cosbig - ecc)        # in the ellipse's own frame, x to perigee
+        py = sense * b * sinbig
+        rate = motion / (1.0 - ecc*cosbig)
+        pvx = -a * sinbig * rate
+        pvy = sense * b * cosbig * rate
+        cp = math.cos(peri)
+        sp = math.sin(peri)
+        rx = px*cp - py*sp
+        ry = px*sp + py*cp
+        vx = pvx*cp - pvy*sp
+        vy = pvx*sp + pvy*cp
+        if self.staggered:
+            r = math.hypot(rx, ry)
+            kick = 0.5 * dtime * mu / (r*r*r)
+            vx += kick * rx
+            vy += kick * ry
+        self.hops += 1
+        self.skipped += k
+        return k, self.earthx + rx, self.earthy + ry, vx, vy
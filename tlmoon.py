@@ -0,0 +1,113 @@
+#
+# tlmoon.py -- where the Moon is, for the TerraLunar engine.
+#
+# The engine tracks the Moon by its phase: the angle it would have on a
+# circular orbit, growing by the same amount every step (moonangle +=
+# moonstep).  A Moon object turns phase into a position.  On the default
+# circular orbit phase is simply the Moon's angle from the +x axis.
+#
+# Modes:
+#     'trig'    cos and sin of the phase every step (the original way)
+#     'rotate'  rotate last step's position by a fixed small angle, with an
+#               exact cos/sin every renorm steps so it cannot drift
+#     'table'   interpolate a table of positions over one orbit, built once
+#
+# With ecc > 0 the Moon follows a Kepler ellipse of semi-major axis
+# distance with perigee at angle peri.  'trig' then solves Kepler's
+# equation every step; 'table' costs the same as for a circle.
+
+import math
+
+twopi = 2.0 * math.pi
+modes = ('trig', 'rotate', 'table')
+
+
+class Moon:
+
+    def __init__(self, distance, centerx=0.0, centery=0.0, mode='trig',
+                 ecc=0.0, peri=0.0, tablesize=65536, renorm=1000):
+        if mode not in modes:
+            raise ValueError(f"unknown moon mode {mode!r}; choose from {', '.join(modes)}")
+        if not 0.0 <= ecc < 1.0:
+            raise ValueError(f"moon eccentricity must be in 0..1, not {ecc}")
+        if mode == 'rotate' and ecc != 0.0:
+            raise ValueError("moon mode 'rotate' needs a circular orbit")
+        self.distance = distance
+        self.centerx = centerx  # the Earth
+        self.centery = centery
+        self.mode = mode
+        self.ecc = ecc
+        self.peri = peri        # radians, direction of perigee
+        self.renorm = renorm    # steps between exact positions, 'rotate' mode
+        if mode == 'table':
+            self._maketable(tablesize)
+            self.position = self._fromtable
+        elif ecc == 0.0:
+            self.position = self._circle
+        else:
+            self.position = self._kepler
+
+    def _circle(self, phase):
+        return (self.centerx + self.distance*math.cos(phase),
+                self.centery + self.distance*math.sin(phase))
+
+    def _kepler(self, phase):
+        # phase is the mean longitude; solve M = E - e sin E for E
+        ecc = self.ecc
+        mean = phase - self.peri
+        big = mean + ecc*math.sin(mean)
+        for i in range(4):   # Newton's method; e = 0.055 needs 2 or 3
+            big -= (big - ecc*math.sin(big) - mean) / (1.0 - ecc*math.cos(big))
+        px = self.distance * (math.cos(big) - ecc)
+        py = self.distance * math.sqrt(1.0 - ecc*ecc) * math.sin(big)
+        cp = math.cos(self.peri)
+        sp = math.sin(self.peri)
+        return self.centerx + px*cp - py*sp, self.centery + px*sp + py*cp
+
+    def _maketable(self, size):
+        exact = self._circle if self.ecc == 0.0 else self._kepler
+        xs = []
+        ys = []
+        for i in range(size + 1):   # one extra so i+1 never wraps
+            x, y = exact(twopi * i / size)
+            xs.append(x)
+            ys.append(y)
+        self._xs = xs
+        self._ys = ys
+        self._perrad = size / twopi
+
+    def _fromtable(self, phase):
+        u = (phase % twopi) * self._perrad
+        i = int(u)
+        f = u - i
+        xs = self._xs
+        ys = self._ys
+        x0 = xs[i]
+        y0 = ys[i]
+        return x0 + f*(xs[i+1] - x0), y0 + f*(ys[i+1] - y0)
+
+    def velocity(self, phase, rate):   # d(position)/dt, rate in radians/second
+        if self.ecc == 0.0:
+            return (-rate*self.distance*math.sin(phase),
+                    rate*self.distance*math.cos(phase))
+        delta = 1e-6
+        x0, y0 = self._kepler(phase - delta)
+        x1, y1 = self._kepler(phase + delta)
+        return rate*(x1 - x0)/(2*delta), rate*(y1 - y0)/(2*delta)
+
+    def polar(self, phase):   # the Moon's actual angle from the +x axis
+        if self.ecc == 0.0:
+            return phase
+        x, y = self._kepler(phase)
+        angle = math.atan2(y - self.centery, x - self.centerx)
+        return angle + twopi * round((phase - angle) / twopi)   # keep the turns
+
+    def phase(self, angle):   # inverse of polar()
+        if self.ecc == 0.0:
+            return angle
+        ecc = self.ecc
+        true = angle - self.peri
+        big = 2.0 * math.atan(math.sqrt((1.0 - ecc)/(1.0 + ecc)) * math.tan(true/2.0))
+        mean = big - ecc*math.sin(big)
+        mean += twopi * round((true - mean) / twopi)
+        return mean + self.peri
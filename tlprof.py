@@ -0,0 +1,323 @@
+#
+# tlprof.py -- where the time goes, phase by phase.
+#
+# The steps/sec figure says how fast a run is going but not why.  A
+# Profiler wraps the calls that make up a run and sorts their time into
+# phases:
+#
+#   physics   the integration steps, with the crash and escape tests and
+#             observer calls inline in them: whatever isn't in another phase
+#   events    the classifier, Kepler jumps and the precise event scanner
+#   render    the View's looks at the ship (moving Moon and ship, dropping
+#             crumbs), frames, recorded frames and status updates
+#   pump      checkMouse, which is where Tk handles its events
+#   log       log records (telemetry or tl-log.txt) and checkpoint saves
+#
+# Each phase keeps a histogram of how long its calls take, in power-of-2
+# buckets of nanoseconds; physics is per step.  A call's time leaves out
+# that of timed calls inside it, so look() is render and the checkMouse()
+# it makes is pump.
+#
+# To be cheap enough to leave on, timing is sampled: a few short windows of
+# the run (window seconds each, duty of the time in all) are timed, and in
+# between a wrapped call only counts down to when it looks at the clock
+# again.  Physics is the part of a window not spent in the other phases,
+# so the step loop itself is not touched.  Off is free: nothing is wrapped
+# unless watch() is called, and unwatch() puts everything back.
+#
+#     prof = tlprof.Profiler(sim)
+#     prof.watch(view=view, log=log)
+#     sim.run_until('end')
+#     prof.stop()
+#     print('\n'.join(prof.report()))
+
+from threading import get_ident
+from time import perf_counter_ns
+from types import FunctionType, MethodType
+
+phases = ('physics', 'events', 'render', 'pump', 'log')
+
+
+def nanos(ns):   # 1234567 -> '1.2ms'
+    for unit, size in (('s', 1e9), ('ms', 1e6), ('us', 1e3)):
+        if ns >= size:
+            return f"{ns / size:.3g}{unit}"
+    return f"{ns:.0f}ns"
+
+
+class Histogram:
+    # call times in buckets: bucket k holds 2**(k-1) <= ns < 2**k
+
+    def __init__(self):
+        self.counts = [0] * 64
+        self.n = 0        # calls timed (physics: steps)
+        self.total = 0    # ns in them
+        self.most = 0     # longest, ns
+        self.calls = 0    # untimed calls are counted every so often
+
+    def add(self, ns, weight=1):
+        self.counts[min(63, int(ns).bit_length())] += weight
+        self.n += weight
+        self.total += ns * weight
+        if ns > self.most:
+            self.most = ns
+
+    def quantile(self, q):   # top of the bucket holding the q'th call
+        if self.n == 0:
+            return 0
+        want = q * self.n
+        seen = 0
+        for k, count in enumerate(self.counts):
+            seen += count
+            if seen >= want:
+                return min(1 << k, self.most)
+        return self.most
+
+    def buckets(self):   # '512ns:3 1.02us:120 ...', bucket tops
+        return ' '.join(f"{nanos(1 << k)}:{count}"
+                        for k, count in enumerate(self.counts) if count)
+
+
+class _Counter:
+    # a wrapped call's countdown to its next look at the clock
+    __slots__ = ('countdown',)
+
+    def __init__(self, countdown):
+        self.countdown = countdown
+
+
+class _Called:
+    # stands in for a callable object, such as sim.fastforward: calls go
+    # through the timer, attributes to the object
+
+    def __init__(self, obj, timed):
+        self.__dict__['_obj'] = obj
+        self.__dict__['_timed'] = timed
+
+    def __call__(self, *args, **kwargs):
+        return self._timed(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._obj, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._obj, name, value)
+
+
+class Profiler:
+
+    def __init__(self, sim, duty=0.05, window=0.05, every=256):
+        self.sim = sim
+        self.duty = duty          # of the time to be timed
+        self.window = int(window * 1e9)
+        self.every = every        # untimed calls between looks at the clock
+        self.hists = {name: Histogram() for name in phases}
+        self.counters = []        # (histogram, _Counter) of each wrapped call
+        self.wrapped = []         # (obj, name, old value or None)
+        self.stacks = {}          # thread -> ns in timed calls inside open ones
+        self.live = False         # in a window
+        self.started = perf_counter_ns()
+        self.startsteps = sim.steps
+        self.stopped = None
+        self.since = 0            # window start
+        self.until = 0            # and end
+        self.livetime = 0         # ns in windows so far
+        self.windows = 0
+        self.timed = 0            # ns in timed calls, this window
+        self.winsteps = 0
+        self.overlay = None
+        self.view = None
+        self.shown = 0
+
+    # wrapping
+
+    def timer(self, phase, fn):
+        # fn, timed into phase when in a window
+        hist = self.hists[phase]
+        counter = _Counter(self.every)
+        self.counters.append((hist, counter))
+        every = self.every
+        stacks = self.stacks
+        prof = self
+
+        def timed(*args, **kwargs):
+            if not prof.live:
+                counter.countdown -= 1
+                if counter.countdown > 0:
+                    return fn(*args, **kwargs)
+                counter.countdown = every
+                hist.calls += every - 1
+                if not prof.tick():
+                    hist.calls += 1
+                    return fn(*args, **kwargs)
+            hist.calls += 1
+            thread = get_ident()
+            stack = stacks.get(thread)
+            if stack is None:
+                stack = stacks[thread] = [0]
+            stack.append(0)
+            start = perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                now = perf_counter_ns()
+                ns = now - start
+                inner = stack.pop()
+                stack[-1] += ns
+                hist.add(ns - inner)
+                prof.timed += ns - inner
+                if len(stack) == 1 and now >= prof.until:
+                    prof.tick()
+
+        return timed
+
+    def wrap(self, obj, name, phase):
+        # time obj.name() from now on, as an attribute of obj itself
+        if obj is None:
+            return
+        old = obj.__dict__.get(name)
+        fn = getattr(obj, name, None)
+        if fn is None:
+            return
+        if not isinstance(fn, (FunctionType, MethodType)):   # an object called as one
+            setattr(obj, name, _Called(fn, self.timer(phase, fn)))
+        else:
+            setattr(obj, name, self.timer(phase, fn))
+        self.wrapped.append((obj, name, old))
+
+    def watch(self, view=None, log=None, checkpoints=None, overlay=False):
+        # wrap the sim's calls and those of whichever observers are given
+        sim = self.sim
+        self.wrap(sim, 'classifier', 'events')
+        self.wrap(sim, 'fastforward', 'events')
+        self.wrap(sim.scanner, 'scan', 'events')
+        if view is not None:
+            self.view = view
+            for name in ('look', 'redraw', 'on_check'):
+                self.wrap(view, name, 'render')
+            for name in ('save', 'writeframe'):    # recorded frames, offscreen
+                self.wrap(view.win, name, 'render')
+            self.wrap(view.win, 'checkMouse', 'pump')
+            if overlay:
+                self.show(view)
+        if log is not None:
+            for name in ('on_orbit', 'on_event'):
+                self.wrap(log, name, 'log')
+        if checkpoints is not None:
+            self.wrap(checkpoints, 'save', 'log')
+        sim.attach(self)
+        return self
+
+    def unwatch(self):
+        # back as it was: no timing, no cost
+        self.stop()
+        for obj, name, old in reversed(self.wrapped):
+            if old is None:
+                del obj.__dict__[name]   # the class's method again
+            else:
+                setattr(obj, name, old)
+        self.wrapped = []
+        if self in self.sim.observers:
+            self.sim.detach(self)
+
+    # windows
+
+    def tick(self):
+        # open or close a window, by the clock; returns whether in one
+        now = perf_counter_ns()
+        if self.live:
+            if now >= self.until:
+                self.close(now)
+        elif self.stopped is None and self.livetime < self.duty * (now - self.started):
+            self.live = True
+            self.since = now
+            self.until = now + self.window
+            self.timed = 0
+            self.winsteps = self.sim.steps
+            self.windows += 1
+        return self.live
+
+    def close(self, now):
+        self.live = False
+        ns = now - self.since
+        self.livetime += ns
+        steps = self.sim.steps - self.winsteps
+        if steps > 0:
+            self.hists['physics'].add(max(0, ns - self.timed) / steps, steps)
+
+    def on_check(self, sim):
+        self.tick()
+
+    def on_end(self, sim):
+        self.tick()
+
+    def stop(self):
+        now = perf_counter_ns()
+        if self.live:
+            self.close(now)
+        if self.stopped is None:
+            self.stopped = now
+
+    # results
+
+    def shares(self):
+        # {phase: fraction of the timed time}
+        livetime = self.livetime
+        return {name: self.hists[name].total / livetime if livetime else 0.0
+                for name in phases}
+
+    def calls(self, name):   # all of them, timed or not
+        if name == 'physics':
+            return self.sim.steps - self.startsteps
+        return self.hists[name].calls + sum(self.every - counter.countdown
+                                            for hist, counter in self.counters
+                                            if hist is self.hists[name])
+
+    def summary(self):   # one line, for the overlay
+        shares = self.shares()
+        return '   '.join(f"{name} {100 * shares[name]:.0f}%" for name in phases)
+
+    def report(self):
+        # lines for the log and the console: a table, then the histograms
+        elapsed = (self.stopped or perf_counter_ns()) - self.started
+        shares = self.shares()
+        lines = [f"Profile: {nanos(elapsed)} run, {nanos(self.livetime)} timed"
+                 f" in {self.windows} windows",
+                 f"Profile: {'phase':8} {'calls':>13} {'share':>6} {'mean':>8}"
+                 f" {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}"]
+        for name in phases:
+            hist = self.hists[name]
+            mean = hist.total / hist.n if hist.n else 0
+            lines.append(f"Profile: {name:8} {self.calls(name):>13,} {100 * shares[name]:5.1f}%"
+                         f" {nanos(mean):>8} {nanos(hist.quantile(0.5)):>8}"
+                         f" {nanos(hist.quantile(0.9)):>8} {nanos(hist.quantile(0.99)):>8}"
+                         f" {nanos(hist.most):>8}")
+        for name in phases:
+            hist = self.hists[name]
+            if hist.n:
+                lines.append(f"Profile: {name:8} {hist.buckets()}")
+        return lines
+
+    # overlay
+
+    def show(self, view):
+        # a line of phase shares on the view, redone with its status text
+        gr = view.gr
+        xlo, ylo, xhi, yhi = view.bounds
+        spot = (0.5, 0.06)
+        self.overlay = gr.Text(gr.Point(xlo + spot[0]*(xhi - xlo), ylo + spot[1]*(yhi - ylo)),
+                               'profiling...')
+        self.overlay.setTextColor('orange')
+        self.overlay.draw(view.win)
+        view.texts.append(self.overlay)
+        view.textspots.append(spot)
+        oncheck = view.on_check
+
+        def on_check(sim, *args):
+            oncheck(sim, *args)
+            now = perf_counter_ns()
+            if now >= self.shown:
+                self.shown = now + 1000000000
+                self.overlay.setText(self.summary())
+
+        view.on_check = on_check
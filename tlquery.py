@@ -0,0 +1,352 @@
+#!/usr/bin/python3
+#
+# tlquery.py -- find runs in tl-log.txt quickly, however long it has grown.
+#
+# tl-log.txt only ever grows, one block of lines per run:
+#
+#     2: 323k steps to lunar impact           setup number and description
+#     Start @ Sat Oct 17 19:43:14 2026
+#     {"moondeg": ...}                        a snapshot per orbit crossing,
+#     {"event": "perigee", ...}               precise events, if any
+#     End   @ Sat Oct 17 19:43:15 2026
+#     322,881 steps  @  265030 /sec           (not in the oldest logs)
+#     Stopped: inside Moon radius             (if the classifier said so)
+#     -----------------------------
+#     {"moondeg": ..., "Description": "Final snapshot; Crashed on Moon !"}
+#     ==============================
+#
+# Rather than reading all of that for every question, an index next to the
+# log (tl-log.txt.idx/) keeps one row per run in columns: setup, start and
+# end time, orbits, events, steps, steps/sec, outcome, description, reason
+# and where the run is in the log.  Each column is a flat binary array
+# file, so loading one is a single read.  Every query first reads what was
+# appended to the log since the last one, and only that; a run still being
+# written is left for next time, and one that never got its end (the
+# program died) is indexed as unfinished once another run follows it.
+#
+#     python3 tlquery.py --outcome mooncrash             which crashed on the Moon
+#     python3 tlquery.py --setup 2 31 --since 2024-01-01
+#     python3 tlquery.py --desc lunar --count
+#     python3 tlquery.py --outcome escape --raw          the log text of each
+#
+# Outcomes are earthcrash, mooncrash, escape, stopped (clicked away, or a
+# step limit) and unfinished.
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from array import array
+
+outcomes = ('earthcrash', 'mooncrash', 'escape', 'stopped', 'unfinished')
+
+# column name -> array typecode
+columns = {'setup': 'i',
+           'start': 'd',     # time.time() style, nan if unknown
+           'end': 'd',
+           'orbits': 'i',
+           'events': 'i',
+           'steps': 'q',     # -1 if not logged
+           'sps': 'q',
+           'outcome': 'b',   # index in outcomes
+           'desc': 'i',      # index in the descriptions table
+           'reason': 'i',    # index in the reasons table, -1 for none
+           'offset': 'q',    # of the run's first line in the log
+           'length': 'q'}
+
+header = re.compile(r'(-?\d+): (.*)$')
+stepstats = re.compile(r'([\d,]+) steps\s+@\s+(\d+) /sec')
+headbytes = 4096    # hashed to tell the same log from a new one
+
+
+def outcomeof(status):
+    # the shipstatus in a final snapshot's Description -> an outcome
+    if status.startswith(('Crashed on Earth', 'Earth impact')):
+        return 'earthcrash'
+    if status.startswith(('Crashed on Moon', 'Moon impact')):
+        return 'mooncrash'
+    if status.startswith('Escape'):
+        return 'escape'
+    return 'stopped'
+
+
+def stamp(text):   # 'Sat Oct 17 19:43:14 2026' -> seconds since the epoch
+    try:
+        return time.mktime(time.strptime(text.strip()))
+    except (ValueError, OverflowError):
+        return float('nan')
+
+
+def parse(data, base=0):
+    # The runs in data, which starts between two runs at offset base of the
+    # log: yields (run, end offset) for each finished one, a run being a
+    # dict with the columns' values and the description and reason text.
+    run = None
+    pos = base
+    for raw in data.splitlines(keepends=True):
+        at = pos
+        pos += len(raw)
+        line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+        if not line:
+            continue
+        if line[0] == '{':
+            if run is None:
+                continue
+            if run['final']:
+                try:
+                    snapshot = json.loads(line)
+                except ValueError:
+                    continue
+                status = str(snapshot.get('Description', '')).partition('; ')[2]
+                run['outcome'] = outcomeof(status)
+            elif line.startswith('{"event"'):
+                run['events'] += 1
+            else:
+                run['orbits'] += 1
+            continue
+        if line.startswith('====='):
+            if run is not None:
+                run['length'] = pos - run['offset']
+                yield run, pos
+                run = None
+            continue
+        match = header.match(line)
+        if match:
+            if run is not None:   # the last one never finished
+                run['outcome'] = 'unfinished'
+                run['length'] = at - run['offset']
+                yield run, at
+            run = {'setup': int(match.group(1)), 'description': match.group(2),
+                   'start': float('nan'), 'end': float('nan'), 'orbits': 0, 'events': 0,
+                   'steps': -1, 'sps': -1, 'outcome': 'unfinished', 'reason': None,
+                   'offset': at, 'length': 0, 'final': False}
+            continue
+        if run is None:
+            continue
+        if line.startswith('Start @'):
+            run['start'] = stamp(line[7:])
+        elif line.startswith('End') and '@' in line:
+            run['end'] = stamp(line.partition('@')[2])
+        elif line.startswith('Stopped: '):
+            run['reason'] = line[9:]
+        elif line.startswith('-----'):
+            run['final'] = True
+        else:
+            match = stepstats.match(line)
+            if match:
+                run['steps'] = int(match.group(1).replace(',', ''))
+                run['sps'] = int(match.group(2))
+
+
+class Index:
+    # the columns for one log, in memory, and their files
+
+    def __init__(self, logpath, path=None):
+        self.logpath = logpath
+        self.path = path or logpath + '.idx'
+        self.meta = {'log': logpath, 'consumed': 0, 'head': '', 'rows': 0,
+                     'descriptions': [], 'reasons': []}
+        self.cols = {name: array(code) for name, code in columns.items()}
+        self.load()
+
+    def colpath(self, name):
+        return os.path.join(self.path, name + '.col')
+
+    def load(self):
+        try:
+            with open(os.path.join(self.path, 'meta.json'), 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        rows = meta['rows']
+        cols = {}
+        for name, code in columns.items():
+            col = array(code)
+            try:
+                with open(self.colpath(name), 'rb') as f:
+                    col.frombytes(f.read(rows * col.itemsize))
+            except OSError:
+                return
+            if len(col) != rows:
+                return
+            cols[name] = col
+        self.meta = meta
+        self.cols = cols
+
+    def clear(self):
+        self.meta.update(consumed=0, head='', rows=0, descriptions=[], reasons=[])
+        self.cols = {name: array(code) for name, code in columns.items()}
+        os.makedirs(self.path, exist_ok=True)
+        for name in columns:
+            open(self.colpath(name), 'wb').close()
+
+    def update(self):
+        # index what was added to the log since last time; returns new rows
+        meta = self.meta
+        try:
+            f = open(self.logpath, 'rb')
+        except OSError:
+            return 0
+        with f:
+            head = hashlib.sha1(f.read(min(headbytes, meta['consumed']))).hexdigest()
+            size = os.fstat(f.fileno()).st_size
+            if size < meta['consumed'] or head != meta['head']:   # a different log
+                self.clear()
+            f.seek(meta['consumed'])
+            data = f.read()
+        base = meta['consumed']
+        descs = meta['descriptions']
+        descindex = {d: i for i, d in enumerate(descs)}
+        reasons = meta['reasons']
+        reasonindex = {r: i for i, r in enumerate(reasons)}
+        new = {name: array(code) for name, code in columns.items()}
+        consumed = base
+        for run, end in parse(data, base):
+            desc = run['description']
+            if desc not in descindex:
+                descindex[desc] = len(descs)
+                descs.append(desc)
+            reason = run['reason']
+            if reason is not None and reason not in reasonindex:
+                reasonindex[reason] = len(reasons)
+                reasons.append(reason)
+            run['desc'] = descindex[desc]
+            run['reason'] = -1 if reason is None else reasonindex[reason]
+            run['outcome'] = outcomes.index(run['outcome'])
+            for name in columns:
+                new[name].append(run[name])
+            consumed = end
+        if consumed == base:
+            return 0
+        # columns first, then meta: a crash in between leaves bytes past the
+        # rows in meta, which are cut off here next time
+        for name in columns:
+            col = self.cols[name]
+            with open(self.colpath(name), 'r+b') as f:
+                f.truncate(len(col) * col.itemsize)
+                f.seek(0, os.SEEK_END)
+                new[name].tofile(f)
+            col.extend(new[name])
+        meta['rows'] = len(self.cols['setup'])
+        meta['consumed'] = consumed
+        if base < headbytes:   # the hash is of more than last time
+            with open(self.logpath, 'rb') as f:
+                meta['head'] = hashlib.sha1(f.read(min(headbytes, consumed))).hexdigest()
+        temp = os.path.join(self.path, 'meta.json.tmp')
+        with open(temp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp, os.path.join(self.path, 'meta.json'))
+        return len(new['setup'])
+
+    def select(self, setups=None, desc=None, kinds=None, since=None, until=None):
+        # row numbers matching all of the filters given
+        cols = self.cols
+        rows = range(self.meta['rows'])
+        if desc is not None:
+            want = desc.lower()
+            ids = {i for i, d in enumerate(self.meta['descriptions']) if want in d.lower()}
+            column = cols['desc']
+            rows = [r for r in rows if column[r] in ids]
+        if setups:
+            setups = set(setups)
+            column = cols['setup']
+            rows = [r for r in rows if column[r] in setups]
+        if kinds:   # outcomes
+            codes = {outcomes.index(o) for o in kinds}
+            column = cols['outcome']
+            rows = [r for r in rows if column[r] in codes]
+        if since is not None:
+            column = cols['start']
+            rows = [r for r in rows if column[r] >= since]
+        if until is not None:
+            column = cols['start']
+            rows = [r for r in rows if column[r] < until]
+        return list(rows)
+
+    def row(self, r):   # one run as a dict, for printing
+        cols = self.cols
+        reason = cols['reason'][r]
+        return {'setup': cols['setup'][r],
+                'description': self.meta['descriptions'][cols['desc'][r]],
+                'start': cols['start'][r],
+                'end': cols['end'][r],
+                'outcome': outcomes[cols['outcome'][r]],
+                'reason': None if reason < 0 else self.meta['reasons'][reason],
+                'orbits': cols['orbits'][r],
+                'events': cols['events'][r],
+                'steps': cols['steps'][r],
+                'sps': cols['sps'][r],
+                'offset': cols['offset'][r],
+                'length': cols['length'][r]}
+
+    def text(self, r):   # the run's lines in the log
+        with open(self.logpath, 'rb') as f:
+            f.seek(self.cols['offset'][r])
+            return f.read(self.cols['length'][r]).decode('utf-8', 'replace')
+
+
+def date(text):   # '2024-01-31' or '2024-01-31 18:00' -> seconds
+    for form in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return time.mktime(time.strptime(text, form))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f'not a date: {text!r} (YYYY-MM-DD [HH:MM])')
+
+
+def when(seconds):
+    if seconds != seconds:   # nan
+        return '????-??-?? ??:??'
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(seconds))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query the runs in tl-log.txt.')
+    parser.add_argument('--log', default='tl-log.txt', help='the log (default tl-log.txt)')
+    parser.add_argument('--index', help='index directory (default LOG.idx)')
+    parser.add_argument('--setup', type=int, nargs='+', help='setup numbers')
+    parser.add_argument('--desc', help='description contains this, any case')
+    parser.add_argument('--outcome', nargs='+', choices=outcomes)
+    parser.add_argument('--since', type=date, help='started on or after, YYYY-MM-DD [HH:MM]')
+    parser.add_argument('--until', type=date, help='started before')
+    parser.add_argument('--count', action='store_true', help='just say how many')
+    parser.add_argument('--json', action='store_true', help='a json object a line')
+    parser.add_argument('--raw', action='store_true', help="each run's lines from the log")
+    parser.add_argument('--rebuild', action='store_true', help='index the whole log again')
+    args = parser.parse_args(argv)
+
+    index = Index(args.log, args.index)
+    if args.rebuild:
+        index.clear()
+    start = time.perf_counter()
+    added = index.update()
+    took = time.perf_counter() - start
+    if added:
+        print(f'Indexed {added:,} new runs in {took:.3f}s, {index.meta["rows"]:,} in all',
+              file=sys.stderr)
+
+    start = time.perf_counter()
+    rows = index.select(args.setup, args.desc, args.outcome, args.since, args.until)
+    took = time.perf_counter() - start
+    if args.count:
+        print(len(rows))
+    for r in ([] if args.count else rows):
+        if args.raw:
+            print(index.text(r), end='')
+        elif args.json:
+            print(json.dumps(index.row(r)))
+        else:
+            run = index.row(r)
+            steps = f"{run['steps']:,}" if run['steps'] >= 0 else '?'
+            print(f"{when(run['start'])}  {run['setup']:3d}  {run['outcome']:10} "
+                  f"{run['orbits']:6d} orbits {steps:>13} steps  {run['description']}")
+    print(f'{len(rows):,} of {index.meta["rows"]:,} runs in {1000 * took:.1f} ms',
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,820 @@
+#
+# tlsim.py -- headless TerraLunar simulation engine.
+#
+# The physics used to live in the main loop of TerraLunar.py, tangled up
+# with console input and the Tk window.  Here it is on its own, so it can
+# be imported by batch jobs and run at full interpreter speed:
+#
+#     import tlsim
+#     sim = tlsim.Simulation(tlsim.grabsetup(2))
+#     sim.run_until('end')
+#     print(sim.shipstatus, sim.steps, sim.grabsnap())
+#
+# Graphics, logging etc. are optional observers attached with sim.attach().
+# An observer may define any of these methods, each called with the sim:
+#     on_step(sim)    after every integration step (slow; GUI only)
+#     on_orbit(sim)   when the ship crosses the +x axis going up
+#     on_check(sim)   every inz.checktrigger steps
+#     on_end(sim)     when the ship crashes or escapes
+#     on_event(sim)   with events='precise', for each event found inside a
+#                     step (perigee, perilune, ...), given as sim.lastevent
+# These are called in the middle of a step, with the state only partly
+# saved (steps and simtime not yet counted).  An observer that needs a
+# whole step, e.g. to save it, asks for sim.after(fn): fn(sim) is called
+# once step() returns.
+#
+# Use simplified Newtonian physics and numerical integrations.
+# F = ma = -GMm/r^2
+# a = F/m = -GM/r^2
+# v = v + dv = v + adt
+# x = x + dx = x + vdt
+# t = t + dt
+
+import math
+import time
+import json
+
+import tlinteg
+import tlmoon
+import tlevents
+import tlclassify
+import tlkepler
+
+# For the numerical physics model, use MKS units:  meter, kilogram, second.
+# Use the average Earth-Moon distance as a unit for view scaling.
+
+moondistance = 3.84399e8
+
+# Earth is at display center origin.
+
+earthrad = 6.3781e6
+earthx = 0.0
+earthy = 0.0
+
+moonrad = 1.7374e6   # radius of moon in meters
+
+gravcon = -6.67430e-11
+earthgrav = gravcon * 5.972e24
+moongrav = gravcon * 7.342e22
+# moon orbits counterclockwise 360 degrees/(27 days + 7 hr + 43 min + 12 sec)
+moonperiod = 27.*24*60*60 + 7.*3600 + 43.*60 + 12.
+
+# default window, used to decide when an escaping ship is out of view
+defaultwidth = 1930
+defaultheight = 1040
+
+# define a class to store a set of initial conditions...
+
+class Initset:
+    def __init__(self, moondegrees=60.0,
+                 shipxmd=1.0,
+                 shipymd=0.0,
+                 shipvx=0.0,
+                 shipvy=851.0,
+                 dtime=10,
+                 winscale=1.2,
+                 radscale=5.0,
+                 checktrigger=1000,
+                 description='Default setup',
+                 integrator='euler',
+                 tolerance=1e-9,
+                 moonmode='trig',
+                 moonecc=0.0,
+                 moonperi=0.0,
+                 events='steps',
+                 classify=False,
+                 kepler=0.0):
+
+        self.moondegrees = moondegrees
+        self.shipxmd = shipxmd
+        self.shipymd = shipymd
+        self.shipvx = shipvx
+        self.shipvy = shipvy
+        self.dtime = dtime
+        self.winscale = winscale
+        self.radscale = radscale
+        self.checktrigger = checktrigger
+        self.description = description
+        self.integrator = integrator   # one of tlinteg.names
+        self.tolerance = tolerance     # error per step, adaptive integrators
+        self.moonmode = moonmode       # one of tlmoon.modes
+        self.moonecc = moonecc         # Moon orbit eccentricity, 0 for a circle
+        self.moonperi = moonperi       # degrees, direction of the Moon's perigee
+        self.events = events           # 'steps' or 'precise', see tlevents.py
+        self.classify = classify       # stop once the outcome is certain, see tlclassify.py
+        self.kepler = kepler           # Moon/Earth pull ratio to skip ahead under, see tlkepler.py
+
+# A variety of interesting setups have been accumulated during development...
+
+setuplib = (['moondeg','xmd','ymd','vx','vy','dt','wscale','rscale','chktrig','Description'],
+            [60.0, 1.1, 0.0, 0.0, 1000.0, 30, 19.0, 5.0, 10000, '9.4M steps to escape'],
+            [60.0, 1.1, 0.0, 0.0, 1000.0, 60, 1.6, 5.0, 10000, '323k steps to lunar impact'],
+            [60.0, 1.1, 0.0, 0.0, 1000.0, 1, 5.0, 5.0, 40000, 'escape within 1B steps; small dt'],
+            [60.0, 1.1, 0.0, 0.0, 1000.0, 10, 2.0, 5.0, 10000, 'eventual lunar impact; medium dt'],
+            [60.0, 1.1, 0.0, 0.0, 1000.0, 60, 2.0, 5.0, 10000, 'eventual lunar impact; big dt'],
+            [60.0, 1.1, 0.0, 0.0, 1000.0, 30, 2.0, 5.0, 10000, '8M steps to escape'],
+            [0.0, 0.017, 0.0, 0.0, 9200.0, 1, 0.03, 1.0, 1000, 'elliptical orbit'],
+            [0.0, 0.017, 0.0, 0.0, 7900.0, 1, 0.02, 1.0, 1000, 'LEO = low Earth orbit'],
+            [0.0, 0.10968811, 0.0, 0.0, 3074.7937, 1, 0.15, 1.0, 1000, 'geosynchronous orbit'],
+            [0.0, 0.8491, 0.0, 0.0, 861.2724303351446, 10, 1.2, 1.0, 10000, 'just outside L1'],
+            [0.0, 0.8491, 0.0, 0.0, 861.2724303351447, 10, 1.2, 1.0, 10000, 'outside 22M inside outside L1'],
+            [0.0, 0.8491, 0.0, 0.0, 861.27243, 10, 1.2, 1.0, 10000, 'just below L1'],
+            [0.0, 0.85, 0.0, 0.0, 870.0, 10, 1.2, 1.0, 10000, 'near L1'],
+            [0.0, 0.90, 0.0, 0.0, 770.0, 10, 1.2, 1.0, 10000, 'distant lunar orbit'],
+            [135.4, 0.0168, 0.0, 0.0, 11050.0, 1, 2.7, 1.0, 10000, 'escape with lunar assist'],
+            [135.0, 0.0168, 0.0, 0.0, 11050.0, 1, 0.7, 1.0, 10000, 'Ranger direct lunar impact'],
+            [0.0, 0.995, 0.0, 0.0, 2590.0, 10, 1.1, 1.0, 10000, 'Apollo 8 orbiting moon'],
+            [135.0, 0.017, 0.0, 0.0, 10998.0, 1, 0.7, 1.0, 10000, 'Apollo 13 safe return'],
+            [135.0, 0.017, 0.0, 0.0, 10990.0, 1, 0.7, 1.0, 10000, 'direct lunar impact'],
+            [135.0, 0.017, 0.0, 0.0, 11000.0, 1, 0.8, 1.0, 10000, 'lost Apollo 13'],
+            [130.0, 0.02, 0.0, 0.0, 10080.0, 10, 1.1, 1.0, 10000, '2-orbit lunar impact'],
+            [60.0, 0.8, 0.0, 400.0, 1100., 50, 1.8, 5.0, 10000, 'failed L4; 11M steps to moon'],
+            [60.0, 0.8, 0.0, 100.0, 1073., 10, 5.0, 10.0, 10000, 'eventual lunar impact #2'],
+            [60.0, 1.0, 0.0, 0.0, 900.0, 101, 1.3, 1.0, 10000, 'lunar impact 1.5M loops'],
+            [60.0, 1.0, 0.0, 0.0, 900.0, 60, 39.5, 5.0, 10000, 'many lunar interactions'],
+            [60.0, 1.0, 0.0, 0.0, 900.0, 30, 1.3, 1.0, 10000, 'lunar impact, 2.2M steps'],
+            [60.0, 1.0, 0.0, 0.0, 900.0, 10, 2.0, 5.0, 40000, 'temporary lunar orbits then impact'],
+            [55.0, 3.0, 0.0, 0.0, 0.0, 10, 2.0, 1.0, 10000, 'non-fall to Earth from 3 moondistances.'],
+            [40.0, 5.0, 0.0, 0.0, 0.0, 1, 3.0, 1.0, 10000, 'fall to Earth from 5 moondistances.'],
+            [60.0, 0.9, 0.0, 0.0, 950.0, 60, 1.7, 5.0, 10000, '11.85M steps to Lunar Impact'],
+            [60.0, 0.8, 0.0, 0.0, 1073., 10, 1.3, 1.0, 10000, 'lunar impact'],
+            [60.0, 1.0, 0.0, 0.0, 923.0, 10, 1.1, 1.0, 10000, 'lunar impact, vy=921-926'],
+            [0.0, 0.98, 0.0, 0.0, 2000.0, 10, 1.1, 1.0, 10000, 'medium distance lunar orbit 1'],
+            [0.0, 0.95, 0.0, 0.0, 1500.0, 10, 1.1, 1.0, 10000, 'medium distance lunar orbit 2'],
+)
+
+def grabsetup(i):   # return one setup from library
+    return Initset(moondegrees=setuplib[i][0],
+                   shipxmd=setuplib[i][1],
+                   shipymd=setuplib[i][2],
+                   shipvx=setuplib[i][3],
+                   shipvy=setuplib[i][4],
+                   dtime=setuplib[i][5],
+                   winscale=setuplib[i][6],
+                   radscale=setuplib[i][7],
+                   checktrigger=setuplib[i][8],
+                   description=setuplib[i][9])
+
+def parseparams(d):   # extract setup from json dictionary object
+    return Initset(moondegrees=d['moondeg'],
+                   shipxmd=d['xmd'],
+                   shipymd=d['ymd'],
+                   shipvx=d['vx'],
+                   shipvy=d['vy'],
+                   dtime=d['dt'],
+                   winscale=d['wscale'],
+                   radscale=d['rscale'],
+                   checktrigger=d['chktrig'],
+                   description=d['Description'],
+                   integrator=d.get('integrator', 'euler'),
+                   tolerance=d.get('tol', 1e-9),
+                   moonmode=d.get('moonmode', 'trig'),
+                   moonecc=d.get('moonecc', 0.0),
+                   moonperi=d.get('moonperi', 0.0),
+                   events=d.get('events', 'steps'),
+                   classify=d.get('classify', False),
+                   kepler=d.get('kepler', 0.0))
+
+def offscreen(inz, winwidth=defaultwidth, winheight=defaultheight):
+    # meters from Earth to be out of view, same rule as the display uses
+    winmin = min(winwidth, winheight)
+    winmax = max(winwidth, winheight)
+    viewscale = winmin / (3.0 * moondistance * inz.winscale)  # pixels/meter
+    return 0.4 * winmax / viewscale
+
+
+class Simulation:
+    # One ship moving around the Earth with the Moon on a circular orbit.
+
+    def __init__(self, inz, setupnum=0, escaperange=None):
+        if isinstance(inz, dict):
+            inz = parseparams(inz)
+        self.inz = inz
+        self.setupnum = setupnum
+        if escaperange is None:
+            escaperange = offscreen(inz)
+        self.escaperange = escaperange   # meters from Earth to count as gone
+
+        self.dtime = inz.dtime   # time step for simulation
+        self.moonstep = math.radians(360.*self.dtime/moonperiod)
+        self.moonrate = math.radians(360./moonperiod)   # radians/second
+
+        self.moon = tlmoon.Moon(moondistance, earthx, earthy, mode=inz.moonmode,
+                                ecc=inz.moonecc, peri=math.radians(inz.moonperi))
+        # moonangle is the Moon's phase, its angle on a circular orbit
+        self.moonangle = self.moon.phase(math.radians(inz.moondegrees))  # calculate with radians
+        self.moonangle0 = self.moonangle
+        self.moonx, self.moony = self.moon.position(self.moonangle)
+
+        self.shipx = earthx + moondistance*inz.shipxmd
+        self.shipy = earthy + moondistance*inz.shipymd
+        self.shipvx = inz.shipvx
+        self.shipvy = inz.shipvy
+        self.d2e = math.hypot(self.shipx - earthx, self.shipy - earthy)
+        self.oldd2e = self.d2e
+        self.d2m = math.hypot(self.shipx - self.moonx, self.shipy - self.moony)
+
+        self.simtime = 0   # elapsed simulation time
+        self.steps = 0
+        self.orbits = 0    # to count orbits around Earth
+        self.shipstatus = 'in orbit'
+        self.outcome = None   # 'earthcrash', 'mooncrash' or 'escape' when done
+        self.reason = None    # why the run ended, for the log
+        self.done = False
+
+        self.observers = []
+        self._halt = False
+        self._later = []    # calls for when step() returns, see after()
+        self._renorm = self.moon.renorm   # steps to the next exact moon position
+
+        if inz.events not in ('steps', 'precise'):
+            raise ValueError(f"events must be 'steps' or 'precise', not {inz.events!r}")
+        precise = inz.events == 'precise'
+
+        # None means the inline Euler loop below
+        self.stepper = tlinteg.make(inz.integrator, self.gravity, self.dtime,
+                                    inz.tolerance, inline=not precise)
+
+        self.scanner = None
+        self.lastevent = None
+        if precise:
+            self.scanner = tlevents.EventScanner(earthx, earthy, earthrad, moonrad,
+                                                 self.moonat, self.moonvel, escaperange,
+                                                 -2.0 * (earthgrav + moongrav))
+
+        self.classifier = None
+        if inz.classify:
+            self.classifier = tlclassify.Classifier(self.moon, self.moonrate, earthrad,
+                                                    moonrad, earthgrav, moongrav)
+
+        # closed form jumps along Kepler ellipses; fixed steps only, and not
+        # with precise events, which would miss the perigees jumped over
+        self.fastforward = None
+        if inz.kepler > 0.0 and not precise and not (self.stepper is not None
+                                                     and self.stepper.adaptive):
+            self.fastforward = tlkepler.FastForward(inz.kepler, self.moon, earthrad,
+                                                    moonrad, earthgrav, moongrav,
+                                                    staggered=self.stepper is None)
+
+    def moonat(self, t):   # Moon position at simulated time t
+        return self.moon.position(self.moonangle0 + self.moonrate*t)
+
+    def moonvel(self, t):
+        return self.moon.velocity(self.moonangle0 + self.moonrate*t, self.moonrate)
+
+    def gravity(self, x, y, t):   # ship acceleration at (x, y) at time t
+        moonx, moony = self.moon.position(self.moonangle0 + self.moonrate*t)
+        mx = x - moonx
+        my = y - moony
+        ex = x - earthx
+        ey = y - earthy
+        d2e = math.hypot(ex, ey)
+        d2m = math.hypot(mx, my)
+        s2eaccel = earthgrav / (d2e * d2e * d2e)
+        s2maccel = moongrav / (d2m * d2m * d2m)
+        return s2eaccel*ex + s2maccel*mx, s2eaccel*ey + s2maccel*my
+
+    def jacobi(self):
+        # Energy less moonrate times angular momentum, per unit mass.  The
+        # Moon's pull turns steadily with the Moon, so this stays constant
+        # for an exact integration; its drift measures integrator error.
+        d2e = math.hypot(self.shipx - earthx, self.shipy - earthy)
+        d2m = math.hypot(self.shipx - self.moonx, self.shipy - self.moony)
+        energy = 0.5*(self.shipvx**2 + self.shipvy**2) + earthgrav/d2e + moongrav/d2m
+        angmom = (self.shipx - earthx)*self.shipvy - (self.shipy - earthy)*self.shipvx
+        return energy - self.moonrate*angmom
+
+    def attach(self, observer):
+        self.observers.append(observer)
+        return observer
+
+    def detach(self, observer):
+        self.observers.remove(observer)
+
+    def after(self, fn):   # call fn(sim) when step() returns, between two steps
+        if fn not in self._later:
+            self._later.append(fn)
+
+    def _runlater(self):
+        later = self._later
+        self._later = []
+        for fn in later:
+            fn(self)
+
+    def stop(self):   # ask step() to return after the current step
+        self._halt = True
+
+    def _notify(self, name):
+        if self.stepper is not None:
+            self.dtime = self.stepper.dtime
+        for obs in self.observers:
+            fn = getattr(obs, name, None)
+            if fn is not None:
+                fn(self)
+
+    # what changes as the run goes; with inz this is the whole state
+    statefields = ('dtime', 'moonangle', 'moonx', 'moony', 'shipx', 'shipy',
+                   'shipvx', 'shipvy', 'd2e', 'oldd2e', 'd2m', 'simtime', 'steps',
+                   'orbits', 'shipstatus', 'outcome', 'reason', 'done', '_renorm')
+
+    def getstate(self):
+        # Everything needed to carry on exactly where the run is now, as
+        # plain values.  grabsnap() is rounder and loses time, steps, etc.
+        state = {'inz': dict(vars(self.inz)),
+                 'setupnum': self.setupnum,
+                 'escaperange': self.escaperange}
+        for name in self.statefields:
+            state[name] = getattr(self, name)
+        if self.stepper is not None:
+            state['stepper'] = {k: v for k, v in vars(self.stepper).items() if k != 'accel'}
+        if self.scanner is not None:
+            state['scanner'] = (self.scanner._rdote, self.scanner._rdotm)
+        if self.fastforward is not None:
+            state['fastforward'] = (self.fastforward.hops, self.fastforward.skipped)
+        return state
+
+    @classmethod
+    def fromstate(cls, state):   # inverse of getstate()
+        sim = cls(Initset(**state['inz']), state['setupnum'], state['escaperange'])
+        for name in cls.statefields:
+            setattr(sim, name, state[name])
+        if sim.stepper is not None:
+            for k, v in state['stepper'].items():
+                setattr(sim.stepper, k, v)
+        if sim.scanner is not None:
+            sim.scanner._rdote, sim.scanner._rdotm = state['scanner']
+        if sim.fastforward is not None:
+            sim.fastforward.hops, sim.fastforward.skipped = state['fastforward']
+        return sim
+
+    def grabsnap(self):   # grab parameter snapshot to enable logging and replays
+        inz = self.inz
+        snapdict = {'moondeg': math.degrees(self.moon.polar(self.moonangle)),
+                    'xmd': self.shipx/moondistance,
+                    'ymd': self.shipy/moondistance,
+                    'vx': self.shipvx,
+                    'vy': self.shipvy,
+                    'dt': self.dtime,
+                    'wscale': inz.winscale,
+                    'rscale': inz.radscale,
+                    'chktrig': inz.checktrigger,
+                    'Description': 'Snapshot from: ' + inz.description}
+        if inz.integrator != 'euler':
+            snapdict['integrator'] = inz.integrator
+            snapdict['tol'] = inz.tolerance
+        if inz.moonmode != 'trig':
+            snapdict['moonmode'] = inz.moonmode
+        if inz.moonecc != 0.0:
+            snapdict['moonecc'] = inz.moonecc
+            snapdict['moonperi'] = inz.moonperi
+        if inz.events != 'steps':
+            snapdict['events'] = inz.events
+        if inz.classify:
+            snapdict['classify'] = True
+        if inz.kepler > 0.0:
+            snapdict['kepler'] = inz.kepler
+        return snapdict
+
+    def step(self, n=1):
+        # Advance up to n steps.  Returns the number of steps taken, which is
+        # less than n if the ship crashed or escaped or stop() was called.
+        if self.done:
+            return 0
+        self._halt = False
+        if self.stepper is not None:
+            return self._stepwith(n)
+        hypot = math.hypot
+        cos = math.cos
+        sin = math.sin
+        stepwatch = any(hasattr(obs, 'on_step') for obs in self.observers)
+        watched = len(self.observers) > 0
+
+        dtime = self.dtime
+        moonstep = self.moonstep
+        moon = self.moon
+        moonpos = moon.position
+        if moon.mode == 'trig' and moon.ecc == 0.0:
+            moonmode = 0   # inline cos and sin, as always
+        elif moon.mode == 'rotate':
+            moonmode = 1   # inline rotation by moonstep
+            mcos = cos(moonstep)
+            msin = sin(moonstep)
+            renorm = self._renorm
+        else:
+            moonmode = 2
+        checktrigger = self.inz.checktrigger
+        escaperange = self.escaperange
+        classify = self.classifier
+        kepler = self.fastforward
+        shipx = self.shipx
+        shipy = self.shipy
+        shipvx = self.shipvx
+        shipvy = self.shipvy
+        moonangle = self.moonangle
+        moonx = self.moonx
+        moony = self.moony
+        d2e = self.d2e
+        oldd2e = self.oldd2e
+        d2m = self.d2m
+        simtime = self.simtime
+        steps = self.steps
+        orbits = self.orbits
+        outcome = None
+        reason = None
+        halt = False
+        taken = 0
+
+        while taken < n:
+            oldd2e = d2e
+            d2e = hypot(shipx - earthx, shipy - earthy)
+            if d2e < earthrad:
+                outcome = 'earthcrash'
+                break
+
+            d2m = hypot(shipx - moonx, shipy - moony)
+            if d2m < moonrad:
+                outcome = 'mooncrash'
+                break
+
+            s2eaccel = dtime * earthgrav / (d2e * d2e * d2e)
+            s2maccel = dtime * moongrav / (d2m * d2m * d2m)
+            shipvx += s2eaccel * (shipx - earthx) + s2maccel * (shipx - moonx)
+            shipvy += s2eaccel * (shipy - earthy) + s2maccel * (shipy - moony)
+            oldshipy = shipy  # to detect crossing of x-axis each orbit of Earth
+            shipx += dtime * shipvx
+            shipy += dtime * shipvy
+
+            if oldshipy < earthy and shipy >= earthy:  # detect x-axis crossings
+                orbits += 1
+                if watched:
+                    self._save(shipx, shipy, shipvx, shipvy, moonangle, moonx, moony,
+                               d2e, oldd2e, d2m, simtime, steps, orbits)
+                    self._notify('on_orbit')
+                    halt = self._halt
+                if kepler is not None:   # jump on to just before the next check
+                    hop = kepler(shipx, shipy, shipvx, shipvy, dtime,
+                                 min(checktrigger - steps % checktrigger, n - taken) - 1)
+                    if hop is not None:
+                        k, shipx, shipy, shipvx, shipvy = hop
+                        steps += k
+                        taken += k
+                        simtime += k * dtime
+                        moonangle += k * moonstep
+                        moonx, moony = moonpos(moonangle)
+                        if moonmode == 1:
+                            renorm = moon.renorm
+
+            moonangle += moonstep
+            if moonmode == 0:
+                moonx = earthx + moondistance*cos(moonangle)
+                moony = earthy + moondistance*sin(moonangle)
+            elif moonmode == 1:
+                renorm -= 1
+                if renorm > 0:
+                    mx = moonx - earthx
+                    my = moony - earthy
+                    moonx = earthx + mx*mcos - my*msin
+                    moony = earthy + mx*msin + my*mcos
+                else:   # exact now and then so rounding cannot pile up
+                    renorm = moon.renorm
+                    moonx = earthx + moondistance*cos(moonangle)
+                    moony = earthy + moondistance*sin(moonangle)
+            else:
+                moonx, moony = moonpos(moonangle)
+
+            if steps % checktrigger == 0:
+                velocity = hypot(shipvx, shipvy)
+                escapevelocity = math.sqrt(-2.0 * (earthgrav + moongrav) / d2e)
+                escaped = (velocity > escapevelocity) and (d2e > escaperange)
+                if watched:
+                    self._save(shipx, shipy, shipvx, shipvy, moonangle, moonx, moony,
+                               d2e, oldd2e, d2m, simtime, steps, orbits)
+                    self._notify('on_check')
+                    halt = halt or self._halt
+                if escaped:
+                    outcome = 'escape'
+                    break
+                if classify is not None:
+                    verdict = classify(shipx, shipy, shipvx, shipvy, moonx, moony, moonangle)
+                    if verdict is not None:
+                        outcome, reason = verdict
+                        break
+                if kepler is not None:   # jump on to just before the next check
+                    hop = kepler(shipx, shipy, shipvx, shipvy, dtime,
+                                 min(checktrigger, n - taken) - 1)
+                    if hop is not None:
+                        k, shipx, shipy, shipvx, shipvy = hop
+                        steps += k
+                        taken += k
+                        simtime += k * dtime
+                        moonangle += k * moonstep
+                        moonx, moony = moonpos(moonangle)
+                        if moonmode == 1:
+                            renorm = moon.renorm
+
+            simtime += dtime
+            steps += 1
+            taken += 1
+            if stepwatch:
+                self._save(shipx, shipy, shipvx, shipvy, moonangle, moonx, moony,
+                           d2e, oldd2e, d2m, simtime, steps, orbits)
+                self._notify('on_step')
+                halt = halt or self._halt
+            if halt:
+                break
+
+        self._save(shipx, shipy, shipvx, shipvy, moonangle, moonx, moony,
+                   d2e, oldd2e, d2m, simtime, steps, orbits)
+        if moonmode == 1:
+            self._renorm = renorm
+        if outcome is not None:
+            self._finish(outcome, reason)
+        if self._later:
+            self._runlater()
+        return taken
+
+    def _stepwith(self, n):
+        # Same as step() but each step is taken by self.stepper, with the
+        # Moon placed by time rather than by counting steps.
+        hypot = math.hypot
+        stepwatch = any(hasattr(obs, 'on_step') for obs in self.observers)
+        watched = len(self.observers) > 0
+
+        advance = self.stepper.advance
+        scan = self.scanner.scan if self.scanner is not None else None
+        moonpos = self.moon.position
+        moonangle0 = self.moonangle0
+        moonrate = self.moonrate
+        checktrigger = self.inz.checktrigger
+        escaperange = self.escaperange
+        classify = self.classifier
+        kepler = self.fastforward
+        shipx = self.shipx
+        shipy = self.shipy
+        shipvx = self.shipvx
+        shipvy = self.shipvy
+        moonangle = self.moonangle
+        moonx = self.moonx
+        moony = self.moony
+        d2e = self.d2e
+        oldd2e = self.oldd2e
+        d2m = self.d2m
+        simtime = self.simtime
+        steps = self.steps
+        orbits = self.orbits
+        outcome = None
+        reason = None
+        halt = False
+        taken = 0
+
+        while taken < n:
+            oldd2e = d2e
+            d2e = hypot(shipx - earthx, shipy - earthy)
+            if d2e < earthrad:
+                outcome = 'earthcrash'
+                break
+
+            d2m = hypot(shipx - moonx, shipy - moony)
+            if d2m < moonrad:
+                outcome = 'mooncrash'
+                break
+
+            oldshipy = shipy  # to detect crossing of x-axis each orbit of Earth
+            if scan is not None:
+                x0, vx0, vy0 = shipx, shipvx, shipvy
+            shipx, shipy, shipvx, shipvy, dtime = advance(shipx, shipy, shipvx, shipvy, simtime)
+
+            if scan is not None:
+                events = scan(simtime, x0, oldshipy, vx0, vy0,
+                              simtime + dtime, shipx, shipy, shipvx, shipvy)
+                for ev in events:
+                    self.lastevent = ev
+                    if ev.kind in tlevents.terminal:
+                        # put the ship where and when it hit; on_end follows
+                        outcome = ev.kind
+                        shipx, shipy, shipvx, shipvy = ev.x, ev.y, ev.vx, ev.vy
+                        dtime = ev.time - simtime
+                        break
+                    if ev.kind == 'orbit':
+                        orbits += 1
+                    if watched:
+                        self._save(shipx, shipy, shipvx, shipvy, moonangle, moonx, moony,
+                                   d2e, oldd2e, d2m, simtime, steps, orbits)
+                        self._notify('on_orbit' if ev.kind == 'orbit' else 'on_event')
+                        halt = halt or self._halt
+                if outcome is not None:
+                    simtime += dtime
+                    moonangle = moonangle0 + moonrate*simtime
+                    moonx, moony = moonpos(moonangle)
+                    d2e = hypot(shipx - earthx, shipy - earthy)
+                    d2m = hypot(shipx - moonx, shipy - moony)
+                    steps += 1
+                    taken += 1
+                    break
+            elif oldshipy < earthy and shipy >= earthy:  # detect x-axis crossings
+                orbits += 1
+                if watched:
+                    self._save(shipx, shipy, shipvx, shipvy, moonangle, moonx, moony,
+                               d2e, oldd2e, d2m, simtime, steps, orbits)
+                    self._notify('on_orbit')
+                    halt = self._halt
+                if kepler is not None:   # jump on to just before the next check
+                    hop = kepler(shipx, shipy, shipvx, shipvy, dtime,
+                                 min(checktrigger - steps % checktrigger, n - taken) - 1)
+                    if hop is not None:
+                        k, shipx, shipy, shipvx, shipvy = hop
+                        steps += k
+                        taken += k
+                        simtime += k * dtime
+
+            moonangle = moonangle0 + moonrate*(simtime + dtime)   # the Moon at the step's end
+            moonx, moony = moonpos(moonangle)
+
+            if steps % checktrigger == 0:
+                velocity = hypot(shipvx, shipvy)
+                escapevelocity = math.sqrt(-2.0 * (earthgrav + moongrav) / d2e)
+                escaped = (velocity > escapevelocity) and (d2e > escaperange)
+                if watched:
+                    self._save(shipx, shipy, shipvx, shipvy, moonangle, moonx, moony,
+                               d2e, oldd2e, d2m, simtime, steps, orbits)
+                    self._notify('on_check')
+                    halt = halt or self._halt
+                if escaped and scan is None:   # the scanner checks every step
+                    outcome = 'escape'
+                    break
+                if classify is not None:
+                    verdict = classify(shipx, shipy, shipvx, shipvy, moonx, moony, moonangle)
+                    if verdict is not None:
+                        outcome, reason = verdict
+                        break
+                if kepler is not None:   # jump on to just before the next check
+                    hop = kepler(shipx, shipy, shipvx, shipvy, dtime,
+                                 min(checktrigger, n - taken) - 1)
+                    if hop is not None:
+                        k, shipx, shipy, shipvx, shipvy = hop
+                        steps += k
+                        taken += k
+                        simtime += k * dtime
+                        moonangle = moonangle0 + moonrate*(simtime + dtime)
+                        moonx, moony = moonpos(moonangle)
+
+            simtime += dtime   # with steps, so a break above leaves them matched
+            steps += 1
+            taken += 1
+            if stepwatch:
+                self._save(shipx, shipy, shipvx, shipvy, moonangle, moonx, moony,
+                           d2e, oldd2e, d2m, simtime, steps, orbits)
+                self._notify('on_step')
+                halt = halt or self._halt
+            if halt:
+                break
+
+        self.dtime = self.stepper.dtime
+        self._save(shipx, shipy, shipvx, shipvy, moonangle, moonx, moony,
+                   d2e, oldd2e, d2m, simtime, steps, orbits)
+        if outcome is not None:
+            self._finish(outcome, reason)
+        if self._later:
+            self._runlater()
+        return taken
+
+    def _save(self, shipx, shipy, shipvx, shipvy, moonangle, moonx, moony,
+              d2e, oldd2e, d2m, simtime, steps, orbits):
+        self.shipx = shipx
+        self.shipy = shipy
+        self.shipvx = shipvx
+        self.shipvy = shipvy
+        self.moonangle = moonangle
+        self.moonx = moonx
+        self.moony = moony
+        self.d2e = d2e
+        self.oldd2e = oldd2e
+        self.d2m = d2m
+        self.simtime = simtime
+        self.steps = steps
+        self.orbits = orbits
+
+    def stepstats(self, elapsed, startsteps=0):
+        # one line about the stepping, for the status text and the log
+        sps = int((self.steps - startsteps) / elapsed) if elapsed > 0 else 0
+        line = f"{self.steps:,.0f} steps  @  {sps} /sec"
+        stepper = self.stepper
+        if stepper is not None and stepper.adaptive:
+            line += (f"  dt={stepper.dtime:.3g}s  {stepper.accepted:,} ok"
+                     f" {stepper.rejected:,} rejected")
+        if self.fastforward is not None and self.fastforward.skipped:
+            line += f"  {self.fastforward.skipped:,} skipped by Kepler"
+        return line
+
+    def _finish(self, outcome, reason=None):
+        self.outcome = outcome
+        self.done = True
+        if reason is not None:   # called early by the classifier
+            self.reason = reason
+            if outcome == 'earthcrash':
+                self.shipstatus = "Earth impact certain !"
+            elif outcome == 'mooncrash':
+                self.shipstatus = "Moon impact certain !"
+            elif outcome == 'escape':
+                self.shipstatus = "Escape certain !  Lost in space!"
+        elif outcome == 'earthcrash':
+            self.shipstatus = "Crashed on Earth !"
+            self.reason = "inside Earth radius"
+        elif outcome == 'mooncrash':
+            self.shipstatus = "Crashed on Moon !"
+            self.reason = "inside Moon radius"
+        elif outcome == 'escape':
+            self.shipstatus = "Escape velocity !  Lost in space!"
+            self.reason = "out of view above escape velocity"
+        self._notify('on_end')
+
+    def run_until(self, event='end', maxsteps=None, chunk=100000):
+        # Step until the named event happens: 'orbit', 'check', 'end'
+        # (any of 'earthcrash', 'mooncrash', 'escape'), or one of those three.
+        # event may also be a function of the sim, tested after every step.
+        # Returns the number of steps taken.
+        stopper = _Until(event)
+        self.attach(stopper)
+        taken = 0
+        try:
+            while not self.done and not stopper.hit:
+                n = chunk
+                if maxsteps is not None:
+                    n = min(n, maxsteps - taken)
+                    if n <= 0:
+                        break
+                got = self.step(n)
+                taken += got
+                if got < n:
+                    break
+        finally:
+            self.detach(stopper)
+        return taken
+
+
+class _Until:
+    # internal observer which halts the sim when an event fires
+
+    def __init__(self, event):
+        self.event = event
+        self.hit = False
+        if callable(event):
+            self.on_step = self._test
+
+    def _test(self, sim):
+        if self.event(sim):
+            self._fire(sim)
+
+    def _fire(self, sim):
+        self.hit = True
+        sim.stop()
+
+    def on_orbit(self, sim):
+        if self.event == 'orbit':
+            self._fire(sim)
+
+    def on_check(self, sim):
+        if self.event == 'check':
+            self._fire(sim)
+
+    def on_end(self, sim):
+        if self.event in ('end', sim.outcome):
+            self.hit = True
+
+
+class LogObserver:
+    # Append the familiar tl-log.txt records: setup header, start and end
+    # stamps, and one json snapshot per orbit plus a final one.
+
+    def __init__(self, logfile, sim):
+        self.logfile = logfile
+        self.starttime = time.time()
+        self.startsteps = sim.steps
+        logfile.write(f"\n{sim.setupnum}: {sim.inz.description}\n")
+        logfile.write('Start @ ' + time.asctime(time.localtime()) + '\n')
+
+    def on_orbit(self, sim):
+        json.dump(sim.grabsnap(), self.logfile)   # snapshot and log current parameters
+        self.logfile.write('\n')
+
+    def on_event(self, sim):   # perigee and perilune passages, precise events only
+        json.dump(sim.lastevent.asdict(), self.logfile)
+        self.logfile.write('\n')
+
+    def close(self, sim, notes=()):
+        # notes: more lines for the end of the run, e.g. a tlprof report
+        logfile = self.logfile
+        timestamp = time.asctime(time.localtime())
+        logfile.write('End   @ ' + timestamp + '\n')
+        logfile.write(sim.stepstats(time.time() - self.starttime, self.startsteps) + '\n')
+        if sim.reason is not None:
+            logfile.write('Stopped: ' + sim.reason + '\n')
+        for line in notes:
+            logfile.write(line + '\n')
+        logfile.write('-----------------------------\n')
+        snapshot = sim.grabsnap()    # snapshot and log final parameters
+        snapshot["Description"] = f"Final snapshot; {sim.shipstatus}"
+        json.dump(snapshot, logfile)
+        logfile.write('\n==============================\n')
+        logfile.close()
+        return snapshot
@@ -0,0 +1,252 @@
+#!/usr/bin/python3
+#
+# tlsweep.py -- run a TerraLunar setup many times with fields changed.
+#
+# Takes a setup from setuplib (or a json setup file) and ranges over any of
+# its fields, runs every combination headless on a process pool, and
+# writes one row per run to a JSONL or CSV results file:
+#
+#     python3 tlsweep.py 32 --vary vy=921:926:0.25 --vary dt=10,30
+#     python3 tlsweep.py 2 --vary moondeg=50:70:1 --out moondeg.csv
+#
+# A range is first:last:step (last included) or a comma separated list.
+# Field names are the setuplib / tl-setup.json ones: moondeg xmd ymd vx vy
+# dt wscale rscale chktrig.
+#
+# Sweeps are resumable: rerunning the same command skips every run already
+# in the results file, so an interrupted sweep picks up where it stopped.
+# A run's key holds the setup (its number, or a hash of a setup file's
+# fields), the step cap, the method and Moon model and the varied fields,
+# so runs of other setups or settings in the same file are not mistaken
+# for it.
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import tlsim
+import tlinteg
+
+columns = ['key', 'setup', 'status', 'outcome', 'steps', 'orbits', 'simtime', 'seconds', 'snapshot']
+
+
+def baseparams(setupnum, setupfile=None):   # setup as a json style dict
+    if setupfile:
+        with open(setupfile, 'r') as f:
+            return json.load(f)
+    return dict(zip(tlsim.setuplib[0], tlsim.setuplib[setupnum]))
+
+
+def setupid(setupnum, base, setupfile=None):
+    # the setup number, or for a setup file a hash of its fields
+    if not setupfile:
+        return setupnum
+    text = json.dumps(base, sort_keys=True)
+    return 'file:' + hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def parserange(text):
+    # 'field=first:last:step' or 'field=a,b,c' -> (field, [values])
+    field, _, spec = text.partition('=')
+    if field not in tlsim.setuplib[0] or field == 'Description':
+        raise ValueError(f'unknown setup field {field!r}')
+    if ':' in spec:
+        first, last, step = (float(v) for v in spec.split(':'))
+        if step <= 0:
+            raise ValueError(f'step must be positive in {text!r}')
+        count = int(round((last - first) / step)) + 1
+        values = [first + i*step for i in range(count)]
+    else:
+        values = [float(v) for v in spec.split(',')]
+    if field in ('dt', 'chktrig'):
+        values = [int(v) if v == int(v) else v for v in values]
+    return field, values
+
+
+def makejobs(base, ranges, maxsteps, setup):
+    fields = [field for field, values in ranges]
+    method = {k: base[k] for k in ('integrator', 'events', 'classify', 'kepler', 'moonperi')
+              if k in base}
+    method.update(setup=setup, maxsteps=maxsteps, tol=base.get('tol', 1e-9),
+                  moonmode=base.get('moonmode', 'trig'), moonecc=base.get('moonecc', 0.0))
+    for combo in itertools.product(*[values for field, values in ranges]):
+        params = dict(base)
+        params.update(zip(fields, combo))
+        key = json.dumps(dict(method, **dict(zip(fields, combo))), sort_keys=True)
+        yield key, setup, params, maxsteps
+
+
+def runone(job):   # runs in a worker process
+    key, setup, params, maxsteps = job
+    start = time.time()
+    sim = tlsim.Simulation(params)
+    sim.run_until('end', maxsteps=maxsteps)
+    status = sim.shipstatus if sim.done else 'Step cap reached'
+    snapshot = sim.grabsnap()
+    snapshot['Description'] = f"Final snapshot; {status}"
+    return {'key': key,
+            'setup': setup,
+            'status': status,
+            'outcome': sim.outcome or 'stepcap',
+            'steps': sim.steps,
+            'orbits': sim.orbits,
+            'simtime': sim.simtime,
+            'seconds': round(time.time() - start, 3),
+            'snapshot': snapshot}
+
+
+def csvrows(path):
+    # (complete rows as dicts, bytes up to the end of the last of them) of
+    # a results .csv; a row cut off by an interrupt, quoted field and all,
+    # is left out
+    rows = []
+    end = 0
+    with open(path, 'rb') as f:
+        read = 0
+        whole = True   # the last line read had its newline
+
+        def lines():
+            nonlocal read, whole
+            for line in f:
+                read += len(line)
+                whole = line.endswith(b'\n')
+                yield line.decode('utf-8', 'replace')
+
+        reader = csv.reader(lines())
+        header = next(reader, None)
+        if header is None or not whole:
+            return rows, 0
+        end = read
+        for row in reader:
+            if whole and len(row) == len(header) and row[-1].endswith('}'):
+                rows.append(dict(zip(header, row)))
+                end = read
+    return rows, end
+
+
+def finishedkeys(path):
+    # keys of runs already in the results file; tolerates a torn last line
+    done = set()
+    if not os.path.exists(path):
+        return done
+    if path.endswith('.csv'):
+        for row in csvrows(path)[0]:
+            if (row.get('snapshot') or '').endswith('}'):
+                done.add(row['key'])
+        return done
+    with open(path, 'r', newline='') as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['key'])
+            except (ValueError, KeyError):
+                pass
+    return done
+
+
+class Results:
+    # append rows to a JSONL or CSV file, flushed after every row
+
+    def __init__(self, path):
+        self.csv = path.endswith('.csv')
+        fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not fresh and self.csv:
+            end = csvrows(path)[1]
+            if end < os.path.getsize(path):
+                os.truncate(path, end)   # drop a row cut off by an interrupt
+            fresh = end == 0
+        elif not fresh:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        self.f = open(path, 'a', newline='')
+        if not fresh and not self.csv and torn:
+            self.f.write('\n')   # finish a line cut off by an interrupt
+        if self.csv:
+            self.writer = csv.DictWriter(self.f, fieldnames=columns)
+            if fresh:
+                self.writer.writeheader()
+
+    def write(self, row):
+        if self.csv:
+            row = dict(row, snapshot=json.dumps(row['snapshot']))
+            self.writer.writerow(row)
+        else:
+            json.dump(row, self.f)
+            self.f.write('\n')
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Parameter sweep over a TerraLunar setup.')
+    parser.add_argument('setup', type=int, nargs='?', default=1,
+                        help='setuplib number (default 1)')
+    parser.add_argument('--setup-file', help='json setup file instead of setuplib')
+    parser.add_argument('--vary', action='append', default=[], metavar='FIELD=RANGE',
+                        help='field=first:last:step or field=a,b,c; may repeat')
+    parser.add_argument('--maxsteps', type=int, default=10000000,
+                        help='step cap per run (default 10M)')
+    parser.add_argument('--integrator', choices=tlinteg.names,
+                        help='integration method (default: from setup)')
+    parser.add_argument('--tol', type=float,
+                        help='error tolerance per step for adaptive integrators')
+    parser.add_argument('--events', choices=('steps', 'precise'),
+                        help='precise: find events inside each step')
+    parser.add_argument('--classify', action='store_true',
+                        help='stop each run as soon as its outcome is certain')
+    parser.add_argument('--kepler', type=float, metavar='RATIO',
+                        help='jump along Kepler ellipses where the Moon pulls under RATIO of the Earth')
+    parser.add_argument('--out', default='tl-sweep.jsonl',
+                        help='results file, .jsonl or .csv (default tl-sweep.jsonl)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes (default: all cores)')
+    args = parser.parse_args(argv)
+
+    if not 0 < args.setup < len(tlsim.setuplib):
+        parser.error(f'setup must be 1..{len(tlsim.setuplib)-1}')
+    try:
+        ranges = [parserange(text) for text in args.vary]
+    except ValueError as e:
+        parser.error(str(e))
+
+    base = baseparams(args.setup, args.setup_file)
+    setup = setupid(args.setup, base, args.setup_file)
+    if args.integrator:
+        base['integrator'] = args.integrator
+    if args.tol:
+        base['tol'] = args.tol
+    if args.events:
+        base['events'] = args.events
+    if args.classify:
+        base['classify'] = True
+    if args.kepler is not None:
+        base['kepler'] = args.kepler
+    jobs = list(makejobs(base, ranges, args.maxsteps, setup))
+    done = finishedkeys(args.out)
+    todo = [job for job in jobs if job[0] not in done]
+    print(f"{args.setup}: {base['Description']}   {len(jobs)} runs, "
+          f"{len(jobs) - len(todo)} already in {args.out}")
+
+    results = Results(args.out)
+    start = time.time()
+    try:
+        with Pool(args.workers) as pool:
+            for count, row in enumerate(pool.imap_unordered(runone, todo), 1):
+                results.write(row)
+                print(f"{count}/{len(todo)} {row['key']}  {row['status']}  "
+                      f"{row['steps']} steps  {row['orbits']} orbits")
+    finally:
+        results.close()
+    print(f"Finished {len(todo)} runs in {int(time.time() - start)} seconds")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#
+# tltelemetry.py -- runs as a stream of JSON records, one a line.
+#
+# tl-log.txt (now only with TerraLunar.py --text-log) is meant for reading:
+# free text stamps and separators around json snapshots, all appended to
+# one file for ever.  Telemetry, the default log, is meant for programs:
+# every line is a json object with the run's id, a sequence number, the
+# wall clock time and a kind, one of
+#
+#   start       setup number, description and the grabsnap() snapshot
+#   orbit       a crossing of the +x axis, with the snapshot as in tl-log.txt
+#   event       perigee, perilune etc. with precise events (Event.asdict())
+#   checkpoint  a checkpoint saved (tlcheckpoint.py)
+#   perf        steps, steps/sec and sim time, every so many seconds
+#   end         outcome, reason, step stats and the final snapshot
+#
+# so a month of runs can be read with json.loads() a line at a time, or
+# picked out by run id with grep.
+#
+# Lines are buffered and written at most flushevery seconds apart (and
+# whenever the buffer gets big), checked whenever a record comes in and at
+# each check.  Past maxbytes the file is rotated: name.jsonl becomes
+# name.jsonl.1, .1 becomes .2 and so on, keeping keep of them, gzipped if
+# compress is set.  The file being written is always plain text.
+
+import gzip
+import json
+import os
+import shutil
+import time
+import uuid
+
+
+class Writer:
+
+    def __init__(self, path, flushevery=1.0, maxbytes=64 << 20, keep=5, compress=False,
+                 buffered=1 << 16):
+        self.path = path
+        self.flushevery = flushevery
+        self.maxbytes = maxbytes
+        self.keep = keep
+        self.compress = compress
+        self.buffered = buffered     # bytes held before flushing anyway
+        self.lines = []
+        self.pending = 0
+        self.lastflush = time.monotonic()
+        self.file = open(path, 'a', encoding='utf-8')
+        self.size = self.file.tell()
+
+    def write(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        self.lines.append(line)
+        self.pending += len(line)
+        self.tick()
+
+    def tick(self):   # flush if due
+        if self.pending >= self.buffered or time.monotonic() - self.lastflush >= self.flushevery:
+            self.flush()
+
+    def flush(self):
+        self.lastflush = time.monotonic()
+        if not self.lines:
+            return
+        if self.size > 0 and self.size + self.pending > self.maxbytes:
+            self.rotate()
+        text = ''.join(self.lines)
+        self.lines = []
+        self.pending = 0
+        self.file.write(text)
+        self.file.flush()
+        self.size += len(text.encode('utf-8'))
+
+    def rotate(self):
+        self.file.close()
+        suffix = '.gz' if self.compress else ''
+        name = self.path + '.%d' + suffix
+        for k in range(self.keep - 1, 0, -1):   # .1 -> .2 ..., the oldest goes
+            if os.path.exists(name % k):
+                os.replace(name % k, name % (k + 1))
+        if self.keep > 0:
+            if self.compress:
+                with open(self.path, 'rb') as f, gzip.open(name % 1, 'wb') as g:
+                    shutil.copyfileobj(f, g)
+            else:
+                os.replace(self.path, name % 1)
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.size = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class Telemetry:
+    # Observer which writes a run's records to a Writer, see the top of
+    # this file.  Give it the Checkpointer, if any, to record its saves.
+
+    def __init__(self, writer, sim, checkpoints=None, perfevery=60.0, runid=None):
+        self.writer = writer
+        self.runid = runid or uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.checkpoints = checkpoints
+        self.saves = checkpoints.saves if checkpoints is not None else 0
+        self.perfevery = perfevery
+        self.starttime = time.time()
+        self.startsteps = sim.steps
+        self.perftime = self.starttime
+        self.perfsteps = sim.steps
+        self.emit('start', setup=sim.setupnum, description=sim.inz.description,
+                  steps=sim.steps, snapshot=sim.grabsnap())
+
+    def emit(self, kind, **fields):
+        self.seq += 1
+        record = {'run': self.runid, 'seq': self.seq, 'time': round(time.time(), 3),
+                  'kind': kind}
+        record.update(fields)
+        self.writer.write(record)
+
+    def on_orbit(self, sim):
+        self.emit('orbit', orbits=sim.orbits, steps=sim.steps, simtime=sim.simtime,
+                  snapshot=sim.grabsnap())
+
+    def on_event(self, sim):
+        self.emit('event', steps=sim.steps, **sim.lastevent.asdict())
+
+    def on_check(self, sim):
+        self.saved(sim)
+        now = time.time()
+        if now - self.perftime >= self.perfevery:
+            sps = (sim.steps - self.perfsteps) / (now - self.perftime)
+            self.emit('perf', steps=sim.steps, sps=int(sps), simtime=sim.simtime,
+                      orbits=sim.orbits)
+            self.perftime = now
+            self.perfsteps = sim.steps
+        self.writer.tick()
+
+    def saved(self, sim):
+        # a record for the checkpoints saved since last time; they are saved
+        # between steps, after this has looked, so the steps are the saver's
+        checkpoints = self.checkpoints
+        if checkpoints is not None and checkpoints.saves != self.saves:
+            self.saves = checkpoints.saves
+            self.emit('checkpoint', path=checkpoints.path, steps=checkpoints.laststeps,
+                      saves=checkpoints.saves)
+
+    def close(self, sim, notes=()):
+        # the end record, then flush and close; returns the final snapshot
+        # as LogObserver.close() does
+        self.saved(sim)
+        snapshot = sim.grabsnap()
+        snapshot["Description"] = f"Final snapshot; {sim.shipstatus}"
+        self.emit('end', outcome=sim.outcome, reason=sim.reason, status=sim.shipstatus,
+                  steps=sim.steps, orbits=sim.orbits, simtime=sim.simtime,
+                  seconds=round(time.time() - self.starttime, 3),
+                  stats=sim.stepstats(time.time() - self.starttime, self.startsteps),
+                  notes=list(notes), snapshot=snapshot)
+        self.writer.close()
+        return snapshot
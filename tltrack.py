@@ -0,0 +1,113 @@
+#
+# tltrack.py -- keep the ship's whole path, at several levels of detail.
+#
+# A Track is an observer that stores the ship's position every time it has
+# moved spacing meters, so the path can be drawn again later at any zoom.
+# Each level above that keeps a point only every 4 times as far, so a view
+# of the whole path reads a coarse level and a close-up a fine one; either
+# way a redraw touches about as many points as there are pixels to fill.
+# Points are kept in blocks of consecutive points with a bounding box, and
+# a close-up only looks inside the blocks that cross the view.
+#
+# Memory: past limit points in the finest level it is dropped and the next
+# one up becomes the finest, so a run of millions of LEO orbits ends up
+# with a coarser path rather than filling memory.
+
+from array import array
+
+block = 256     # points per bounding box
+
+
+class Level:
+
+    def __init__(self, spacing):
+        self.spacing = spacing
+        self.xs = array('d')
+        self.ys = array('d')
+        self.orbits = array('i')
+        self.boxes = []     # [xmin, ymin, xmax, ymax] of each block
+        self.lastx = None
+        self.lasty = None
+
+    def add(self, x, y, orbit):
+        n = len(self.xs)
+        if n % block == 0:
+            self.boxes.append([x, y, x, y])
+        else:
+            box = self.boxes[-1]
+            if x < box[0]: box[0] = x
+            if y < box[1]: box[1] = y
+            if x > box[2]: box[2] = x
+            if y > box[3]: box[3] = y
+        self.xs.append(x)
+        self.ys.append(y)
+        self.orbits.append(orbit)
+        self.lastx = x
+        self.lasty = y
+
+    def far(self, x, y):   # far enough from the last point to keep
+        return self.lastx is None or abs(x - self.lastx) + abs(y - self.lasty) > self.spacing
+
+
+class Track:
+
+    def __init__(self, sim, spacing, levels=10, limit=4000000):
+        self.levels = [Level(spacing * 4**k) for k in range(levels)]
+        self.limit = limit
+        self.lastx = sim.shipx
+        self.lasty = sim.shipy
+        self.spacing = spacing
+        self.add(sim.shipx, sim.shipy, sim.orbits)
+
+    def on_step(self, sim):
+        x = sim.shipx
+        y = sim.shipy
+        if abs(x - self.lastx) + abs(y - self.lasty) > self.spacing:
+            self.add(x, y, sim.orbits)
+
+    def on_end(self, sim):
+        self.add(sim.shipx, sim.shipy, sim.orbits)
+
+    def add(self, x, y, orbit):
+        self.lastx = x
+        self.lasty = y
+        levels = self.levels
+        for level in levels:
+            if level.far(x, y):
+                level.add(x, y, orbit)
+        if len(levels[0].xs) > self.limit and len(levels) > 1:
+            del levels[0]
+            self.spacing = levels[0].spacing
+
+    def points(self, xlo, ylo, xhi, yhi, spacing):
+        # (xs, ys, orbits) inside the box, from the coarsest level no coarser
+        # than spacing.  Safe to call while the physics thread adds points.
+        levels = self.levels
+        level = levels[0]
+        for candidate in levels:
+            if candidate.spacing <= spacing:
+                level = candidate
+        n = len(level.orbits)   # ys and xs are at least this long
+        boxes = level.boxes
+        xs = []
+        ys = []
+        orbits = []
+        for b in range(min(len(boxes), (n + block - 1) // block)):
+            box = boxes[b]
+            if box[2] < xlo or box[0] > xhi or box[3] < ylo or box[1] > yhi:
+                continue
+            start = b * block
+            stop = min(n, start + block)
+            if xlo <= box[0] and box[2] <= xhi and ylo <= box[1] and box[3] <= yhi:
+                xs.extend(level.xs[start:stop])
+                ys.extend(level.ys[start:stop])
+                orbits.extend(level.orbits[start:stop])
+                continue
+            for i in range(start, stop):
+                x = level.xs[i]
+                y = level.ys[i]
+                if xlo <= x <= xhi and ylo <= y <= yhi:
+                    xs.append(x)
+                    ys.append(y)
+                    orbits.append(level.orbits[i])
+        return xs, ys, orbits
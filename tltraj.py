@@ -0,0 +1,308 @@
+#!/usr/bin/python3
+#
+# tltraj.py -- record the ship's trajectory to a binary file.
+#
+# Apart from a snapshot in tl-log.txt each orbit, a run leaves no record of
+# where the ship went.  A Recorder writes (t, x, y, vx, vy, moonangle) as
+# fixed 48-byte records of little-endian doubles after a 64-byte header,
+# into a file mapped into memory and grown by doubling, so writing one is a
+# struct.pack_into and nothing else.  The header's record count is updated
+# after each record, so the file can be read while it is being written.
+#
+# Which steps get recorded is up to a policy:
+#
+#   Every(n)        every n steps
+#   Moved(spacing)  when the ship has moved spacing meters (x plus y, as the
+#                   View's apixel test) since the last record
+#   Error(tol)      so that a straight line between two records is never
+#                   more than tol meters off the path, at the points looked
+#                   at: the path is sampled several times over the stretch
+#                   its curvature under Earth and Moon gravity says a line
+#                   would hold for, and when a line from the last record to
+#                   the newest sample passes more than tol from any sample
+#                   since, the sample before the newest is recorded
+#
+# Recording costs next to nothing if the stepping is done in chunks that
+# end where the next record (or Error sample) is due: run() below does
+# that, as do View.animate() and View.record() when the view has a
+# recorder.  Attached as an observer (lockstep with a View) it looks at
+# every step instead.
+#
+#     rec = tltraj.Recorder('traj.bin', sim, tltraj.Moved(1e6))
+#     tltraj.run(sim, rec)
+#     rec.close()
+#     a = tltraj.load('traj.bin')     # numpy, zero copy: a['x'], a['t'] ...
+#
+#     python3 tltraj.py 2 traj.bin --decimate every:100
+#     python3 tltraj.py --info traj.bin
+
+import argparse
+import math
+import mmap
+import struct
+import sys
+
+import tlsim
+from tlsim import earthx, earthy, earthgrav, moongrav
+
+magic = b'TLTRAJ1\n'
+fields = ('t', 'x', 'y', 'vx', 'vy', 'moonangle')
+record = struct.Struct('<6d')
+header = struct.Struct('<8sqqqd24x')   # magic, record size, count, setup, dt
+headersize = header.size               # 64
+countfield = struct.Struct('<q')       # the count alone, at countat
+countat = 16
+
+
+class Every:
+
+    def __init__(self, n):
+        self.n = max(1, int(n))
+
+    def plan(self, sim):   # steps from a record to the next
+        return self.n
+
+    def due(self, rec, sim):
+        return sim.steps - rec.laststeps >= self.n
+
+
+class Moved:
+
+    def __init__(self, spacing):
+        self.spacing = spacing
+
+    def plan(self, sim):
+        speed = (abs(sim.shipvx) + abs(sim.shipvy)) * sim.dtime
+        return max(1, math.ceil(self.spacing / max(speed, 1e-9)))
+
+    def due(self, rec, sim):
+        return abs(sim.shipx - rec.lastx) + abs(sim.shipy - rec.lasty) > self.spacing
+
+
+class Error:
+
+    pieces = 8   # samples over the stretch a line should hold for
+    most = 64    # samples held at most, on long straight stretches
+
+    def __init__(self, tol):
+        self.tol = tol
+
+    def plan(self, sim):   # steps from a sample to the next
+        # an arc of length s and curvature k is k*s*s/8 off its chord
+        x = sim.shipx
+        y = sim.shipy
+        vx = sim.shipvx
+        vy = sim.shipvy
+        dx = x - earthx
+        dy = y - earthy
+        r2 = dx*dx + dy*dy
+        r3 = r2 * math.sqrt(r2)
+        mx = x - sim.moonx
+        my = y - sim.moony
+        m2 = mx*mx + my*my
+        m3 = m2 * math.sqrt(m2)
+        ax = earthgrav*dx/r3 + moongrav*mx/m3
+        ay = earthgrav*dy/r3 + moongrav*my/m3
+        speed = math.hypot(vx, vy)
+        bend = abs(vx*ay - vy*ax) / max(speed**3, 1e-30)   # curvature, 1/meters
+        arc = math.sqrt(8.0 * self.tol / max(bend, 1e-30))
+        return max(1, int(arc / max(speed * sim.dtime, 1e-9) / self.pieces))
+
+    def off(self, a, b, held):
+        # whether a line from record a to b passes more than tol from any of
+        # the held samples, less what the path between two samples can stray
+        # from them (a pieces'th of the arc: under tol/pieces**2); states as
+        # Recorder.state()
+        tol = self.tol * (1.0 - 2.0 / self.pieces**2)
+        dx = b[1] - a[1]
+        dy = b[2] - a[2]
+        length = math.hypot(dx, dy)
+        for p in held:
+            px = p[1] - a[1]
+            py = p[2] - a[2]
+            if length > 0:
+                gap = abs(dx*py - dy*px) / length
+            else:
+                gap = math.hypot(px, py)
+            if gap > tol:
+                return True
+        return False
+
+
+def parsepolicy(text, pixel=None):
+    # 'every:N', 'moved:METERS', 'error:METERS', or 'pixels:P' with the
+    # size of a pixel in meters given
+    kind, _, value = text.partition(':')
+    try:
+        value = float(value)
+    except ValueError:
+        raise ValueError(f'bad decimation {text!r}') from None
+    if kind == 'every':
+        return Every(value)
+    if kind == 'moved':
+        return Moved(value)
+    if kind == 'pixels' and pixel is not None:
+        return Moved(value * pixel)
+    if kind == 'error':
+        return Error(value)
+    raise ValueError(f'bad decimation {text!r}: every:N, moved:METERS, error:METERS'
+                     + (', pixels:P' if pixel is not None else ''))
+
+
+class Recorder:
+
+    def __init__(self, path, sim, policy, capacity=1 << 16):
+        self.path = path
+        self.policy = policy
+        self.capacity = capacity
+        self.count = 0
+        self.held = []     # Error: states sampled since the last record
+        self.file = open(path, 'w+b')
+        self.file.truncate(headersize + capacity * record.size)
+        self.map = mmap.mmap(self.file.fileno(), headersize + capacity * record.size)
+        header.pack_into(self.map, 0, magic, record.size, 0, sim.setupnum, sim.dtime)
+        self.laststeps = None
+        self.write(sim)
+
+    def state(self, sim):   # a record's fields, then the step count
+        return (sim.simtime, sim.shipx, sim.shipy, sim.shipvx, sim.shipvy,
+                sim.moonangle, sim.steps)
+
+    def write(self, sim):
+        if sim.steps == self.laststeps:   # have it already
+            return
+        state = self.state(sim)
+        if self.held and self.policy.off(self.last, state, self.held):
+            self.put(self.held[-1])
+        self.put(state)
+        self.planned = self.policy.plan(sim)
+
+    def put(self, state):
+        if self.count == self.capacity:
+            self.grow()
+        record.pack_into(self.map, headersize + self.count * record.size, *state[:6])
+        self.count += 1
+        countfield.pack_into(self.map, countat, self.count)
+        self.last = state
+        self.laststeps = self.sampled = state[6]
+        self.lastx = state[1]
+        self.lasty = state[2]
+        self.held = []
+
+    def sample(self, sim):
+        # Error: hold a sample, or record the one before if a line to this
+        # one would be too far off the path
+        state = self.state(sim)
+        held = self.held
+        if held and (len(held) >= self.policy.most or self.policy.off(self.last, state, held)):
+            self.put(held[-1])
+        self.held.append(state)
+        self.sampled = sim.steps
+        self.planned = self.policy.plan(sim)
+
+    def grow(self):
+        self.capacity *= 2
+        size = headersize + self.capacity * record.size
+        self.map.close()
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+
+    # stepped in chunks: step(chunk()), then take()
+
+    def chunk(self, sim, most):   # steps to the next record or sample, at most most
+        return max(1, min(most, self.planned - (sim.steps - self.sampled)))
+
+    def take(self, sim):
+        if sim.done:
+            self.write(sim)
+        elif isinstance(self.policy, Error):
+            if sim.steps - self.sampled >= self.planned:
+                self.sample(sim)
+        elif self.policy.due(self, sim):
+            self.write(sim)
+        elif sim.steps - self.laststeps >= self.planned:   # not there yet
+            self.planned = sim.steps - self.laststeps + self.policy.plan(sim)
+
+    # or as an observer
+
+    def on_step(self, sim):
+        if isinstance(self.policy, Error):
+            if sim.steps - self.sampled >= self.planned:
+                self.sample(sim)
+        elif self.policy.due(self, sim):
+            self.write(sim)
+
+    def on_end(self, sim):
+        self.write(sim)
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(headersize + self.count * record.size)
+        self.file.close()
+
+
+def run(sim, rec, maxsteps=None):
+    # step sim to the end (or maxsteps) in chunks that end at each record
+    taken = 0
+    while not sim.done and (maxsteps is None or taken < maxsteps):
+        n = rec.chunk(sim, 100000 if maxsteps is None else maxsteps - taken)
+        got = sim.step(n)
+        taken += got
+        rec.take(sim)
+        if got < n and not sim.done:   # stopped
+            break
+    rec.write(sim)
+    return taken
+
+
+def info(path):   # the header: (record size, count, setup, dt)
+    with open(path, 'rb') as f:
+        got = header.unpack(f.read(headersize))
+    if got[0] != magic:
+        raise ValueError(f'{path} is not a TerraLunar trajectory')
+    return got[1:]
+
+
+def load(path):
+    # the records as a numpy structured array mapped onto the file, no copy
+    import numpy as np
+    size, count, setup, dt = info(path)
+    dtype = np.dtype([(name, '<f8') for name in fields])
+    if size != dtype.itemsize:
+        raise ValueError(f'{path}: records of {size} bytes, not {dtype.itemsize}')
+    if count == 0:
+        return np.zeros(0, dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=headersize, shape=(count,))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record a TerraLunar trajectory headless.')
+    parser.add_argument('setup', type=int, nargs='?', help='setuplib number')
+    parser.add_argument('out', nargs='?', help='trajectory file to write')
+    parser.add_argument('--decimate', default='every:1',
+                        help='every:N steps, moved:METERS or error:METERS (default every:1)')
+    parser.add_argument('--maxsteps', type=int)
+    parser.add_argument('--info', metavar='FILE', help='describe a trajectory file')
+    args = parser.parse_args(argv)
+
+    if args.info:
+        size, count, setup, dt = info(args.info)
+        print(f'{args.info}: setup {setup}, dt {dt}, {count:,} records of {size} bytes')
+        return 0
+    if args.setup is None or args.out is None:
+        parser.error('give a setup and a file to write, or --info FILE')
+    try:
+        policy = parsepolicy(args.decimate)
+    except ValueError as e:
+        parser.error(str(e))
+    sim = tlsim.Simulation(tlsim.grabsetup(args.setup), args.setup)
+    rec = Recorder(args.out, sim, policy)
+    run(sim, rec, args.maxsteps)
+    rec.close()
+    print(f'{sim.shipstatus}  {sim.steps:,} steps, {rec.count:,} records to {args.out}')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,767 @@
+#
+# tlview.py -- GraphWin display for a TerraLunar simulation.
+#
+# A View draws the Earth, Moon, ship and breadcrumb path, shows status
+# text, and stops the simulation when the window is clicked.  It can run
+# three ways:
+#
+#   sim.attach(view); sim.run_until('end')
+#       lockstep, the original way: the view is an observer and looks at
+#       the ship after every step, pumping Tk every time.
+#
+#   view.animate(sim, fps=30)
+#       the physics runs flat out in a worker thread while this thread
+#       redraws the latest state fps times a second and handles mouse and
+#       keys once per frame.  Orbit, check and end notices are passed over
+#       in a queue, and the ship's position after every chunk of steps in a
+#       deque, so crumbs still follow the path between frames.
+#
+#   view.record(sim, every, 'frame%05d.png')
+#       no window at all: with the offscreen backend the view draws into
+#       memory and saves a frame every so many simulated seconds, as fast
+#       as the physics goes (see offscreen.py).
+#
+# With track=True the view also keeps the ship's whole path (see
+# tltrack.py), so the mouse wheel can zoom in and out about the pointer,
+# dragging with the right button pans, and the Home key goes back to the
+# starting view, during the run or after it while waiting for the click.
+# The Track looks at every step, which costs a good part of the speed, so
+# TerraLunar.py only asks for it with --zoom.
+#
+# With a Pacer (pacer=Pacer(fps, share)) the view times its own drawing
+# and retunes itself every half second to keep about fps frames a second
+# and drawing under share of the time, whatever the machine and window
+# size: how many steps lockstep skips between looks at the ship, the
+# frame period in animate, apixel, the crumb interval and how often the
+# status text is redone.
+#
+# With inset=reach the view also shows a close-up of the Moon in a corner,
+# reach meters from the Moon to the inset's edge, with the Moon held still
+# in the middle and the ship's path drawn relative to it.  The inset is
+# one more raster fed from the same looks at the ship, flushed along with
+# the main one, so it adds no canvas items and no Tk round trips of its
+# own.
+#
+# With heat=pixels, crumbs give way to a density picture: every step is
+# counted into a grid of bins pixels wide over the starting view (see
+# tlheat.py), and the bins the ship passed through are repainted where
+# crumbs would have been dropped.
+#
+# With recorder=tltraj.Recorder(...), animate() and record() end their
+# chunks of steps where the recorder's next record (or sample) is due and
+# hand it the state after each, so the trajectory file costs no per-step
+# calls.
+
+from collections import deque
+import math
+from random import randint
+import queue
+import threading
+import time
+
+import tlheat
+import tltrack
+from tlsim import moondistance, earthrad, earthx, earthy, moonrad
+
+TerraLunar_title = "Noobie TerraLunar Python program"
+
+backends = ('tk', 'offscreen', 'null')
+
+
+def backend(name):
+    # the graphics module for a backend name, imported only when chosen:
+    # tk is graphics.py, offscreen draws into memory (offscreen.py), null
+    # draws nothing at all (nullgraphics.py)
+    if name == 'offscreen':
+        import offscreen as gr
+    elif name == 'null':
+        import nullgraphics as gr
+    else:
+        import graphics as gr    # graphics.py is a wrapper for the tkinter module
+    return gr
+
+
+class View:
+
+    def __init__(self, sim, winwidth, winheight, version='', gr=None, track=False, pacer=None,
+                 inset=None, heat=0, recorder=None):
+        # gr is the graphics module to draw with, see backend()
+        if gr is None:
+            gr = backend('tk')
+        self.gr = gr
+        inz = sim.inz
+        self.sim = sim
+
+        # Create the graphics display window...
+
+        win = gr.GraphWin(TerraLunar_title, winwidth, winheight, autoflush=False)
+        win.setBackground('black')
+        self.win = win
+
+        # dots that stay put (stars, crumbs, start marks) go in one raster image
+        # under everything else, not one canvas item each
+
+        self.trail = gr.Raster(win, 'black')
+        self.trail.draw(win)
+
+        # plot some random stars, 50 on a 1930x1040 screen and as dense on
+        # bigger ones, all into the raster in one go...
+
+        stars = max(50, 50 * winwidth * winheight // (1930 * 1040))
+        self.starxs = [randint(0, winwidth-1) for i in range(stars)]
+        self.starys = [randint(0, winheight-1) for i in range(stars)]
+        self.trail.plot_many(self.starxs, self.starys, 'white', raw=True)
+
+        # Set up window with worldly plot coordinates lower left and upper right...
+
+        yll = -moondistance * inz.winscale
+        yur = moondistance * inz.winscale
+        xll = yll * winwidth/winheight
+        xur = yur * winwidth/winheight
+        win.setCoords(xll, yll, xur, yur)
+        self.home = (xll, yll, xur, yur)
+        self.bounds = self.home
+
+        earth = gr.Circle(gr.Point(earthx, earthy), inz.radscale*earthrad)
+        earth.setWidth(2)
+        earth.setFill('blue')
+        self.trendcolor = 'blue'  # Earth outline color will provide hints
+        earth.setOutline(self.trendcolor)
+        earth.draw(win)
+        self.earth = earth
+
+        winmin = min(winwidth, winheight)
+        viewscale = winmin / (3.0 * moondistance * inz.winscale)  # pixels/meter
+        self.apixel = 2.5 / viewscale   # movement size to provoke a screen update
+        self.homeapixel = self.apixel
+        self.scale = 1.0     # zoomed view width / starting width
+        self.crumbinterval = 5
+        self.crumbsteps = self.crumbinterval
+
+        moonx = sim.moonx
+        moony = sim.moony
+        self.oldmx = moonx  # to keep track of previous displayed moon location
+        self.oldmy = moony
+
+        moon = gr.Circle(gr.Point(moonx, moony), inz.radscale*moonrad)
+        moon.setWidth(1)
+        moon.setFill('grey')
+        moon.setOutline('white')
+        moon.draw(win)
+        self.moon = moon
+        self.trail.plot(moonx, moony, color='red')  # leave red dot where moon started
+        self.startmoon = (moonx, moony)
+
+        # Display some textual information...
+
+        textversion = gr.Text(gr.Point(xll*0.90, yur*0.95), "TerraLunar ver " + version)
+        textversion.setTextColor('cyan')
+        textversion.draw(win)
+
+        textul = gr.Text(gr.Point(xll*0.85, yur*0.90), inz.description)
+        textul.setTextColor('cyan')
+        textul.draw(win)
+
+        textur = gr.Text(gr.Point(xur*0.90, yur*0.95), text='Click to exit')
+        textur.setTextColor('pink')
+        textur.draw(win)
+
+        self.textlr = gr.Text(gr.Point(xur*0.75, yll*0.95), text='########## steps @ ######/sec')
+        self.textlr.setTextColor('yellow')
+        self.textlr.draw(win)
+
+        self.textll = gr.Text(gr.Point(xll*0.75, yll*0.95), text='Status:  ' + sim.shipstatus)
+        self.textll.setTextColor('white')
+        self.textll.draw(win)
+
+        # where the text sits, as fractions of the window, to keep it there
+        # when zooming
+        self.texts = [textversion, textul, textur, self.textlr, self.textll]
+        self.textspots = [((t.getAnchor().getX() - xll) / (xur - xll),
+                           (t.getAnchor().getY() - yll) / (yur - yll)) for t in self.texts]
+
+        shipx = sim.shipx
+        shipy = sim.shipy
+        self.oldx = shipx  # to keep track of previous displayed ship location
+        self.oldy = shipy
+        self.lastx = shipx  # last point looked at for crumbs, animate() only
+        self.lasty = shipy
+        self.lastmx = moonx
+        self.lastmy = moony
+
+        self.pathcolors = ['red', 'tan', 'green', 'cyan', 'magenta', 'yellow']
+        self.colorsteps = 0
+        self.firstorbit = sim.orbits   # track orbit counts -> path colors
+
+        self.trail.plot(shipx, shipy, color=self.pathcolors[0])
+        self.trail.flush()
+        self.startship = (shipx, shipy)
+
+        # draw ship as a small red square
+        self.homehalfship = 1.5 / viewscale
+        self.ship = self.makeship(shipx, shipy, self.homehalfship)
+
+        self.pacer = pacer
+        if pacer is not None:
+            pacer.lastx = shipx
+            pacer.lasty = shipy
+        self.track = None
+        if track:
+            self.track = sim.attach(tltrack.Track(sim, self.apixel / 8))
+        self.heat = None
+        if heat:
+            self.heat = sim.attach(tlheat.Heatmap(xll, yll, xur, yur,
+                                                  winwidth // heat, winheight // heat))
+
+        self.recorder = recorder   # a tltraj.Recorder, fed between chunks of steps
+        self.inset = None
+        if inset:
+            self.inset = Inset(self, inset)
+            self.inset.look(shipx, shipy, moonx, moony, self.pathcolors[0])
+            self.inset.flush()
+
+        self.plots = 0
+        self.sps = 0
+        self.maxsps = 0
+        self.oldsteps = sim.steps
+        self.oldtime = time.time()
+        self.frames = 0
+        gr.update()
+
+    def makeship(self, shipx, shipy, halfship):
+        gr = self.gr
+        ship = gr.Rectangle(gr.Point(shipx-halfship, shipy-halfship),
+                            gr.Point(shipx+halfship, shipy+halfship))
+        ship.setWidth(1)
+        ship.setFill('red')
+        ship.setOutline('red')
+        ship.draw(self.win)
+        return ship
+
+    def on_step(self, sim):
+        pacer = self.pacer
+        if pacer is None:
+            self.look(sim)
+            return
+        pacer.countdown -= 1
+        if pacer.countdown > 0:
+            return
+        pacer.countdown = pacer.stride
+        start = time.perf_counter()
+        self.look(sim)
+        now = time.perf_counter()
+        pacer.spent(now - start)
+        pacer.travel(abs(sim.shipx - pacer.lastx) + abs(sim.shipy - pacer.lasty), 1)
+        pacer.lastx = sim.shipx
+        pacer.lasty = sim.shipy
+        if pacer.due(now):
+            pacer.retune(self, now)
+
+    def look(self, sim):
+        if self.win.checkMouse() is not None:     # break out on mouse click
+            sim.stop()
+
+        ''' Graphic update is done less often than numerical integration. '''
+
+        shipx = sim.shipx
+        shipy = sim.shipy
+        moonx = sim.moonx
+        moony = sim.moony
+        inset = self.inset
+        if inset is not None:
+            inset.look(shipx, shipy, moonx, moony, self.pathcolors[self.colorsteps % len(self.pathcolors)])
+        if abs(shipx - self.oldx) + abs(shipy - self.oldy) + abs(moonx - self.oldmx) + abs(moony - self.oldmy) > self.apixel:
+            # only update display when ship or moon moves at least a pixel
+            if inset is not None:
+                inset.flush()
+            self.moon.move(moonx - self.oldmx, moony - self.oldmy)
+            self.ship.move(shipx - self.oldx, shipy - self.oldy)
+            self.crumbsteps -= 1   # occasionally drop a crumb on the path
+            if self.crumbsteps <= 0:
+                self.crumbsteps = self.crumbinterval
+                if self.heat is not None:
+                    self.paintheat(self.heat.changed())
+                else:
+                    pathcolor = self.colorsteps % len(self.pathcolors)
+                    self.trail.plot(shipx, shipy, color=self.pathcolors[pathcolor])
+                self.trail.flush()
+            self.oldx = shipx
+            self.oldy = shipy
+            self.oldmx = moonx
+            self.oldmy = moony
+            self.plots += 1
+            if self.plots % 16 == 0:
+                self.navigate()
+
+    def animate(self, sim, fps=30, chunk=1000):
+        # Run sim to the end or until the window is clicked, physics in a
+        # worker thread taking steps about an apixel of travel at a time (at
+        # most chunk), drawing fps frames a second here.  Tk is only touched
+        # from this thread.
+        notices = queue.Queue()
+        path = deque()
+        relay = sim.attach(_Relay(notices))
+        quitting = threading.Event()
+
+        inset = self.inset
+        recorder = self.recorder
+
+        def physics():
+            while not sim.done and not quitting.is_set():
+                n = self.pathchunk(sim, chunk)
+                if inset is not None:
+                    n = inset.chunk(sim, n)
+                if recorder is not None:
+                    n = recorder.chunk(sim, n)
+                sim.step(n)
+                if recorder is not None:
+                    recorder.take(sim)
+                path.append((sim.shipx, sim.shipy, sim.moonx, sim.moony))
+
+        worker = threading.Thread(target=physics, name='tl-physics', daemon=True)
+        worker.start()
+        period = 1.0 / fps
+        pacer = self.pacer
+        try:
+            while worker.is_alive():
+                start = time.perf_counter()
+                if self.win.checkMouse() is not None:   # pumps Tk, once a frame
+                    quitting.set()
+                    sim.stop()
+                self.navigate()
+                self.redraw(sim, path, notices)
+                now = time.perf_counter()
+                if pacer is not None:
+                    pacer.spent(now - start)
+                    if pacer.due(now):
+                        pacer.retune(self, now)
+                    period = pacer.period
+                time.sleep(max(0.0, period - (now - start)))
+        finally:
+            quitting.set()
+            sim.stop()
+            worker.join()
+            sim.detach(relay)
+        self.redraw(sim, path, notices)
+        self.gr.update()
+
+    def record(self, sim, every, out, chunk=1000):
+        # Run sim to the end with no one watching, saving a frame to out
+        # (an offscreen.FrameWriter name) every `every` simulated seconds
+        # and one at the end.  For an offscreen window.
+        import offscreen
+        notices = queue.Queue()
+        path = deque()
+        relay = sim.attach(_Relay(notices))
+        frames = offscreen.FrameWriter(out)
+        due = sim.simtime
+        try:
+            while not sim.done:
+                if sim.simtime >= due:
+                    self.redraw(sim, path, notices)
+                    frames.write(self.win)
+                    due += every
+                n = max(1, min(chunk, math.ceil((due - sim.simtime) / sim.dtime)))
+                n = self.pathchunk(sim, n)
+                if self.inset is not None:
+                    n = self.inset.chunk(sim, n)
+                if self.recorder is not None:
+                    n = self.recorder.chunk(sim, n)
+                if sim.step(n) == 0:
+                    break
+                if self.recorder is not None:
+                    self.recorder.take(sim)
+                path.append((sim.shipx, sim.shipy, sim.moonx, sim.moony))
+        finally:
+            sim.detach(relay)
+            self.redraw(sim, path, notices)
+            frames.write(self.win)
+            frames.close()
+        return frames.count
+
+    def pathchunk(self, sim, most):
+        # steps for ship and Moon to move a bit over an apixel, at most most:
+        # a point on the path for each, so crumbs come as often as in lockstep
+        moonv = sim.moonrate * (abs(sim.moonx - earthx) + abs(sim.moony - earthy))
+        speed = (abs(sim.shipvx) + abs(sim.shipvy) + moonv) * sim.dtime
+        return max(1, min(most, int(self.apixel / max(speed, 1e-9)) + 1))
+
+    def redraw(self, sim, path, notices):
+        # Bring the display up to date: notices first, then crumbs along the
+        # path the ship took since the last frame, then ship and Moon.  All
+        # of it goes to Tk as one batch.
+        with self.win.frame():
+            self._redraw(sim, path, notices)
+
+    def _redraw(self, sim, path, notices):
+        while True:
+            try:
+                notice = notices.get_nowait()
+            except queue.Empty:
+                break
+            getattr(self, notice[0])(sim, *notice[1:])
+        apixel = self.apixel
+        lastx = self.lastx
+        lasty = self.lasty
+        lastmx = self.lastmx
+        lastmy = self.lastmy
+        inset = self.inset
+        crumbs = self.heat is None
+        color = self.pathcolors[self.colorsteps % len(self.pathcolors)]
+        if self.pacer is not None and path:
+            x, y = path[-1][:2]
+            self.pacer.travel(abs(x - lastx) + abs(y - lasty), len(path))
+        while path:
+            x, y, mx, my = path.popleft()
+            if inset is not None:
+                inset.look(x, y, mx, my, color)
+            if abs(x - lastx) + abs(y - lasty) + abs(mx - lastmx) + abs(my - lastmy) > apixel:
+                self.crumbsteps -= 1   # occasionally drop a crumb on the path
+                if self.crumbsteps <= 0 and crumbs:
+                    self.crumbsteps = self.crumbinterval
+                    self.trail.plot(x, y, color=color)
+                lastx = x
+                lasty = y
+                lastmx = mx
+                lastmy = my
+        self.lastx = lastx
+        self.lasty = lasty
+        self.lastmx = lastmx
+        self.lastmy = lastmy
+        if not crumbs:
+            self.paintheat(self.heat.changed())
+        self.trail.flush()
+        if inset is not None:
+            inset.flush()
+
+        shipx = sim.shipx
+        shipy = sim.shipy
+        moonx = sim.moonx
+        moony = sim.moony
+        self.moon.move(moonx - self.oldmx, moony - self.oldmy)
+        self.ship.move(shipx - self.oldx, shipy - self.oldy)
+        self.oldx = shipx
+        self.oldy = shipy
+        self.oldmx = moonx
+        self.oldmy = moony
+        self.plots += 1
+        self.frames += 1
+
+    # zoom and pan
+
+    def navigate(self):
+        # act on mouse wheel, right-button drag and the Home key since last time
+        if self.track is None:
+            return
+        win = self.win
+        wheel = win.checkWheel()
+        if wheel is not None:
+            clicks, where = wheel
+            self.zoom(1.25 ** clicks, where)
+        drag = win.checkDrag()
+        if drag is not None:
+            self.pan(*drag)
+        if win.checkKey() == 'Home':
+            self.setview(*self.home)
+
+    def zoom(self, factor, about):
+        # magnify by factor (shrink if under 1), keeping the point about still
+        xlo, ylo, xhi, yhi = self.bounds
+        x = about.getX()
+        y = about.getY()
+        self.setview(x - (x - xlo)/factor, y - (y - ylo)/factor,
+                     x + (xhi - x)/factor, y + (yhi - y)/factor)
+
+    def pan(self, dx, dy):
+        # the picture follows the mouse, so the view goes the other way
+        xlo, ylo, xhi, yhi = self.bounds
+        self.setview(xlo - dx, ylo - dy, xhi - dx, yhi - dy)
+
+    def setview(self, xlo, ylo, xhi, yhi):
+        # Show xlo..xhi by ylo..yhi.  Earth, Moon and crumbs go to the new
+        # scale; the text and the ship's size stay as they are on screen,
+        # and the path is drawn again from the track.
+        self.bounds = (xlo, ylo, xhi, yhi)
+        self.win.setCoords(xlo, ylo, xhi, yhi)
+        scale = (xhi - xlo) / (self.home[2] - self.home[0])
+        self.scale = scale
+        self.apixel = self.homeapixel * scale
+        if self.pacer is not None:
+            self.pacer.fit(self)
+        for text, (fx, fy) in zip(self.texts, self.textspots):
+            anchor = text.getAnchor()
+            text.move(xlo + fx*(xhi - xlo) - anchor.getX(), ylo + fy*(yhi - ylo) - anchor.getY())
+        self.ship.undraw()
+        self.ship = self.makeship(self.oldx, self.oldy, self.homehalfship * scale)
+        self.retrail()
+
+    def retrail(self):
+        # stars, start marks and the path in view, into a cleared raster
+        trail = self.trail
+        trail.clear()
+        trail.plot_many(self.starxs, self.starys, 'white', raw=True)
+        colors = self.pathcolors
+        if self.heat is not None:
+            self.paintheat(self.heat.everything())
+        else:
+            xlo, ylo, xhi, yhi = self.bounds
+            xs, ys, orbits = self.track.points(xlo, ylo, xhi, yhi, self.apixel * self.crumbinterval)
+            first = self.firstorbit
+            trail.plot_many(xs, ys, [colors[(k - first) % len(colors)] for k in orbits])
+        trail.plot(*self.startmoon, color='red')
+        trail.plot(*self.startship, color=colors[0])
+        trail.flush()
+        self.win.flush()
+
+    def paintheat(self, bins):
+        # fill the screen rectangle of each (ix, iy, color) heat bin
+        heat = self.heat
+        toScreen = self.win.toScreen
+        plotPixel = self.trail.plotPixel
+        width = self.win.getWidth()
+        height = self.win.getHeight()
+        for ix, iy, color in bins:
+            x0, y0, x1, y1 = heat.box(ix, iy)
+            left, top = toScreen(x0, y1)
+            right, bottom = toScreen(x1, y0)
+            for y in range(max(0, top), min(height, max(top + 1, bottom))):
+                for x in range(max(0, left), min(width, max(left + 1, right))):
+                    plotPixel(x, y, color)
+
+    def on_orbit(self, sim):
+        self.colorsteps += 1   # change ship color every orbit around Earth
+
+    def on_check(self, sim, steps=None, when=None):
+        # display periodic status updates; steps and when are sim.steps and
+        # time.time() at the check, if it was a while ago (animate, record)
+        pacer = self.pacer
+        if pacer is not None:
+            start = time.perf_counter()
+            if start < pacer.nextstatus:
+                return
+        self.trendcolor = 'green'
+        if sim.d2e > sim.oldd2e:
+            self.trendcolor = 'red'     # increasing distance to Earth
+        self.earth.setOutline(self.trendcolor)
+        # calculate current sps (steps per second)...
+        if steps is None:
+            steps = sim.steps
+            when = time.time()
+        delta = when - self.oldtime
+        if delta > 0:
+            self.sps = int((steps - self.oldsteps)/delta)
+            self.maxsps = max(self.maxsps, self.sps)
+            self.oldtime = when
+            self.oldsteps = steps
+        self.showstatus(sim)
+        if pacer is not None:
+            pacer.status(time.perf_counter() - start)
+
+    def on_end(self, sim):
+        if sim.outcome == 'earthcrash':
+            self.earth.setFill('red')
+            self.earth.move(0, 0)
+        elif sim.outcome == 'mooncrash':
+            self.moon.setFill('red')
+            self.moon.move(0, 0)
+        elif sim.outcome == 'escape':
+            self.earth.setFill('green')  # show green Earth then quit
+            self.earth.setOutline('green')
+
+    def showstatus(self, sim):
+        steps_string = f"{sim.steps:,.0f} steps  @  {self.sps} /sec"
+        stepper = sim.stepper
+        if stepper is not None and stepper.adaptive:
+            steps_string += (f"  dt={stepper.dtime:.3g}s  {stepper.accepted:,} ok"
+                             f"  {stepper.rejected:,} rejected")
+        self.textlr.setText(steps_string)
+
+        moonunits = sim.d2e / moondistance
+        status_string = f"Ship status:  {sim.shipstatus}  @  {moonunits:.1f} moonunits"
+        self.textll.setText(status_string)
+
+    def close(self):
+        if self.track is None:
+            self.win.getMouse()    # wait for final mouse click
+        else:
+            while self.win.checkMouse() is None:   # zoom around till then
+                self.navigate()
+                time.sleep(0.05)
+        self.win.close()
+
+
+class Inset:
+    # The Moon close-up, see the top of this file: a raster in the right
+    # hand side of the window, reach meters across from the Moon to the
+    # nearer edge.  Pixels are looked after here, ship included, so
+    # nothing in it depends on the main view's coordinates.
+
+    def __init__(self, view, reach):
+        win = view.win
+        width = win.getWidth() // 4
+        height = win.getHeight() // 3
+        left = win.getWidth() - width - 10
+        top = win.getHeight() // 8
+        self.raster = view.gr.Raster(win, 'black', left, top, width, height)
+        self.raster.draw(win)
+        self.width = width
+        self.height = height
+        self.reach = reach
+        self.mpp = reach / (min(width, height) // 2 - 2)   # meters a pixel
+        self.cx = width // 2
+        self.cy = height // 2
+        self.marks = {}     # (x, y) -> color of everything but the ship
+        self.ship = []      # pixels the ship covers now
+        self.last = None
+
+        # grey Moon to scale, white rim, grey frame
+        r = moonrad / self.mpp
+        for y in range(-int(r) - 1, int(r) + 2):
+            for x in range(-int(r) - 1, int(r) + 2):
+                d = math.hypot(x, y)
+                if d <= r:
+                    self.mark(self.cx + x, self.cy + y, 'white' if d > r - 1 else 'grey')
+        for x in range(width):
+            self.mark(x, 0, 'grey')
+            self.mark(x, height - 1, 'grey')
+        for y in range(height):
+            self.mark(0, y, 'grey')
+            self.mark(width - 1, y, 'grey')
+        self.moonr2 = r * r
+
+        # a title over it, kept in place by View.setview like the other text
+        x, y = win.toWorld(left + width // 2, top - 12)
+        label = view.gr.Text(view.gr.Point(x, y), f"Moon, {reach/1000:,.0f} km to the edge")
+        label.setTextColor('grey')
+        label.draw(win)
+        xll, yll, xur, yur = view.home
+        view.texts.append(label)
+        view.textspots.append(((x - xll) / (xur - xll), (y - yll) / (yur - yll)))
+
+    def mark(self, x, y, color):
+        self.marks[(x, y)] = color
+        self.raster.plotPixel(x, y, color)
+
+    def look(self, shipx, shipy, moonx, moony, color):
+        # the ship is at shipx, shipy and the Moon at moonx, moony: leave a
+        # crumb and move the ship if it changed pixels
+        x = self.cx + int(round((shipx - moonx) / self.mpp))
+        y = self.cy - int(round((shipy - moony) / self.mpp))
+        if (x, y) == self.last:
+            return
+        self.last = (x, y)
+        raster = self.raster
+        marks = self.marks
+        for p in self.ship:
+            raster.plotPixel(p[0], p[1], marks.get(p, 'black'))
+        self.ship = []
+        if not (1 <= x < self.width - 1 and 1 <= y < self.height - 1):
+            return
+        dx = x - self.cx
+        dy = y - self.cy
+        if dx*dx + dy*dy > self.moonr2:
+            self.mark(x, y, color)
+        for p in ((x, y), (x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+            if 1 <= p[0] < self.width - 1 and 1 <= p[1] < self.height - 1:
+                self.ship.append(p)
+                raster.plotPixel(p[0], p[1], 'red')
+
+    def chunk(self, sim, most):
+        # steps to take at a time so the ship moves about a pixel in here
+        # near the Moon, most elsewhere
+        if sim.d2m > 2.0 * self.reach:
+            return most
+        speed = math.hypot(sim.shipvx, sim.shipvy) * sim.dtime
+        return max(1, min(most, int(self.mpp / max(speed, 1e-9))))
+
+    def flush(self):
+        self.raster.flush()
+
+
+class Pacer:
+    # Times a View's drawing and retunes it, see the top of this file.
+
+    def __init__(self, fps=30, share=0.25, every=0.5):
+        self.fps = fps
+        self.share = share      # of the time, for drawing
+        self.every = every      # seconds between retunes
+        self.stride = 1         # lockstep: steps from one look to the next
+        self.countdown = 1
+        self.period = 1.0 / fps  # animate: seconds from one frame to the next
+        self.coarse = 1.0       # apixel over its starting size, at this zoom
+        self.statuscost = 0.0
+        self.nextstatus = 0.0
+        self.lastx = 0.0
+        self.lasty = 0.0
+        self.start = time.perf_counter()
+        self.busy = 0.0
+        self.looks = 0
+        self.moved = 0.0        # ship travel between path points looked at
+        self.points = 0
+
+    def spent(self, seconds):   # one look or frame took seconds
+        self.busy += seconds
+        self.looks += 1
+
+    def travel(self, distance, points):
+        self.moved += distance
+        self.points += points
+
+    def status(self, seconds):
+        # status text costs about a look; redo it at most a quarter of the
+        # drawing time allows, and at least once a second
+        self.statuscost = 0.5*self.statuscost + 0.5*seconds
+        gap = min(1.0, max(0.1, 4.0 * self.statuscost / self.share))
+        self.nextstatus = time.perf_counter() + gap
+
+    def due(self, now):
+        return now - self.start >= self.every
+
+    def retune(self, view, now):
+        elapsed = now - self.start
+        if self.looks and self.busy > 0.0:
+            cost = self.busy / self.looks                # seconds a look
+            rate = min(self.fps, self.share / cost)     # looks a second we can afford
+            lookrate = self.looks / elapsed
+            stride = self.stride * lookrate / rate
+            # halfway there each time, in ratio, so it settles without swinging
+            self.stride = max(1, int(math.sqrt(self.stride * max(1.0, stride)) + 0.5))
+            self.period = 1.0 / rate
+            # under half the frame rate even so: redraw for bigger moves only
+            if rate < 0.5 * self.fps:
+                self.coarse = min(8.0, self.coarse * 1.25)
+            elif rate >= self.fps:
+                self.coarse = max(1.0, self.coarse / 1.25)
+        self.fit(view)
+        self.start = now
+        self.busy = 0.0
+        self.looks = 0
+
+    def fit(self, view):
+        # apixel and the crumb interval for this zoom, coarseness and pace:
+        # crumbs stay as far apart as five starting apixels, however far the
+        # ship goes between points looked at
+        view.apixel = view.homeapixel * view.scale * self.coarse
+        hop = self.moved / self.points if self.points else 0.0
+        spacing = 5.0 * view.homeapixel * view.scale
+        view.crumbinterval = max(1, int(spacing / max(view.apixel, hop) + 0.5))
+        view.crumbsteps = min(view.crumbsteps, view.crumbinterval)
+        self.moved = 0.0
+        self.points = 0
+
+
+class _Relay:
+    # observer in the physics thread which passes notices to the drawing
+    # one: (method name, arguments after sim)
+
+    def __init__(self, notices):
+        self.notices = notices
+
+    def on_orbit(self, sim):
+        self.notices.put(('on_orbit',))
+
+    def on_check(self, sim):   # steps and time now, for the steps/sec
+        self.notices.put(('on_check', sim.steps, time.time()))
+
+    def on_end(self, sim):
+        self.notices.put(('on_end',))